@@ -1,5 +1,8 @@
-from fastapi import FastAPI, HTTPException, Query
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 
 from catalog_service import CatalogService
 from product_service import ProductService
@@ -34,9 +37,17 @@ def health():
 # -------------------- CATÁLOGO COMPLETO --------------------
 
 @app.get("/catalog")
-def get_catalog(api_key: str = Query(...)):
+def get_catalog(
+    api_key: str = Query(...),
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, description="Tamaño de página (sin limit: catálogo completo)")
+):
     validate_api_key(api_key)
-    return catalog.load_catalog()
+    body, total = catalog.catalog_json(offset, limit)
+    if body is None:
+        return {"error": "Catálogo no generado todavía"}
+    # JSON pre-serializado al cargar el snapshot: sin re-encode por request
+    return Response(content=body, media_type="application/json", headers={"X-Total-Count": str(total)})
 
 
 # -------------------- PRODUCTO POR SKU --------------------
@@ -65,6 +76,11 @@ def search(
 # -------------------- IMÁGENES --------------------
 
 @app.get("/image/{filename}")
-def get_image(filename: str, api_key: str = Query(...)):
+def get_image(
+    filename: str,
+    request: Request,
+    w: Optional[int] = Query(None, ge=1, description="Ancho de miniatura (160, 320 o 640)"),
+    api_key: str = Query(...)
+):
     validate_api_key(api_key)
-    return images.serve_image(filename)
+    return images.serve_image(filename, request, width=w)
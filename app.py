@@ -1,16 +1,20 @@
 import os
-from fastapi import FastAPI, Request
+from typing import Optional
+from fastapi import FastAPI, Request, Query
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import HTMLResponse, JSONResponse
 from starlette.templating import Jinja2Templates
 import json
-import pandas as pd
+
+from image_service import ImageService
+from catalog_db import CatalogDB
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 OUTPUT_DIR = os.path.join(BASE_DIR, "..", "output")
 CELLS_DIR = os.path.join(OUTPUT_DIR, "cells")
 SEGMENTS_DIR = os.path.join(OUTPUT_DIR, "segments")
 CATALOG_DIR = os.path.join(OUTPUT_DIR, "catalog")
+CATALOG_CSV = os.path.join(CATALOG_DIR, "catalogo_adsi_master.csv")
 
 app = FastAPI(title="ADSI Extractor V5 Dashboard")
 
@@ -20,18 +24,33 @@ app.mount("/static", StaticFiles(directory=os.path.join(BASE_DIR, "static")), na
 # Templates
 templates = Jinja2Templates(directory=os.path.join(BASE_DIR, "templates"))
 
+# Recortes con ETag/304, rangos y miniaturas cacheadas
+cell_images = ImageService(CELLS_DIR)
+
+# Catálogo editable en SQLite; el CSV maestro se exporta periódicamente
+catalog_db = CatalogDB(CATALOG_CSV)
+
+
+@app.on_event("startup")
+def start_catalog_db():
+    catalog_db.sync_from_csv()
+    catalog_db.start_exporter()
+
+
+@app.on_event("shutdown")
+def stop_catalog_db():
+    catalog_db.stop_exporter()
+
 
 # ---------------------------------------------------------
 # Home – Tablero principal
 # ---------------------------------------------------------
 @app.get("/", response_class=HTMLResponse)
-async def index(request: Request):
-    catalog_path = os.path.join(CATALOG_DIR, "catalogo_adsi_master.csv")
-    df = pd.read_csv(catalog_path) if os.path.exists(catalog_path) else pd.DataFrame()
-    families = sorted(df["familia"].dropna().unique().tolist()) if not df.empty else []
+def index(request: Request):
+    catalog_db.sync_from_csv()
     return templates.TemplateResponse(
         "index.html",
-        {"request": request, "families": families, "count": len(df)}
+        {"request": request, "families": catalog_db.families(), "count": catalog_db.count()}
     )
 
 
@@ -39,12 +58,11 @@ async def index(request: Request):
 # Vista de productos (tabla)
 # ---------------------------------------------------------
 @app.get("/products", response_class=HTMLResponse)
-async def products(request: Request):
-    catalog_path = os.path.join(CATALOG_DIR, "catalogo_adsi_master.csv")
-    df = pd.read_csv(catalog_path) if os.path.exists(catalog_path) else pd.DataFrame()
+def products(request: Request):
+    catalog_db.sync_from_csv()
     return templates.TemplateResponse(
         "product_table.html",
-        {"request": request, "products": df.to_dict("records")}
+        {"request": request, "products": catalog_db.all_products()}
     )
 
 
@@ -60,11 +78,11 @@ async def page_viewer(request: Request, page_name: str):
         with open(json_file, "r", encoding="utf-8") as f:
             json_data = json.load(f)
 
-    # Recortes asociados
+    # Recortes asociados (miniatura en la grilla; ?w= omitido = original)
     cells = []
     for f in os.listdir(CELLS_DIR):
         if f.startswith(page_name):
-            cells.append(f"/static/output/cells/{f}")
+            cells.append(f"/cells/{f}?w=320")
 
     return templates.TemplateResponse(
         "page_viewer.html",
@@ -77,21 +95,29 @@ async def page_viewer(request: Request, page_name: str):
     )
 
 
+# ---------------------------------------------------------
+# Recortes (imágenes de celdas)
+# ---------------------------------------------------------
+@app.get("/cells/{filename}")
+def cell_image(request: Request, filename: str, w: Optional[int] = Query(None, ge=1)):
+    result = cell_images.serve_image(filename, request, width=w)
+    if isinstance(result, dict):
+        return JSONResponse(result, status_code=404)
+    return result
+
+
 # ---------------------------------------------------------
 # Editor por producto
 # ---------------------------------------------------------
 @app.get("/edit/{sku}", response_class=HTMLResponse)
-async def edit_product(request: Request, sku: str):
-    file = os.path.join(CATALOG_DIR, "catalogo_adsi_master.csv")
-    df = pd.read_csv(file)
-
-    row = df[df["sku"] == sku].to_dict("records")
-    if not row:
+def edit_product(request: Request, sku: str):
+    product = catalog_db.get(sku)
+    if not product:
         return HTMLResponse("Producto no encontrado", status_code=404)
 
     return templates.TemplateResponse(
         "editor.html",
-        {"request": request, "p": row[0]}
+        {"request": request, "p": product}
     )
 
 
@@ -102,16 +128,17 @@ async def edit_product(request: Request, sku: str):
 async def save_product(sku: str, request: Request):
     payload = await request.json()
 
-    file = os.path.join(CATALOG_DIR, "catalogo_adsi_master.csv")
-    df = pd.read_csv(file)
-
-    idx = df.index[df["sku"] == sku]
-    if len(idx) == 0:
+    # UPDATE de la fila en SQLite; el CSV se regenera en la próxima exportación
+    if not catalog_db.update(sku, payload):
         return JSONResponse({"error": "SKU no encontrado"}, status_code=404)
 
-    for k, v in payload.items():
-        if k in df.columns:
-            df.loc[idx, k] = v
-
-    df.to_csv(file, index=False)
     return JSONResponse({"status": "ok"})
+
+
+# ---------------------------------------------------------
+# Exportar catálogo a CSV (bajo demanda)
+# ---------------------------------------------------------
+@app.post("/export-csv")
+def export_csv():
+    catalog_db.export_csv(force=True)
+    return JSONResponse({"status": "ok", "path": CATALOG_CSV, "count": catalog_db.count()})
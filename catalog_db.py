@@ -0,0 +1,248 @@
+import os
+import json
+import sqlite3
+import threading
+import pandas as pd
+
+
+# Exportación periódica a CSV cuando hay ediciones pendientes (segundos)
+EXPORT_INTERVAL_SECONDS = 30
+
+
+def _native(value):
+    # numpy → tipos Python (json no serializa int64/float64)
+    return value.item() if hasattr(value, "item") else value
+
+
+class CatalogDB:
+    """
+    Catálogo del dashboard en SQLite (WAL): una fila JSON por producto,
+    indexada por sku. Las ediciones son UPDATE de una fila; el CSV
+    maestro se regenera por exportación periódica o bajo demanda.
+
+    Las ediciones aún no exportadas quedan también en la tabla edits: si
+    el CSV se regenera antes de la exportación, se re-aplican por sku
+    sobre el CSV nuevo en vez de perderse.
+    """
+
+    def __init__(self, csv_path, db_path=None):
+        self.csv_path = csv_path
+        self.db_path = db_path or os.path.splitext(csv_path)[0] + ".db"
+        self._local = threading.local()
+        self._export_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._exporter = None
+        self._init_db()
+
+    def _get_conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        conn = self._get_conn()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS catalog (
+                row_id INTEGER PRIMARY KEY,
+                sku TEXT,
+                familia TEXT,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_catalog_sku ON catalog(sku);
+            CREATE INDEX IF NOT EXISTS idx_catalog_familia ON catalog(familia);
+            CREATE TABLE IF NOT EXISTS edits (
+                edit_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sku TEXT NOT NULL,
+                changes TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+        """)
+        conn.commit()
+
+    def _meta(self, key, default=None):
+        row = self._get_conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    @staticmethod
+    def _set_meta(conn, key, value):
+        conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            (key, json.dumps(value))
+        )
+
+    # -----------------------------------------------------
+    # Sincronización con el CSV maestro
+    # -----------------------------------------------------
+    def sync_from_csv(self):
+        """
+        Importa el CSV si fue regenerado (p.ej. por el extractor) desde la
+        última importación/exportación. Devuelve True si hubo importación.
+        """
+        with self._export_lock:
+            return self._sync_from_csv()
+
+    def _sync_from_csv(self):
+        if not os.path.exists(self.csv_path):
+            return False
+
+        mtime = os.path.getmtime(self.csv_path)
+        if self._meta("csv_mtime") == mtime:
+            return False
+
+        df = pd.read_csv(self.csv_path)
+        df = df.astype(object).where(df.notna(), None)
+        columns = [str(c) for c in df.columns]
+        rows = [
+            (
+                None if r.get("sku") is None else str(r.get("sku")),
+                r.get("familia"),
+                json.dumps({k: _native(v) for k, v in r.items()}, ensure_ascii=False, default=str)
+            )
+            for r in df.to_dict("records")
+        ]
+
+        conn = self._get_conn()
+        with conn:
+            conn.execute("DELETE FROM catalog")
+            conn.executemany("INSERT INTO catalog (sku, familia, data) VALUES (?, ?, ?)", rows)
+            self._set_meta(conn, "columns", columns)
+            self._set_meta(conn, "csv_mtime", mtime)
+
+            # Ediciones confirmadas que el CSV nuevo no trae: se re-aplican en orden
+            edits = conn.execute("SELECT sku, changes FROM edits ORDER BY edit_id").fetchall()
+            for sku, changes in edits:
+                changes = {k: v for k, v in json.loads(changes).items() if k in columns}
+                if changes:
+                    self._apply(conn, sku, changes)
+            self._set_meta(conn, "dirty", bool(edits))
+        if edits:
+            print(f"[catalog_db] El CSV cambió con {len(edits)} ediciones sin exportar; re-aplicadas sobre el CSV nuevo")
+        return True
+
+    def export_csv(self, force=False):
+        """Escribe el CSV maestro desde SQLite (archivo temporal + rename atómico)."""
+        with self._export_lock:
+            if not force and not self._meta("dirty", False):
+                return False
+
+            columns = self._meta("columns")
+            if not columns:
+                return False  # Nunca se importó un CSV: no hay nada que exportar
+
+            conn = self._get_conn()
+            with conn:
+                records = [json.loads(d) for (d,) in conn.execute("SELECT data FROM catalog ORDER BY row_id")]
+                last_edit = conn.execute("SELECT COALESCE(MAX(edit_id), 0) FROM edits").fetchone()[0]
+                # Ediciones posteriores a este snapshot vuelven a marcar dirty
+                self._set_meta(conn, "dirty", False)
+
+            tmp_path = f"{self.csv_path}.tmp"
+            try:
+                pd.DataFrame(records, columns=columns).to_csv(tmp_path, index=False)
+                os.replace(tmp_path, self.csv_path)
+            except Exception:
+                with conn:
+                    self._set_meta(conn, "dirty", True)
+                raise
+
+            with conn:
+                # Ya están en el CSV: no hace falta re-aplicarlas
+                conn.execute("DELETE FROM edits WHERE edit_id <= ?", (last_edit,))
+                self._set_meta(conn, "csv_mtime", os.path.getmtime(self.csv_path))
+            return True
+
+    def start_exporter(self, interval=EXPORT_INTERVAL_SECONDS):
+        if self._exporter is not None:
+            return
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.export_csv()
+                except Exception as e:
+                    print(f"[catalog_db] Error exportando CSV: {e}")
+
+        self._exporter = threading.Thread(target=loop, name="catalog-csv-exporter", daemon=True)
+        self._exporter.start()
+
+    def stop_exporter(self):
+        self._stop.set()
+        self.export_csv()
+
+    # -----------------------------------------------------
+    # Lectura
+    # -----------------------------------------------------
+    def count(self):
+        return self._get_conn().execute("SELECT COUNT(*) FROM catalog").fetchone()[0]
+
+    def families(self):
+        rows = self._get_conn().execute(
+            "SELECT DISTINCT familia FROM catalog WHERE familia IS NOT NULL ORDER BY familia"
+        ).fetchall()
+        return [r[0] for r in rows]
+
+    def all_products(self):
+        rows = self._get_conn().execute("SELECT data FROM catalog ORDER BY row_id").fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def get(self, sku):
+        row = self._get_conn().execute(
+            "SELECT data FROM catalog WHERE sku = ? ORDER BY row_id LIMIT 1", (str(sku),)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    # -----------------------------------------------------
+    # Escritura
+    # -----------------------------------------------------
+    def update(self, sku, changes):
+        """
+        Actualiza campos de un SKU en una sola sentencia (json_set atómico).
+        Solo se aceptan columnas existentes del catálogo. Devuelve el
+        número de filas afectadas (0 = SKU no encontrado).
+        """
+        columns = set(self._meta("columns", []))
+        changes = {k: v for k, v in changes.items() if k in columns}
+
+        conn = self._get_conn()
+        with conn:
+            if not changes:
+                return conn.execute("SELECT COUNT(*) FROM catalog WHERE sku = ?", (str(sku),)).fetchone()[0]
+
+            rowcount = self._apply(conn, sku, changes)
+            if rowcount:
+                conn.execute(
+                    "INSERT INTO edits (sku, changes) VALUES (?, ?)",
+                    (str(sku), json.dumps(changes, ensure_ascii=False))
+                )
+                self._set_meta(conn, "dirty", True)
+            return rowcount
+
+    @staticmethod
+    def _apply(conn, sku, changes):
+        """UPDATE con json_set de las columnas de `changes` para un sku."""
+        paths = ", ".join(["?, json(?)"] * len(changes))
+        params = []
+        for k, v in changes.items():
+            params.extend([f'$."{k}"', json.dumps(v, ensure_ascii=False)])
+
+        set_sql = f"data = json_set(data, {paths})"
+        extra = []
+        if "sku" in changes:
+            set_sql += ", sku = ?"
+            extra.append(None if changes["sku"] is None else str(changes["sku"]))
+        if "familia" in changes:
+            set_sql += ", familia = ?"
+            extra.append(changes["familia"])
+
+        return conn.execute(
+            f"UPDATE catalog SET {set_sql} WHERE sku = ?",
+            [*params, *extra, str(sku)]
+        ).rowcount
@@ -1,15 +1,24 @@
-import os
-import pandas as pd
-import json
+from catalog_store import get_catalog_store, default_catalog_path
 
 class CatalogService:
     def __init__(self):
-        base = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-        self.catalog_path = os.path.join(base, "output", "catalog", "catalogo_adsi_master.csv")
+        self.catalog_path = default_catalog_path()
+        self.store = get_catalog_store(self.catalog_path)
 
     def load_catalog(self):
-        if not os.path.exists(self.catalog_path):
+        snapshot = self.store.snapshot()
+        if snapshot is None:
             return {"error": "Catálogo no generado todavía"}
 
-        df = pd.read_csv(self.catalog_path)
-        return df.to_dict("records")
+        return snapshot.records
+
+    # Catálogo ya serializado (bytes JSON); None si no existe
+    def catalog_json(self, offset=0, limit=None):
+        snapshot = self.store.snapshot()
+        if snapshot is None:
+            return None, 0
+
+        total = len(snapshot.records)
+        if limit is None and offset == 0:
+            return snapshot.full_json, total
+        return snapshot.page_json(offset, total if limit is None else limit), total
@@ -0,0 +1,163 @@
+import os
+import re
+import json
+import time
+import threading
+import pandas as pd
+
+
+# Intervalo mínimo entre chequeos de mtime del CSV (segundos)
+RELOAD_CHECK_SECONDS = 2.0
+
+TOKEN_CACHE_SIZE = 4096   # Tokens de query resueltos por snapshot
+
+TOKEN_RE = re.compile(r"[A-Z0-9]+")
+
+
+def default_catalog_path():
+    base = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    return os.path.join(base, "output", "catalog", "catalogo_adsi_master.csv")
+
+
+class CatalogSnapshot:
+    """
+    Vista inmutable del catálogo: columnas en memoria + índices.
+    Se construye completa antes de publicarse, así los lectores nunca
+    ven un estado a medio cargar.
+    """
+
+    def __init__(self, df, mtime):
+        self.mtime = mtime
+        df = df.astype(object).where(df.notna(), None)
+        self.records = df.to_dict("records")
+
+        # Columnas de búsqueda (mismas reglas que el str.contains original)
+        self.desc_upper = self._column(df, "descripcion", upper=True)
+        self.codigo = self._column(df, "codigo")
+        self.sku = self._column(df, "sku")
+
+        # SKU exacto → fila
+        self.sku_index = {}
+        if "sku" in df.columns:
+            for i, value in enumerate(df["sku"]):
+                if value is not None:
+                    self.sku_index.setdefault(value, i)
+                    self.sku_index.setdefault(str(value), i)
+
+        # Token → filas (índice invertido sobre descripción, código y SKU)
+        postings = {}
+        for i in range(len(self.records)):
+            text = f"{self.desc_upper[i]} {self.codigo[i].upper()} {self.sku[i].upper()}"
+            for token in set(TOKEN_RE.findall(text)):
+                postings.setdefault(token, []).append(i)
+        self.postings = postings
+        self.vocabulary = list(postings)
+        self._token_cache = {}
+
+        # Catálogo pre-serializado: un fragmento JSON por registro
+        self.record_json = [
+            json.dumps(r, ensure_ascii=False, default=str).encode("utf-8")
+            for r in self.records
+        ]
+        self.full_json = b"[" + b",".join(self.record_json) + b"]"
+
+    @staticmethod
+    def _column(df, name, upper=False):
+        if name not in df.columns:
+            return [""] * len(df)
+        values = ["" if v is None else str(v) for v in df[name]]
+        return [v.upper() for v in values] if upper else values
+
+    def page_json(self, offset, limit):
+        return b"[" + b",".join(self.record_json[offset:offset + limit]) + b"]"
+
+    def get(self, sku):
+        i = self.sku_index.get(sku)
+        return self.records[i] if i is not None else None
+
+    def _candidates(self, q):
+        """Filas que contienen todos los tokens de la query (como subcadena de algún token)."""
+        tokens = TOKEN_RE.findall(q)
+        if not tokens:
+            return range(len(self.records))
+
+        rows = None
+        for qt in tokens:
+            matched = self._token_cache.get(qt)
+            if matched is None:
+                matched = set()
+                for token in self.vocabulary:
+                    if qt in token:
+                        matched.update(self.postings[token])
+                if len(self._token_cache) < TOKEN_CACHE_SIZE:
+                    self._token_cache[qt] = matched
+            rows = matched if rows is None else rows & matched
+            if not rows:
+                return []
+        return sorted(rows)
+
+    def search(self, q, limit=50):
+        results = []
+        for i in self._candidates(q):
+            # Verificación exacta sobre la fila: misma semántica que str.contains
+            if q in self.desc_upper[i] or q in self.codigo[i] or q in self.sku[i]:
+                results.append(self.records[i])
+                if len(results) >= limit:
+                    break
+        return results
+
+
+class CatalogStore:
+    """
+    Catálogo residente en memoria con recarga en caliente.
+    Relee el CSV solo cuando cambia su mtime y publica el nuevo
+    snapshot con un único intercambio de referencia.
+    """
+
+    def __init__(self, catalog_path):
+        self.catalog_path = catalog_path
+        self._snapshot = None
+        self._last_check = 0.0
+        self._reload_lock = threading.Lock()
+
+    def snapshot(self):
+        now = time.monotonic()
+        if self._snapshot is None or now - self._last_check >= RELOAD_CHECK_SECONDS:
+            self._refresh(now)
+        return self._snapshot
+
+    def _refresh(self, now):
+        if not self._reload_lock.acquire(blocking=self._snapshot is None):
+            return  # Otro hilo está recargando; se sirve el snapshot actual
+        try:
+            self._last_check = now
+            try:
+                mtime = os.path.getmtime(self.catalog_path)
+            except OSError:
+                self._snapshot = None
+                return
+
+            current = self._snapshot
+            if current is not None and current.mtime == mtime:
+                return
+            try:
+                self._snapshot = CatalogSnapshot(pd.read_csv(self.catalog_path), mtime)
+            except Exception as e:
+                # CSV a medio escribir: conservar el snapshot anterior y reintentar
+                print(f"[catalog_store] Error recargando {self.catalog_path}: {e}")
+                self._last_check = 0.0
+        finally:
+            self._reload_lock.release()
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_catalog_store(catalog_path=None):
+    """Store compartido por ruta (CatalogService y ProductService usan el mismo)."""
+    path = catalog_path or default_catalog_path()
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = CatalogStore(path)
+        return _stores[path]
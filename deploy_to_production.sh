@@ -90,6 +90,12 @@ SCRIPTS=(
     "caso_001_test.py"
 )
 
+# Módulos compartidos con los servicios: se copian desde odi_production/core
+CORE_SCRIPTS=(
+    "odi_shopify_sync.py"
+    "odi_shopify_bulk.py"
+)
+
 # Buscar origen de scripts (archivos subidos con WinSCP)
 if [ -d "$EXTRAC_SOURCE" ]; then
     SOURCE_DIR="$EXTRAC_SOURCE"
@@ -112,6 +118,14 @@ if [ -n "$SOURCE_DIR" ] && [ -d "$SOURCE_DIR" ]; then
             echo -e "   ${YELLOW}⚠️  $script no encontrado${NC}"
         fi
     done
+    for script in "${CORE_SCRIPTS[@]}"; do
+        if [ -f "$SOURCE_DIR/odi_production/core/$script" ]; then
+            cp "$SOURCE_DIR/odi_production/core/$script" "$PIPELINE_DIR/"
+            echo -e "   ✅ $script (odi_production/core)"
+        else
+            echo -e "   ${YELLOW}⚠️  odi_production/core/$script no encontrado${NC}"
+        fi
+    done
 else
     echo -e "${RED}   No se encontró fuente de scripts${NC}"
 fi
@@ -1,15 +1,185 @@
 import os
-from fastapi.responses import FileResponse
+import re
+import hashlib
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi.responses import FileResponse, Response
+
+# Anchos fijos de miniatura; cualquier ?w= se ajusta al más cercano por arriba
+THUMB_WIDTHS = (160, 320, 640)
+THUMBS_DIRNAME = "_thumbs"
+THUMB_QUALITY = 82
+
+CACHE_CONTROL = "public, max-age=86400"
+HASH_CHUNK = 1024 * 1024
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
 
 class ImageService:
-    def __init__(self):
+    def __init__(self, images_dir=None):
         base = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-        self.cells_dir = os.path.join(base, "output", "cells")
+        self.cells_dir = images_dir or os.path.join(base, "output", "cells")
+        self.thumbs_dir = os.path.join(self.cells_dir, THUMBS_DIRNAME)
+        self._etags = {}            # path → (mtime_ns, size, etag)
+        self._locks = {}            # path de miniatura → lock de generación
+        self._locks_guard = threading.Lock()
+
+    def serve_image(self, filename, request=None, width=None):
+        file_path = self._resolve(filename)
+        if file_path is None:
+            return {"error": "Imagen no encontrada"}
+
+        if width:
+            file_path = self._thumbnail(file_path, filename, width)
+
+        stat = os.stat(file_path)
+        etag = self._etag(file_path, stat)
+        headers = {
+            "ETag": etag,
+            "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+            "Cache-Control": CACHE_CONTROL,
+            "Accept-Ranges": "bytes",
+        }
 
-    def serve_image(self, filename):
+        if request is not None:
+            if self._not_modified(request, etag, stat):
+                return Response(status_code=304, headers=headers)
+
+            range_header = request.headers.get("range")
+            if range_header and self._if_range_ok(request, etag):
+                return self._range_response(file_path, stat.st_size, range_header, headers)
+
+        return FileResponse(file_path, headers=headers)
+
+    # -----------------------------------------------------
+    # Rutas
+    # -----------------------------------------------------
+    def _resolve(self, filename):
+        # Solo nombres planos dentro de cells_dir (sin ../ ni subcarpetas)
+        if os.path.basename(filename) != filename or filename.startswith("."):
+            return None
         file_path = os.path.join(self.cells_dir, filename)
+        return file_path if os.path.isfile(file_path) else None
+
+    # -----------------------------------------------------
+    # Validadores (ETag por hash de contenido, cacheado por mtime/tamaño)
+    # -----------------------------------------------------
+    def _etag(self, file_path, stat):
+        cached = self._etags.get(file_path)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+
+        digest = hashlib.sha1()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+                digest.update(chunk)
+        etag = f'"{digest.hexdigest()}"'
+        self._etags[file_path] = (stat.st_mtime_ns, stat.st_size, etag)
+        return etag
+
+    @staticmethod
+    def _not_modified(request, etag, stat):
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+            return "*" in tags or etag in tags
+
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(stat.st_mtime) <= since
+        return False
+
+    @staticmethod
+    def _if_range_ok(request, etag):
+        if_range = request.headers.get("if-range")
+        return if_range is None or if_range.strip() == etag
+
+    # -----------------------------------------------------
+    # Rangos de bytes (un solo rango; multi-rango → archivo completo)
+    # -----------------------------------------------------
+    @staticmethod
+    def _range_response(file_path, size, range_header, headers):
+        match = RANGE_RE.match(range_header.strip())
+        if not match:
+            return FileResponse(file_path, headers=headers)
+
+        start, end = match.groups()
+        if start:
+            start = int(start)
+            end = min(int(end), size - 1) if end else size - 1
+        elif end:
+            # bytes=-N → últimos N bytes
+            start = max(size - int(end), 0)
+            end = size - 1
+        else:
+            start, end = size, size - 1
+
+        if start > end or start >= size:
+            return Response(
+                status_code=416,
+                headers={**headers, "Content-Range": f"bytes */{size}"}
+            )
+
+        with open(file_path, "rb") as f:
+            f.seek(start)
+            content = f.read(end - start + 1)
+
+        return Response(
+            content=content,
+            status_code=206,
+            media_type=_media_type(file_path),
+            headers={**headers, "Content-Range": f"bytes {start}-{end}/{size}"}
+        )
+
+    # -----------------------------------------------------
+    # Miniaturas (generadas una vez en cells/_thumbs/w<ancho>/)
+    # -----------------------------------------------------
+    def _thumbnail(self, file_path, filename, width):
+        width = next((w for w in THUMB_WIDTHS if w >= width), THUMB_WIDTHS[-1])
+        thumb_dir = os.path.join(self.thumbs_dir, f"w{width}")
+        thumb_path = os.path.join(thumb_dir, filename + ".jpg")
+
+        if self._is_fresh(thumb_path, file_path):
+            return thumb_path
+
+        with self._lock_for(thumb_path):
+            if self._is_fresh(thumb_path, file_path):
+                return thumb_path
+
+            from PIL import Image
+
+            os.makedirs(thumb_dir, exist_ok=True)
+            with Image.open(file_path) as img:
+                if img.width <= width:
+                    return file_path
+                img.thumbnail((width, img.height * width // img.width + 1))
+                tmp_path = f"{thumb_path}.{threading.get_ident()}.tmp"
+                img.convert("RGB").save(tmp_path, "JPEG", quality=THUMB_QUALITY, optimize=True)
+            os.replace(tmp_path, thumb_path)
+        return thumb_path
+
+    @staticmethod
+    def _is_fresh(thumb_path, file_path):
+        try:
+            return os.path.getmtime(thumb_path) >= os.path.getmtime(file_path)
+        except OSError:
+            return False
+
+    def _lock_for(self, path):
+        with self._locks_guard:
+            return self._locks.setdefault(path, threading.Lock())
 
-        if not os.path.exists(file_path):
-            return {"error": "Imagen no encontrada"}
 
-        return FileResponse(file_path)
+def _media_type(file_path):
+    ext = os.path.splitext(file_path)[1].lower()
+    return {
+        ".jpg": "image/jpeg",
+        ".jpeg": "image/jpeg",
+        ".png": "image/png",
+        ".webp": "image/webp",
+        ".gif": "image/gif",
+    }.get(ext, "application/octet-stream")
@@ -24,10 +24,12 @@ Version: 1.0
 
 import os
 import json
+import time
 import uuid
 import threading
 import queue
 from datetime import datetime
+from pathlib import Path
 from typing import Dict, Any, Optional, Callable
 from dataclasses import dataclass, asdict
 from enum import Enum
@@ -39,6 +41,29 @@ try:
 except ImportError:
     REQUESTS_AVAILABLE = False
 
+# Lock entre procesos para el replay del spool (solo POSIX)
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+# ============================================================================
+# CONFIGURACION DE ENTREGA
+# ============================================================================
+
+EVENT_ENDPOINT = os.getenv("ODI_EVENT_ENDPOINT", "/odi/vision/event")
+BATCH_ENDPOINT = os.getenv("ODI_EVENT_BATCH_ENDPOINT", "/odi/vision/events")
+BATCH_MAX_EVENTS = int(os.getenv("ODI_EVENT_BATCH_SIZE", "200"))
+BATCH_LINGER_SECONDS = float(os.getenv("ODI_EVENT_LINGER_MS", "50")) / 1000
+QUEUE_MAX_EVENTS = int(os.getenv("ODI_EVENT_QUEUE_MAX", "50000"))
+SPOOL_DIR = os.getenv("ODI_EVENT_SPOOL_DIR", "/opt/odi/data/event_spool")
+SPOOL_MAX_BYTES = 100 * 1024 * 1024     # Tope del spool; por encima se descartan eventos
+SEND_TIMEOUT = 2.0
+RETRY_MIN_SECONDS = 1.0                 # Backoff mientras el receptor esta caido
+RETRY_MAX_SECONDS = 30.0
+SPLIT_STATUSES = (400, 413, 422)        # Lote rechazado: se parte para aislar el evento culpable
+
 
 # ============================================================================
 # TIPOS DE EVENTOS
@@ -135,8 +160,13 @@ class ODIEventEmitter:
     Emite eventos al ODI Kernel para el Cortex Visual.
 
     Caracteristicas:
-    - Emision asincrona (non-blocking) via queue
-    - Retry automatico en caso de fallo
+    - Emision asincrona (non-blocking) via queue acotada
+    - Entrega en lotes (hasta batch_size eventos o linger segundos)
+      sobre una sesion HTTP keep-alive
+    - Spool NDJSON en disco cuando el receptor esta caido; se reenvia
+      al recuperarse (entrega at-least-once, sin orden garantizado
+      entre eventos reenviados y en vivo)
+    - Contadores de descartes y lag en stats
     - Modo offline (eventos se loguean pero no se envian)
     - Callbacks para hooks locales
     """
@@ -148,7 +178,10 @@ class ODIEventEmitter:
         kernel_url: str = None,
         enabled: bool = True,
         async_mode: bool = True,
-        callbacks: list = None
+        callbacks: list = None,
+        batch_size: int = BATCH_MAX_EVENTS,
+        linger: float = BATCH_LINGER_SECONDS,
+        spool_dir: str = SPOOL_DIR
     ):
         """
         Inicializa el emitter.
@@ -160,6 +193,9 @@ class ODIEventEmitter:
             enabled: Si False, eventos se loguean pero no se envian
             async_mode: Si True, usa cola para emision non-blocking
             callbacks: Lista de funciones callback(event) para hooks locales
+            batch_size: Maximo de eventos por envio
+            linger: Segundos que se espera a completar un lote
+            spool_dir: Directorio del spool NDJSON (env ODI_EVENT_SPOOL_DIR)
         """
         self.source = source
         self.actor = actor or self._generate_actor(source)
@@ -167,9 +203,11 @@ class ODIEventEmitter:
         self.enabled = enabled and REQUESTS_AVAILABLE
         self.async_mode = async_mode
         self.callbacks = callbacks or []
+        self.batch_size = max(batch_size, 1)
+        self.linger = linger
 
-        # Cola para emision asincrona
-        self._queue = queue.Queue()
+        # Cola para emision asincrona: (instante de encolado, evento)
+        self._queue = queue.Queue(maxsize=QUEUE_MAX_EVENTS)
         self._worker_thread = None
         self._stop_event = threading.Event()
 
@@ -177,9 +215,34 @@ class ODIEventEmitter:
         self.stats = {
             "emitted": 0,
             "delivered": 0,
-            "failed": 0
+            "failed": 0,
+            "dropped": 0,
+            "spooled": 0,
+            "replayed": 0,
+            "batches": 0,
+            "lag_ms": 0.0,
+            "max_lag_ms": 0.0
         }
 
+        # Sesion HTTP persistente y estado del receptor
+        self._session = None
+        self._batch_supported = True
+        self._retry_at = 0.0
+        self._backoff = RETRY_MIN_SECONDS
+        if self.enabled:
+            self._session = requests.Session()
+            self._session.mount("http://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=2))
+            self._session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=2))
+            self._session.headers.update({"Content-Type": "application/json"})
+
+        # Spool NDJSON (append-only) + archivo en replay
+        self._spool_lock = threading.Lock()
+        self._spool_path = self._replay_path = self._lock_path = None
+        self._replay_offset = 0
+        self._spool_pending = False
+        if self.enabled:
+            self._init_spool(spool_dir)
+
         # Iniciar worker si es asincrono
         if self.async_mode and self.enabled:
             self._start_worker()
@@ -200,41 +263,249 @@ class ODIEventEmitter:
         self._worker_thread.start()
 
     def _worker_loop(self):
-        """Loop del worker que procesa la cola de eventos."""
-        while not self._stop_event.is_set():
+        """Loop del worker: arma lotes de la cola y los entrega."""
+        stopping = False
+        while not stopping:
+            batch = self._next_batch()
+            if None in batch:
+                stopping = True
+                batch = [item for item in batch if item is not None]
             try:
-                event = self._queue.get(timeout=1.0)
-                if event is None:
-                    break
-                self._send_event(event)
-                self._queue.task_done()
-            except queue.Empty:
-                continue
+                if batch:
+                    self._deliver(batch)
+                if self._spool_pending and self._receiver_up():
+                    self._replay_step()
             except Exception:
                 pass
+        if self._session:
+            self._session.close()
+
+    def _next_batch(self) -> list:
+        """Bloquea hasta el primer evento; luego junta hasta batch_size o linger."""
+        try:
+            batch = [self._queue.get(timeout=1.0)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.batch_size and batch[-1] is not None:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+        return batch
+
+    # =========================================================================
+    # ENTREGA
+    # =========================================================================
 
     def _send_event(self, event: ODIEvent) -> bool:
-        """Envia evento al ODI Kernel via HTTP."""
-        if not REQUESTS_AVAILABLE:
+        """Envia un evento de forma sincrona (spool si el receptor falla)."""
+        ok = self._deliver([(time.monotonic(), event)])
+        if ok and self._spool_pending:
+            self._replay_step()
+        return ok
+
+    def _deliver(self, batch: list) -> bool:
+        """Envia un lote [(encolado, evento)]; si falla, va al spool."""
+        lines = [event.to_json() for _, event in batch]
+        if not self._receiver_up():
+            self._spool(lines)
             return False
 
+        lag_ms = (time.monotonic() - batch[0][0]) * 1000
+        self.stats["lag_ms"] = round(lag_ms, 1)
+        self.stats["max_lag_ms"] = round(max(self.stats["max_lag_ms"], lag_ms), 1)
+
+        self.stats["delivered"] += self._post(lines)
+        if not lines:
+            return True
+        self.stats["failed"] += len(lines)
+        self._spool(lines)
+        return False
+
+    def _receiver_up(self) -> bool:
+        return time.monotonic() >= self._retry_at
+
+    def _post(self, lines: list) -> int:
+        """
+        POST de un lote ya serializado. Devuelve cuantos eventos acepto el
+        receptor; los rechazados con 4xx se descartan (stats["dropped"]).
+        Ante errores de red, 429 o 5xx marca el receptor caido y deja en
+        `lines` los eventos pendientes (siempre un sufijo del lote); si todo
+        el lote quedo resuelto, `lines` queda vacio.
+        """
+        if self._batch_supported:
+            accepted = self._post_batch(lines)
+            if accepted is not None:
+                return accepted
+        return self._post_each(lines)
+
+    @staticmethod
+    def _retryable(status: int) -> bool:
+        return status == 429 or status >= 500
+
+    def _post_batch(self, lines: list) -> Optional[int]:
+        """Un POST con todo el lote; None si el kernel no tiene endpoint de lotes."""
+        body = '{"events":[' + ",".join(lines) + ']}'
         try:
-            url = f"{self.kernel_url}/odi/vision/event"
-            response = requests.post(
-                url,
-                json=event.to_dict(),
-                timeout=2.0,
-                headers={"Content-Type": "application/json"}
+            response = self._session.post(
+                f"{self.kernel_url}{BATCH_ENDPOINT}",
+                data=body.encode("utf-8"),
+                timeout=SEND_TIMEOUT
             )
-            success = response.status_code in (200, 201, 202)
-            if success:
-                self.stats["delivered"] += 1
-            else:
-                self.stats["failed"] += 1
-            return success
         except requests.exceptions.RequestException:
-            self.stats["failed"] += 1
-            return False
+            self._mark(False)
+            return 0
+
+        status = response.status_code
+        if status in (404, 405):
+            # Kernel sin endpoint de lotes: un POST por evento (misma conexion)
+            self._batch_supported = False
+            return None
+        if self._retryable(status):
+            self._mark(False)
+            return 0
+        self._mark(True)
+        if status in (200, 201, 202):
+            self.stats["batches"] += 1
+            accepted = len(lines)
+        elif status in SPLIT_STATUSES and len(lines) > 1:
+            # Cuerpo demasiado grande o un evento invalido: mitades por separado
+            half = len(lines) // 2
+            first, second = lines[:half], lines[half:]
+            accepted = self._post(first)
+            if first:
+                lines[:] = first + second
+                return accepted
+            accepted += self._post(second)
+            lines[:] = second
+            return accepted
+        else:
+            self.stats["dropped"] += len(lines)
+            accepted = 0
+        del lines[:]
+        return accepted
+
+    def _post_each(self, lines: list) -> int:
+        url = f"{self.kernel_url}{EVENT_ENDPOINT}"
+        accepted = 0
+        for i, line in enumerate(lines):
+            try:
+                response = self._session.post(url, data=line.encode("utf-8"), timeout=SEND_TIMEOUT)
+            except requests.exceptions.RequestException:
+                response = None
+            if response is None or self._retryable(response.status_code):
+                del lines[:i]  # Los ya resueltos no se reintentan
+                self._mark(False)
+                return accepted
+            if response.status_code in (200, 201, 202):
+                accepted += 1
+            else:
+                self.stats["dropped"] += 1
+        self.stats["batches"] += 1
+        del lines[:]
+        self._mark(True)
+        return accepted
+
+    def _mark(self, ok: bool) -> bool:
+        if ok:
+            self._retry_at = 0.0
+            self._backoff = RETRY_MIN_SECONDS
+        else:
+            self._retry_at = time.monotonic() + self._backoff
+            self._backoff = min(self._backoff * 2, RETRY_MAX_SECONDS)
+        return ok
+
+    # =========================================================================
+    # SPOOL NDJSON
+    # =========================================================================
+
+    def _init_spool(self, spool_dir: str):
+        try:
+            directory = Path(spool_dir)
+            directory.mkdir(parents=True, exist_ok=True)
+        except OSError:
+            return  # Sin spool: los eventos no entregados cuentan como descartados
+        self._spool_path = directory / f"{self.source}.ndjson"
+        self._replay_path = directory / f"{self.source}.replay.ndjson"
+        self._lock_path = directory / f"{self.source}.lock"
+        self._spool_pending = self._spool_path.exists() or self._replay_path.exists()
+
+    def _spool(self, lines: list):
+        if self._spool_path is None:
+            self.stats["dropped"] += len(lines)
+            return
+        data = ("\n".join(lines) + "\n").encode("utf-8")
+        with self._spool_lock:
+            try:
+                if self._spool_path.exists() and self._spool_path.stat().st_size + len(data) > SPOOL_MAX_BYTES:
+                    self.stats["dropped"] += len(lines)
+                    return
+                # Un solo write en modo append: seguro entre procesos del mismo source
+                with open(self._spool_path, "ab") as f:
+                    f.write(data)
+            except OSError:
+                self.stats["dropped"] += len(lines)
+                return
+        self.stats["spooled"] += len(lines)
+        self._spool_pending = True
+
+    def _replay_step(self) -> bool:
+        """Reenvia un lote del spool. El archivo se mueve a .replay para no competir con el append."""
+        with open(self._lock_path, "a") as lock:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return False  # Otro proceso esta reenviando
+
+            if not self._replay_path.exists():
+                with self._spool_lock:
+                    if not self._spool_path.exists():
+                        self._spool_pending = False
+                        return False
+                    os.replace(self._spool_path, self._replay_path)
+                self._replay_offset = 0
+
+            with open(self._replay_path, "rb") as f:
+                f.seek(self._replay_offset)
+                lines = []
+                while len(lines) < self.batch_size:
+                    raw = f.readline()
+                    if not raw:
+                        break
+                    if raw.strip():
+                        lines.append(raw.decode("utf-8").strip())
+                offset = f.tell()
+
+            if not lines:
+                self._replay_path.unlink()
+                self._replay_offset = 0
+                self._spool_pending = self._spool_path.exists()
+                return False
+
+            sent = len(lines)
+            self.stats["replayed"] += self._post(lines)
+            if lines:
+                # _post deja solo los pendientes; avanzar lo ya resuelto
+                resolved = sent - len(lines)
+                if resolved:
+                    self._advance_replay(resolved)
+                return False
+            self._replay_offset = offset
+            return True
+
+    def _advance_replay(self, count: int):
+        with open(self._replay_path, "rb") as f:
+            f.seek(self._replay_offset)
+            while count:
+                raw = f.readline()
+                if not raw:
+                    break
+                count -= bool(raw.strip())
+            self._replay_offset = f.tell()
 
     def emit(
         self,
@@ -284,7 +555,10 @@ class ODIEventEmitter:
         # Enviar evento
         if self.enabled:
             if self.async_mode:
-                self._queue.put(event)
+                try:
+                    self._queue.put_nowait((time.monotonic(), event))
+                except queue.Full:
+                    self.stats["dropped"] += 1
             else:
                 self._send_event(event)
 
@@ -493,6 +767,9 @@ class ODIEventEmitter:
             self._stop_event.set()
             self._queue.put(None)  # Senial de parada
             self._worker_thread.join(timeout=5.0)
+            self._worker_thread = None
+        elif self._session:
+            self._session.close()
 
     def __enter__(self):
         return self
@@ -559,7 +836,13 @@ Ejemplo de uso:
     emitter.matcher_complete(450, 500)
 
 Variables de entorno:
-    ODI_KERNEL_URL  - URL del ODI Kernel (default: http://localhost:3000)
+    ODI_KERNEL_URL            - URL del ODI Kernel (default: http://localhost:3000)
+    ODI_EVENT_ENDPOINT        - Endpoint por evento (default: /odi/vision/event)
+    ODI_EVENT_BATCH_ENDPOINT  - Endpoint de lotes (default: /odi/vision/events)
+    ODI_EVENT_BATCH_SIZE      - Eventos por lote (default: 200)
+    ODI_EVENT_LINGER_MS       - Espera para completar un lote (default: 50)
+    ODI_EVENT_QUEUE_MAX       - Tope de la cola en memoria (default: 50000)
+    ODI_EVENT_SPOOL_DIR       - Spool NDJSON (default: /opt/odi/data/event_spool)
 """)
 
     # Demo
@@ -576,5 +859,6 @@ Variables de entorno:
         print(f"  Emitidos: {emitter.stats['emitted']}")
         print(f"  Entregados: {emitter.stats['delivered']}")
         print(f"  Fallidos: {emitter.stats['failed']}")
+        print(f"  Descartados: {emitter.stats['dropped']}")
 
     print("\nListo!")
@@ -0,0 +1,465 @@
+"""
+ODI Catalog Index - Índice en memoria del catálogo normalizado
+Responde búsquedas estructuradas sin pasar por Cortex (RAG)
+
+Fuente: CSVs generados por odi_semantic_normalizer (*_normalized.csv / *NORMALIZED*.csv)
+        e índices de compatibilidad (*_fitment_index.json)
+
+Estructuras:
+- SKU / código      → hash map exacto (sku_odi y codigo normalizados)
+- Tokens            → índice invertido sobre nombre, descripción, categoría y marca
+- Prefijos          → vocabulario ordenado + bisect (búsqueda mientras se escribe)
+- Facetas           → categoría (posting lists) y precio (filtro por rango)
+- Fitment           → marca / modelo / cilindraje → SKUs, con rangos de año y alias
+
+Las recargas por mtime corren en un hilo (schedule_refresh) y se publican con
+un swap atómico del snapshot; el event loop sigue respondiendo con el anterior.
+"""
+
+import asyncio
+import csv
+import json
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Set
+
+# ══════════════════════════════════════════════════════════════════════════════
+# CONFIGURACIÓN
+# ══════════════════════════════════════════════════════════════════════════════
+
+CATALOG_PATH = os.getenv("CATALOG_PATH", "/opt/odi/data/catalogs")
+CATALOG_RELOAD_CHECK_SECONDS = 30   # Frecuencia máxima de chequeo de mtime
+MAX_PREFIX_EXPANSION = 200          # Tokens máximos que expande un prefijo
+
+SEARCH_FIELDS = ("nombre", "descripcion", "categoria", "marca_moto", "modelo_moto",
+                 "fitment_marca", "fitment_modelo")
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+logger = logging.getLogger(__name__)
+
+# ══════════════════════════════════════════════════════════════════════════════
+# UTILIDADES
+# ══════════════════════════════════════════════════════════════════════════════
+
+def normalize_text(text: str) -> str:
+    """Minúsculas sin acentos."""
+    text = unicodedata.normalize("NFKD", str(text or ""))
+    return "".join(c for c in text if not unicodedata.combining(c)).lower().strip()
+
+def normalize_code(code: str) -> str:
+    """SKUs y códigos: mayúsculas sin separadores (LLA-005 == lla005)."""
+    return re.sub(r"[^A-Z0-9]", "", str(code or "").upper())
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(normalize_text(text))
+
+def parse_price(value: Any) -> Optional[float]:
+    try:
+        return float(str(value).replace(",", "").strip())
+    except (TypeError, ValueError):
+        return None
+
+def find_catalog_files(path: str) -> List[Path]:
+    """Un CSV puntual o todos los CSV normalizados de un directorio."""
+    p = Path(path)
+    if p.is_file():
+        return [p]
+    if p.is_dir():
+        return sorted(
+            f for f in p.rglob("*.csv")
+            if "normalized" in f.name.lower()
+        )
+    return []
+
+# ══════════════════════════════════════════════════════════════════════════════
+# SNAPSHOT
+# ══════════════════════════════════════════════════════════════════════════════
+
+@dataclass
+class CatalogSnapshot:
+    """Vista inmutable del catálogo; se reemplaza completa al recargar."""
+    products: List[Dict[str, Any]] = field(default_factory=list)
+    prices: List[Optional[float]] = field(default_factory=list)
+    name_tokens: List[frozenset] = field(default_factory=list)
+    by_sku: Dict[str, int] = field(default_factory=dict)
+    by_code: Dict[str, List[int]] = field(default_factory=dict)
+    postings: Dict[str, Set[int]] = field(default_factory=dict)
+    vocabulary: List[str] = field(default_factory=list)
+    by_category: Dict[str, Set[int]] = field(default_factory=dict)
+    sources: Dict[str, float] = field(default_factory=dict)   # archivo → mtime
+
+def build_snapshot(files: List[Path]) -> CatalogSnapshot:
+    snap = CatalogSnapshot()
+    postings = defaultdict(set)
+    by_code = defaultdict(list)
+    by_category = defaultdict(set)
+
+    for file_path in files:
+        snap.sources[str(file_path)] = file_path.stat().st_mtime
+        with open(file_path, "r", encoding="utf-8", errors="ignore", newline="") as f:
+            first_line = f.readline()
+            f.seek(0)
+            reader = csv.DictReader(f, delimiter=";" if ";" in first_line else ",")
+            for row in reader:
+                sku = row.get("sku_odi") or row.get("sku") or row.get("codigo")
+                if not sku:
+                    continue
+                idx = len(snap.products)
+                product = {k: v for k, v in row.items() if k and v not in (None, "")}
+                snap.products.append(product)
+                snap.prices.append(parse_price(row.get("precio")))
+                snap.name_tokens.append(frozenset(tokenize(row.get("nombre", ""))))
+
+                snap.by_sku[normalize_code(sku)] = idx
+                if row.get("codigo"):
+                    by_code[normalize_code(row["codigo"])].append(idx)
+                if row.get("categoria"):
+                    by_category[normalize_text(row["categoria"])].add(idx)
+
+                for name in SEARCH_FIELDS:
+                    for token in tokenize(row.get(name, "")):
+                        postings[token].add(idx)
+
+    snap.postings = dict(postings)
+    snap.vocabulary = sorted(postings)
+    snap.by_code = dict(by_code)
+    snap.by_category = dict(by_category)
+    return snap
+
+# ══════════════════════════════════════════════════════════════════════════════
+# RECARGA
+# ══════════════════════════════════════════════════════════════════════════════
+
+class ReloadableIndex(ABC):
+    """
+    Base de los índices: recarga cuando cambia el mtime de sus archivos.
+
+    Las subclases definen find_files() y load(); load() construye un
+    snapshot nuevo y lo publica reemplazando self.snapshot.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+        self._refresh_task: Optional[asyncio.Future] = None
+
+    @abstractmethod
+    def find_files(self) -> List[Path]:
+        """Archivos fuente del índice (su mtime decide la recarga)."""
+
+    @abstractmethod
+    def load(self) -> int:
+        """Construye el snapshot, lo publica y devuelve cuántas entradas tiene."""
+
+    def refresh_if_changed(self):
+        """Recarga si algún archivo cambió (chequeo acotado a cada N segundos). Bloqueante."""
+        now = time.monotonic()
+        if now - self._last_check < CATALOG_RELOAD_CHECK_SECONDS:
+            return
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._last_check = now
+            current = {str(f): f.stat().st_mtime for f in self.find_files()}
+            if current != self.snapshot.sources:
+                self.load()
+        finally:
+            self._lock.release()
+
+    def schedule_refresh(self):
+        """
+        Versión para handlers async: lanza refresh_if_changed en un hilo y
+        vuelve enseguida. Hasta el swap se responde con el snapshot actual.
+        """
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return
+        if time.monotonic() - self._last_check < CATALOG_RELOAD_CHECK_SECONDS:
+            return
+        self._refresh_task = asyncio.ensure_future(asyncio.to_thread(self.refresh_if_changed))
+        self._refresh_task.add_done_callback(self._refresh_done)
+
+    def _refresh_done(self, task: asyncio.Future):
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Reload of {type(self).__name__} failed: {task.exception()}")
+
+# ══════════════════════════════════════════════════════════════════════════════
+# ÍNDICE
+# ══════════════════════════════════════════════════════════════════════════════
+
+class CatalogIndex(ReloadableIndex):
+    """Índice de catálogo en memoria con recarga atómica por mtime."""
+
+    def __init__(self, path: str = CATALOG_PATH):
+        super().__init__(path)
+        self.snapshot = CatalogSnapshot()
+
+    @property
+    def loaded(self) -> bool:
+        return bool(self.snapshot.products)
+
+    def find_files(self) -> List[Path]:
+        return find_catalog_files(self.path)
+
+    def load(self) -> int:
+        """(Re)construye el índice y lo publica con un swap atómico."""
+        snapshot = build_snapshot(self.find_files())
+        self.snapshot = snapshot
+        self._last_check = time.monotonic()
+        return len(snapshot.products)
+
+    # ──────────────────────────────────────────────────────────────────────────
+    # Consultas
+    # ──────────────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _lookup(snap: CatalogSnapshot, sku: str) -> Optional[int]:
+        key = normalize_code(sku)
+        idx = snap.by_sku.get(key)
+        if idx is None:
+            matches = snap.by_code.get(key)
+            idx = matches[0] if matches else None
+        return idx
+
+    def get(self, sku: str) -> Optional[Dict[str, Any]]:
+        """Lookup exacto por sku_odi o por código de proveedor."""
+        snap = self.snapshot
+        idx = self._lookup(snap, sku)
+        return snap.products[idx] if idx is not None else None
+
+    def _token_postings(self, snap: CatalogSnapshot, token: str, prefix: bool) -> Set[int]:
+        if not prefix:
+            return snap.postings.get(token, set())
+        result = set()
+        start = bisect_left(snap.vocabulary, token)
+        for word in snap.vocabulary[start:start + MAX_PREFIX_EXPANSION]:
+            if not word.startswith(token):
+                break
+            result |= snap.postings[word]
+        return result
+
+    def _match_tokens(self, snap: CatalogSnapshot, tokens: List[str]) -> Optional[Set[int]]:
+        """Intersección de posting lists (prefijo en el último término)."""
+        candidates: Optional[Set[int]] = None
+        for i, token in enumerate(tokens):
+            hits = self._token_postings(snap, token, prefix=(i == len(tokens) - 1))
+            candidates = hits if candidates is None else candidates & hits
+            if not candidates:
+                break
+        return candidates
+
+    def match_skus(self, query: str) -> Set[str]:
+        """SKUs cuyos textos contienen todos los términos de la query."""
+        snap = self.snapshot
+        candidates = self._match_tokens(snap, tokenize(query)) or set()
+        return {snap.products[i]["sku_odi"] for i in candidates if "sku_odi" in snap.products[i]}
+
+    def search(
+        self,
+        query: str,
+        marca: Optional[str] = None,
+        categoria: Optional[str] = None,
+        min_precio: Optional[float] = None,
+        max_precio: Optional[float] = None,
+        limit: int = 20
+    ) -> Dict[str, Any]:
+        """
+        Búsqueda por tokens (AND) con prefijo en el último término,
+        filtros por marca/categoría/precio y conteo de facetas por categoría.
+        """
+        snap = self.snapshot
+        tokens = tokenize(query)
+
+        # Coincidencia exacta de SKU/código
+        exact_idx = self._lookup(snap, query) if query and len(tokens) <= 2 else None
+
+        candidates = self._match_tokens(snap, tokens)
+        if candidates is None:
+            candidates = set(range(len(snap.products)))
+        if exact_idx is not None:
+            candidates = candidates | {exact_idx}
+
+        if categoria:
+            candidates = candidates & snap.by_category.get(normalize_text(categoria), set())
+        if marca:
+            for token in tokenize(marca):
+                candidates = candidates & snap.postings.get(token, set())
+        if min_precio is not None or max_precio is not None:
+            low = min_precio if min_precio is not None else float("-inf")
+            high = max_precio if max_precio is not None else float("inf")
+            candidates = {
+                i for i in candidates
+                if snap.prices[i] is not None and low <= snap.prices[i] <= high
+            }
+
+        # Ranking: tokens presentes en el nombre pesan más
+        ordered = sorted(
+            candidates,
+            key=lambda i: (-sum(1 for t in tokens if t in snap.name_tokens[i]), i)
+        )
+        if exact_idx in candidates:
+            ordered = [exact_idx] + [i for i in ordered if i != exact_idx]
+
+        facets = Counter(
+            snap.products[i].get("categoria", "SIN CATEGORIA") for i in ordered
+        )
+
+        return {
+            "total": len(ordered),
+            "results": [snap.products[i] for i in ordered[:limit]],
+            "facets": {"categoria": dict(facets.most_common())}
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        snap = self.snapshot
+        return {
+            "products": len(snap.products),
+            "tokens": len(snap.vocabulary),
+            "categories": len(snap.by_category),
+            "sources": list(snap.sources)
+        }
+
+# ══════════════════════════════════════════════════════════════════════════════
+# FITMENT
+# ══════════════════════════════════════════════════════════════════════════════
+
+def fitment_key(value: str) -> str:
+    """Misma normalización que el normalizer: CB 190 == cb-190 == CB190."""
+    return normalize_code(normalize_text(value))
+
+def find_fitment_files(path: str) -> List[Path]:
+    p = Path(path)
+    if p.is_file():
+        p = p.parent
+    return sorted(p.rglob("*_fitment_index.json")) if p.is_dir() else []
+
+@dataclass
+class FitmentSnapshot:
+    by_brand: Dict[str, Set[str]] = field(default_factory=dict)
+    by_model: Dict[str, Set[str]] = field(default_factory=dict)
+    by_cc: Dict[str, Set[str]] = field(default_factory=dict)
+    fitment: Dict[str, Set[tuple]] = field(default_factory=dict)   # sku → {(marca, modelo, cc)}
+    years: Dict[str, tuple] = field(default_factory=dict)
+    brand_aliases: Dict[str, str] = field(default_factory=dict)
+    model_labels: Dict[str, str] = field(default_factory=dict)
+    sources: Dict[str, float] = field(default_factory=dict)
+
+class FitmentIndex(ReloadableIndex):
+    """
+    Índice de compatibilidad generado por odi_semantic_normalizer.
+
+    Cada producto declara (marca, modelo, cilindraje); "*" significa que el
+    nivel no se detectó y el producto aplica a cualquier valor. Una consulta
+    toma las posting lists específicas de marca/modelo y filtra candidatos
+    por compatibilidad y rango de años.
+    """
+
+    def __init__(self, path: str = CATALOG_PATH):
+        super().__init__(path)
+        self.snapshot = FitmentSnapshot()
+
+    @property
+    def loaded(self) -> bool:
+        return bool(self.snapshot.fitment)
+
+    def find_files(self) -> List[Path]:
+        return find_fitment_files(self.path)
+
+    def load(self) -> int:
+        snap = FitmentSnapshot()
+        for file_path in self.find_files():
+            snap.sources[str(file_path)] = file_path.stat().st_mtime
+            with open(file_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            snap.brand_aliases.update(data.get("brand_aliases", {}))
+            snap.model_labels.update(data.get("model_labels", {}))
+            for sku, (start, end) in data.get("years", {}).items():
+                snap.years[sku] = (start, end)
+            for brand, models in data.get("index", {}).items():
+                for model, ccs in models.items():
+                    for cc, skus in ccs.items():
+                        for sku in skus:
+                            snap.by_brand.setdefault(brand, set()).add(sku)
+                            snap.by_model.setdefault(model, set()).add(sku)
+                            snap.by_cc.setdefault(cc, set()).add(sku)
+                            snap.fitment.setdefault(sku, set()).add((brand, model, cc))
+        self.snapshot = snap
+        self._last_check = time.monotonic()
+        return len(snap.fitment)
+
+    def _resolve_model(self, snap: FitmentSnapshot, modelo: str, cc: str) -> str:
+        """Resuelve alias de modelo: CB190R → CB190, CB + 190cc → CB190."""
+        key = fitment_key(modelo)
+        candidates = [key, re.sub(r"[A-Z]+$", "", key)]
+        if cc and not key.endswith(cc):
+            candidates.append(key + cc)
+        for candidate in candidates:
+            if candidate in snap.by_model:
+                return candidate
+        return key
+
+    def lookup(
+        self,
+        marca: Optional[str] = None,
+        modelo: Optional[str] = None,
+        cilindraje: Optional[str] = None,
+        year: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """SKUs compatibles, ordenados por especificidad del match."""
+        snap = self.snapshot
+        brand = fitment_key(marca or "")
+        brand = snap.brand_aliases.get(brand, brand)
+        cc = re.sub(r"\D", "", cilindraje or "")
+        model = self._resolve_model(snap, modelo, cc) if modelo else ""
+
+        # Candidatos: posting lists específicas (los comodines solo completan)
+        if brand or model:
+            candidates = snap.by_brand.get(brand, set()) | snap.by_model.get(model, set())
+        elif cc:
+            candidates = snap.by_cc.get(cc, set())
+        else:
+            return []
+
+        results = []
+        for sku in candidates:
+            best = 0
+            for f_brand, f_model, f_cc in snap.fitment[sku]:
+                if brand and f_brand not in (brand, "*"):
+                    continue
+                if model and f_model not in (model, "*"):
+                    continue
+                if cc and f_cc not in (cc, "*"):
+                    continue
+                score = (f_brand == brand) + (f_model == model) + (f_cc == cc)
+                best = max(best, score)
+            if not best:
+                continue
+
+            year_range = snap.years.get(sku)
+            if year and year_range:
+                if not year_range[0] <= year <= year_range[1]:
+                    continue
+                best += 1
+
+            results.append({"sku": sku, "score": best, "years": list(year_range) if year_range else None})
+
+        results.sort(key=lambda r: (-r["score"], r["sku"]))
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        snap = self.snapshot
+        return {
+            "skus": len(snap.fitment),
+            "brands": len(snap.by_brand),
+            "models": len(snap.by_model),
+            "sources": list(snap.sources)
+        }
@@ -9,30 +9,54 @@ Endpoints:
 - /v1/catalog/*     - Catálogo productos
 - /v1/orders/*      - Gestión pedidos
 - /v1/kb/*          - Knowledge Base management
+- /metrics          - Latencias p50/p95/p99 por ruta y upstream (1m/5m/1h)
 """
 
-from fastapi import FastAPI, HTTPException, Depends, Header
+from fastapi import FastAPI, HTTPException, Depends, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
 from datetime import datetime, timedelta
+from contextlib import asynccontextmanager
+import importlib.util
+import asyncio
+import time
 import httpx
 import hashlib
 import secrets
 import jwt
+import sys
 import os
 
+# odi_metrics es el mismo módulo de core/ (un solo archivo para todos los servicios)
+ODI_CORE_PATH = os.getenv("ODI_CORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "core"))
+sys.path.append(os.path.abspath(ODI_CORE_PATH))
+
+from catalog_index import CatalogIndex, FitmentIndex
+from odi_store import ODIStore
+from odi_metrics import REGISTRY as METRICS, install_fastapi
+
 # ══════════════════════════════════════════════════════════════════════════════
 # CONFIGURACIÓN
 # ══════════════════════════════════════════════════════════════════════════════
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Arranque: store, índices de catálogo y pool de clientes HTTP. Cierre: liberar sockets."""
+    store.init()
+    await asyncio.to_thread(load_catalog_indexes)
+    open_http_clients()
+    yield
+    await close_http_clients()
+
 app = FastAPI(
     title="ODI API",
     description="Organismo Digital Industrial - API Unificada",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # CORS para PWA
@@ -44,9 +68,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Latencia y conteo por ruta + GET /metrics
+install_fastapi(app)
+
 # Configuración interna
 CORTEX_URL = os.getenv("CORTEX_URL", "http://127.0.0.1:8803")
 PIPELINE_URL = os.getenv("PIPELINE_URL", "http://127.0.0.1:8804")
+N8N_URL = os.getenv("N8N_URL", "http://localhost:5678")
 JWT_SECRET = os.getenv("JWT_SECRET", "odi-secret-change-in-production")
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRATION_HOURS = 24
@@ -72,6 +100,14 @@ class QueryResponse(BaseModel):
     timestamp: str
     event_id: str
 
+class ProductResponse(BaseModel):
+    sku: str
+    source: str                                 # "catalog_index" o "cortex"
+    product: Optional[Dict[str, Any]] = None    # Fila del catálogo (solo desde el índice)
+    answer: Optional[str] = None                # Respuesta de Cortex (SKU fuera del índice)
+    sources: List[str] = []
+    event_id: Optional[str] = None
+
 class FitmentRequest(BaseModel):
     marca: str
     modelo: str
@@ -98,6 +134,8 @@ class ProductSearch(BaseModel):
     query: str
     marca: Optional[str] = None
     categoria: Optional[str] = None
+    min_precio: Optional[float] = None
+    max_precio: Optional[float] = None
     limit: int = 20
 
 class OrderCreate(BaseModel):
@@ -122,12 +160,26 @@ class SystemeLead(BaseModel):
     timestamp: Optional[str] = None
 
 # ══════════════════════════════════════════════════════════════════════════════
-# BASE DE DATOS EN MEMORIA (Reemplazar con Supabase/PostgreSQL en producción)
+# PERSISTENCIA (SQLite WAL compartido entre workers; ODI_API_DB)
 # ══════════════════════════════════════════════════════════════════════════════
 
-users_db: Dict[str, Dict] = {}
-orders_db: Dict[str, Dict] = {}
-leads_db: Dict[str, Dict] = {}  # Leads de Systeme.io
+store = ODIStore()  # Usuarios, pedidos y leads de Systeme.io
+
+# Índices en memoria del catálogo normalizado (SKU, tokens, facetas, fitment)
+catalog_index = CatalogIndex()
+fitment_index = FitmentIndex()
+
+def load_catalog_indexes():
+    try:
+        total = catalog_index.load()
+        print(f"📦 Catálogo indexado: {total} productos")
+    except Exception as e:
+        print(f"⚠️ No se pudo cargar el catálogo: {e}")
+    try:
+        total = fitment_index.load()
+        print(f"🏍️ Fitment indexado: {total} SKUs")
+    except Exception as e:
+        print(f"⚠️ No se pudo cargar el índice de fitment: {e}")
 
 # ══════════════════════════════════════════════════════════════════════════════
 # UTILIDADES
@@ -165,6 +217,54 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
 def generate_event_id() -> str:
     return f"ODI-{int(datetime.now().timestamp() * 1000):X}"
 
+# ══════════════════════════════════════════════════════════════════════════════
+# CLIENTES HTTP (pool compartido por upstream, keep-alive)
+# ══════════════════════════════════════════════════════════════════════════════
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30.0)
+
+# upstream → (base_url, timeout de lectura)
+UPSTREAMS = {
+    "cortex": (CORTEX_URL, 60.0),
+    "pipeline": (PIPELINE_URL, 30.0),
+    "n8n": (N8N_URL, 5.0),
+}
+
+HEALTH_TIMEOUT = 2.0          # Timeout por probe en /health/services
+HEALTH_CACHE_SECONDS = 5.0    # Reutilizar el último resultado durante N segundos
+
+http_clients: Dict[str, httpx.AsyncClient] = {}
+_health_cache: Dict[str, Any] = {"at": 0.0, "services": None}
+
+def _upstream_hooks(name: str) -> Dict[str, list]:
+    """Latencia hasta headers por upstream → histograma upstream_ms{service}."""
+    histogram = METRICS.histogram("upstream_ms", service=name)
+
+    async def on_request(request: httpx.Request):
+        request.extensions["odi_start"] = time.perf_counter()
+
+    async def on_response(response: httpx.Response):
+        start = response.request.extensions.get("odi_start")
+        if start is not None:
+            histogram.record((time.perf_counter() - start) * 1000)
+
+    return {"request": [on_request], "response": [on_response]}
+
+def open_http_clients():
+    for name, (base_url, read_timeout) in UPSTREAMS.items():
+        http_clients[name] = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(read_timeout, connect=3.0),
+            limits=HTTP_LIMITS,
+            http2=HTTP2_AVAILABLE,
+            event_hooks=_upstream_hooks(name)
+        )
+
+async def close_http_clients():
+    await asyncio.gather(*(client.aclose() for client in http_clients.values()))
+    http_clients.clear()
+
 # ══════════════════════════════════════════════════════════════════════════════
 # ENDPOINTS: HEALTH
 # ══════════════════════════════════════════════════════════════════════════════
@@ -179,26 +279,23 @@ async def health_check():
         "timestamp": datetime.now().isoformat()
     }
 
-@app.get("/health/services")
-async def services_health():
-    """Health check de todos los servicios ODI"""
-    services = {}
-
-    # Check Cortex
+async def probe_service(name: str) -> Dict[str, Any]:
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            r = await client.get(f"{CORTEX_URL}/health")
-            services["cortex"] = r.json() if r.status_code == 200 else {"status": "error"}
-    except:
-        services["cortex"] = {"status": "unreachable"}
+        r = await http_clients[name].get("/health", timeout=HEALTH_TIMEOUT)
+        return r.json() if r.status_code == 200 else {"status": "error"}
+    except Exception:
+        return {"status": "unreachable"}
 
-    # Check Pipeline
-    try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            r = await client.get(f"{PIPELINE_URL}/health")
-            services["pipeline"] = r.json() if r.status_code == 200 else {"status": "error"}
-    except:
-        services["pipeline"] = {"status": "unreachable"}
+@app.get("/health/services")
+async def services_health():
+    """Health check de todos los servicios ODI (probes concurrentes, cache corto)"""
+    now = time.monotonic()
+    if _health_cache["services"] is None or now - _health_cache["at"] > HEALTH_CACHE_SECONDS:
+        names = ["cortex", "pipeline"]
+        results = await asyncio.gather(*(probe_service(name) for name in names))
+        _health_cache["services"] = dict(zip(names, results))
+        _health_cache["at"] = now
+    services = _health_cache["services"]
 
     return {
         "api": {"status": "healthy"},
@@ -221,29 +318,30 @@ async def query_cortex(request: QueryRequest):
     event_id = generate_event_id()
 
     try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                f"{CORTEX_URL}/query",
-                json={
-                    "question": request.question,
-                    "voice": request.voice,
-                    "k": request.k
-                }
+        response = await http_clients["cortex"].post(
+            "/query",
+            json={
+                "question": request.question,
+                "voice": request.voice,
+                "k": request.k
+            }
+        )
+
+        if response.status_code == 200:
+            data = response.json()
+            return QueryResponse(
+                answer=data.get("answer", ""),
+                voice=data.get("voice", request.voice),
+                lobe_used=data.get("lobe_used", []),
+                sources=data.get("sources", []),
+                timestamp=data.get("timestamp", datetime.now().isoformat()),
+                event_id=event_id
             )
+        else:
+            raise HTTPException(status_code=502, detail="Error en Cortex")
 
-            if response.status_code == 200:
-                data = response.json()
-                return QueryResponse(
-                    answer=data.get("answer", ""),
-                    voice=data.get("voice", request.voice),
-                    lobe_used=data.get("lobe_used", []),
-                    sources=data.get("sources", []),
-                    timestamp=data.get("timestamp", datetime.now().isoformat()),
-                    event_id=event_id
-                )
-            else:
-                raise HTTPException(status_code=502, detail="Error en Cortex")
-
+    except HTTPException:
+        raise
     except httpx.TimeoutException:
         raise HTTPException(status_code=504, detail="Timeout consultando Cortex")
     except Exception as e:
@@ -253,7 +351,32 @@ async def query_cortex(request: QueryRequest):
 async def fitment_search(request: FitmentRequest):
     """
     Búsqueda de compatibilidad de repuestos por moto
-    """
+
+    Responde desde el índice de fitment (intersección de posting lists por
+    marca/modelo/cilindraje + rango de años). Cortex solo como respaldo.
+    """
+    fitment_index.schedule_refresh()
+    if fitment_index.loaded:
+        matches = fitment_index.lookup(
+            marca=request.marca,
+            modelo=request.modelo,
+            cilindraje=request.cilindraje,
+            year=request.year
+        )
+        if request.repuesto and catalog_index.loaded:
+            repuesto_skus = catalog_index.match_skus(request.repuesto)
+            matches = [m for m in matches if m["sku"] in repuesto_skus]
+
+        if matches:
+            return {
+                "source": "fitment_index",
+                "total": len(matches),
+                "results": [
+                    {**m, "product": catalog_index.get(m["sku"])}
+                    for m in matches[:50]
+                ]
+            }
+
     # Construir pregunta natural para Cortex
     parts = []
     if request.repuesto:
@@ -285,11 +408,8 @@ async def register_user(request: AuthRegisterRequest):
     """
     Registro de nuevo usuario con santo y seña opcional
     """
-    if request.email in users_db:
-        raise HTTPException(status_code=400, detail="Email ya registrado")
-
     user_id = secrets.token_hex(16)
-    users_db[request.email] = {
+    created = store.create_user({
         "user_id": user_id,
         "email": request.email,
         "nombre": request.nombre,
@@ -297,7 +417,9 @@ async def register_user(request: AuthRegisterRequest):
         "password_hash": hash_password(request.password),
         "santo_y_sena_hash": hash_password(request.santo_y_sena) if request.santo_y_sena else None,
         "created_at": datetime.now().isoformat()
-    }
+    })
+    if not created:
+        raise HTTPException(status_code=400, detail="Email ya registrado")
 
     token = create_jwt_token(user_id, request.email)
 
@@ -313,7 +435,7 @@ async def login_user(request: AuthLoginRequest):
     """
     Login con email y password
     """
-    user = users_db.get(request.email)
+    user = store.get_user_by_email(request.email)
     if not user:
         raise HTTPException(status_code=401, detail="Credenciales inválidas")
 
@@ -334,12 +456,8 @@ async def verify_santo_y_sena(request: AuthVerifySecretRequest):
     """
     Verificar santo y seña (para WhatsApp)
     """
-    # Buscar usuario por teléfono
-    user = None
-    for u in users_db.values():
-        if u.get("telefono") == request.telefono:
-            user = u
-            break
+    # Buscar usuario por teléfono (índice idx_users_telefono)
+    user = store.get_user_by_phone(request.telefono)
 
     if not user:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
@@ -366,7 +484,7 @@ async def get_current_user_info(user: Dict = Depends(get_current_user)):
         raise HTTPException(status_code=401, detail="No autenticado")
 
     email = user.get("email")
-    user_data = users_db.get(email)
+    user_data = store.get_user_by_email(email)
 
     if not user_data:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
@@ -386,8 +504,24 @@ async def get_current_user_info(user: Dict = Depends(get_current_user)):
 async def search_catalog(request: ProductSearch):
     """
     Búsqueda en catálogo de productos
-    """
-    # Por ahora, usar Cortex para búsqueda semántica
+
+    Responde desde el índice local (tokens + prefijo + facetas). Solo si no
+    hay catálogo cargado o la búsqueda no encuentra nada se consulta Cortex.
+    """
+    catalog_index.schedule_refresh()
+    if catalog_index.loaded:
+        result = catalog_index.search(
+            request.query,
+            marca=request.marca,
+            categoria=request.categoria,
+            min_precio=request.min_precio,
+            max_precio=request.max_precio,
+            limit=request.limit
+        )
+        if result["total"]:
+            return {"query": request.query, "source": "catalog_index", **result}
+
+    # Pregunta libre: búsqueda semántica en Cortex
     query_request = QueryRequest(
         question=f"productos: {request.query}" +
                  (f" marca {request.marca}" if request.marca else "") +
@@ -398,18 +532,33 @@ async def search_catalog(request: ProductSearch):
 
     return await query_cortex(query_request)
 
-@app.get("/v1/catalog/product/{sku}")
+@app.get("/v1/catalog/product/{sku}", response_model=ProductResponse)
 async def get_product(sku: str):
     """
     Obtener información de un producto por SKU
+
+    Desde el índice local; si el SKU no está (o no hay catálogo cargado)
+    responde Cortex, con la misma forma de respuesta.
     """
+    catalog_index.schedule_refresh()
+    product = catalog_index.get(sku) if catalog_index.loaded else None
+    if product:
+        return ProductResponse(sku=sku, source="catalog_index", product=product)
+
     query_request = QueryRequest(
         question=f"información del producto SKU {sku}",
         voice="tony",
         k=3
     )
 
-    return await query_cortex(query_request)
+    cortex = await query_cortex(query_request)
+    return ProductResponse(
+        sku=sku,
+        source="cortex",
+        answer=cortex.answer,
+        sources=cortex.sources,
+        event_id=cortex.event_id
+    )
 
 # ══════════════════════════════════════════════════════════════════════════════
 # ENDPOINTS: ORDERS
@@ -434,7 +583,7 @@ async def create_order(request: OrderCreate, user: Dict = Depends(get_current_us
         "user_id": user.get("sub") if user else None
     }
 
-    orders_db[order_id] = order
+    store.create_order(order)
 
     return {
         "status": "ok",
@@ -447,26 +596,27 @@ async def get_order(order_id: str):
     """
     Obtener estado de un pedido
     """
-    order = orders_db.get(order_id)
+    order = store.get_order(order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Pedido no encontrado")
 
     return order
 
 @app.get("/v1/orders")
-async def list_orders(user: Dict = Depends(get_current_user)):
+async def list_orders(
+    user: Dict = Depends(get_current_user),
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0)
+):
     """
-    Listar pedidos del usuario
+    Listar pedidos del usuario (paginado, más recientes primero)
     """
     if not user:
         raise HTTPException(status_code=401, detail="No autenticado")
 
-    user_orders = [
-        o for o in orders_db.values()
-        if o.get("user_id") == user.get("sub")
-    ]
+    total, user_orders = store.list_orders(user.get("sub"), limit=limit, offset=offset)
 
-    return {"orders": user_orders}
+    return {"total": total, "limit": limit, "offset": offset, "orders": user_orders}
 
 # ══════════════════════════════════════════════════════════════════════════════
 # ENDPOINTS: KNOWLEDGE BASE
@@ -523,22 +673,21 @@ async def receive_systeme_lead(lead: SystemeLead):
         "created_at": timestamp,
         "status": "new"
     }
-    leads_db[event_id] = lead_data
+    store.create_lead(lead_data)
 
     print(f"📥 [{timestamp}] NUEVO LEAD SYSTEME: {lead.email} via {lead.funnel}")
 
     # Notificar a n8n para iniciar contacto WhatsApp (Tony/Ramona)
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            await client.post(
-                "http://localhost:5678/webhook/odi-ingest",
-                json={
-                    "text": f"Nuevo lead: {lead.name or lead.email} quiere una demo de ODI.",
-                    "canal": "systeme_io",
-                    "metadata": lead_data,
-                    "event_id": event_id
-                }
-            )
+        await http_clients["n8n"].post(
+            "/webhook/odi-ingest",
+            json={
+                "text": f"Nuevo lead: {lead.name or lead.email} quiere una demo de ODI.",
+                "canal": "systeme_io",
+                "metadata": lead_data,
+                "event_id": event_id
+            }
+        )
     except Exception as e:
         print(f"⚠️ n8n no disponible: {e}")
 
@@ -549,13 +698,19 @@ async def receive_systeme_lead(lead: SystemeLead):
     }
 
 @app.get("/v1/leads")
-async def list_leads():
+async def list_leads(
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0)
+):
     """
-    Listar todos los leads capturados
+    Listar leads capturados (paginado, más recientes primero)
     """
+    total, leads = store.list_leads(limit=limit, offset=offset)
     return {
-        "total": len(leads_db),
-        "leads": list(leads_db.values())
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "leads": leads
     }
 
 @app.get("/v1/leads/{event_id}")
@@ -563,7 +718,7 @@ async def get_lead(event_id: str):
     """
     Obtener un lead específico
     """
-    lead = leads_db.get(event_id)
+    lead = store.get_lead(event_id)
     if not lead:
         raise HTTPException(status_code=404, detail="Lead no encontrado")
     return lead
@@ -0,0 +1,150 @@
+"""
+ODI Store - Persistencia de usuarios, pedidos y leads de la API
+SQLite embebido en modo WAL: compartido entre workers de uvicorn
+
+Tablas (columnas indexadas + documento JSON completo):
+- users  → user_id (PK), email (UNIQUE), telefono
+- orders → order_id (PK), user_id + created_at (listado paginado por usuario)
+- leads  → event_id (PK), email, phone, created_at (listado paginado)
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Tuple
+
+# ══════════════════════════════════════════════════════════════════════════════
+# CONFIGURACIÓN
+# ══════════════════════════════════════════════════════════════════════════════
+
+ODI_API_DB = os.getenv("ODI_API_DB", "/opt/odi/data/odi_api.db")
+BUSY_TIMEOUT_MS = 5000      # Espera máxima por el lock de escritura entre workers
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    email TEXT NOT NULL UNIQUE,
+    telefono TEXT,
+    created_at TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_users_telefono ON users(telefono);
+
+CREATE TABLE IF NOT EXISTS orders (
+    order_id TEXT PRIMARY KEY,
+    user_id TEXT,
+    status TEXT,
+    created_at TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_orders_user ON orders(user_id, created_at);
+
+CREATE TABLE IF NOT EXISTS leads (
+    event_id TEXT PRIMARY KEY,
+    email TEXT,
+    phone TEXT,
+    created_at TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_leads_email ON leads(email);
+CREATE INDEX IF NOT EXISTS idx_leads_phone ON leads(phone);
+CREATE INDEX IF NOT EXISTS idx_leads_created ON leads(created_at);
+"""
+
+
+class ODIStore:
+    """Acceso a usuarios, pedidos y leads. Una conexión SQLite por hilo."""
+
+    def __init__(self, db_path: str = ODI_API_DB):
+        self.db_path = Path(db_path)
+        self._local = threading.local()
+
+    def _get_conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_MS / 1000)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+            self._local.conn = conn
+        return conn
+
+    def init(self):
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._get_conn()
+        conn.executescript(SCHEMA)
+        conn.commit()
+
+    def _one(self, sql: str, params: tuple) -> Optional[Dict]:
+        row = self._get_conn().execute(sql, params).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _page(self, table: str, where: str, params: tuple,
+              limit: int, offset: int) -> Tuple[int, List[Dict]]:
+        conn = self._get_conn()
+        total = conn.execute(f"SELECT COUNT(*) FROM {table}{where}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT data FROM {table}{where} ORDER BY created_at DESC LIMIT ? OFFSET ?",
+            (*params, limit, offset)
+        ).fetchall()
+        return total, [json.loads(r[0]) for r in rows]
+
+    # ── Usuarios ──────────────────────────────────────────────────────────────
+
+    def create_user(self, user: Dict[str, Any]) -> bool:
+        """Inserta un usuario. False si el email ya existe."""
+        conn = self._get_conn()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO users (user_id, email, telefono, created_at, data) VALUES (?, ?, ?, ?, ?)",
+                    (user["user_id"], user["email"], user.get("telefono"),
+                     user.get("created_at"), json.dumps(user, ensure_ascii=False))
+                )
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def get_user_by_email(self, email: str) -> Optional[Dict]:
+        return self._one("SELECT data FROM users WHERE email = ?", (email,))
+
+    def get_user_by_phone(self, telefono: str) -> Optional[Dict]:
+        return self._one(
+            "SELECT data FROM users WHERE telefono = ? ORDER BY created_at LIMIT 1", (telefono,)
+        )
+
+    # ── Pedidos ───────────────────────────────────────────────────────────────
+
+    def create_order(self, order: Dict[str, Any]):
+        conn = self._get_conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO orders (order_id, user_id, status, created_at, data) VALUES (?, ?, ?, ?, ?)",
+                (order["order_id"], order.get("user_id"), order.get("status"),
+                 order.get("created_at"), json.dumps(order, ensure_ascii=False))
+            )
+
+    def get_order(self, order_id: str) -> Optional[Dict]:
+        return self._one("SELECT data FROM orders WHERE order_id = ?", (order_id,))
+
+    def list_orders(self, user_id: str, limit: int = 50, offset: int = 0) -> Tuple[int, List[Dict]]:
+        return self._page("orders", " WHERE user_id = ?", (user_id,), limit, offset)
+
+    # ── Leads ─────────────────────────────────────────────────────────────────
+
+    def create_lead(self, lead: Dict[str, Any]):
+        conn = self._get_conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO leads (event_id, email, phone, created_at, data) VALUES (?, ?, ?, ?, ?)",
+                (lead["event_id"], lead.get("email"), lead.get("phone"),
+                 lead.get("created_at"), json.dumps(lead, ensure_ascii=False))
+            )
+
+    def get_lead(self, event_id: str) -> Optional[Dict]:
+        return self._one("SELECT data FROM leads WHERE event_id = ?", (event_id,))
+
+    def list_leads(self, limit: int = 50, offset: int = 0) -> Tuple[int, List[Dict]]:
+        return self._page("leads", "", (), limit, offset)
@@ -10,20 +10,28 @@ Flujo:
 Watchea:
   /mnt/volume_sfo3_01/profesion/10 empresas ecosistema ODI/Data/
 
+Los eventos de watchdog (hilo propio) pasan al event loop con
+call_soon_threadsafe. Un archivo se considera completo cuando su
+size/mtime no cambia durante STABLE_SECONDS (los que siguen vacíos tras
+EMPTY_TIMEOUT_SECONDS se descartan); los archivos listos se
+agrupan en lotes (BATCH_MAX_FILES o BATCH_LINGER_SECONDS) y se envían
+al pipeline con concurrencia acotada. Los jobs y los archivos ya
+procesados (indexados por ruta) viven en el JobStore compartido con el
+Pipeline Service (namespace "business").
+
 Uso:
     python3 odi_business_daemon.py
     systemctl start odi-business-daemon
 """
 import os
 import sys
-import json
 import time
 import logging
 import hashlib
 import asyncio
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 from dataclasses import dataclass, asdict
 from enum import Enum
 
@@ -32,6 +40,11 @@ from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 from dotenv import load_dotenv
 
+try:
+    from .odi_job_store import JobStore
+except ImportError:
+    from odi_job_store import JobStore
+
 load_dotenv("/opt/odi/.env")
 
 # ============================================
@@ -46,6 +59,17 @@ CONFIG = {
     "supported_extensions": {".pdf", ".xlsx", ".xls", ".csv"},
 }
 
+# Detección de archivos completos y lotes
+STABLE_POLL_SECONDS = float(os.getenv("ODI_STABLE_POLL_SECONDS", "1"))
+STABLE_SECONDS = float(os.getenv("ODI_STABLE_SECONDS", "3"))        # size/mtime sin cambios
+EMPTY_TIMEOUT_SECONDS = float(os.getenv("ODI_EMPTY_TIMEOUT_SECONDS", "600"))  # Vacíos se descartan
+BATCH_MAX_FILES = int(os.getenv("ODI_BATCH_MAX_FILES", "50"))
+BATCH_LINGER_SECONDS = float(os.getenv("ODI_BATCH_LINGER_SECONDS", "5"))
+SUBMIT_CONCURRENCY = int(os.getenv("ODI_SUBMIT_CONCURRENCY", "8"))
+SUBMIT_RETRIES = 5                      # Reintentos si el pipeline responde 429/5xx
+JOBS_NAMESPACE = "business"
+PRUNE_INTERVAL_SECONDS = 6 * 3600
+
 # Mapeo de carpetas a empresas
 EMPRESA_CONFIG = {
     "Kaiqi": {"shop": "KAIQI", "priority": 1},
@@ -111,26 +135,23 @@ class BusinessJob:
 # JOB MANAGER
 # ============================================
 class JobManager:
-    """Gestiona los jobs de negocio."""
+    """Gestiona los jobs de negocio (JobStore compartido, namespace "business")."""
 
-    def __init__(self, jobs_path: str):
+    def __init__(self, jobs_path: str, store: Optional[JobStore] = None):
         self.jobs_path = Path(jobs_path)
         self.jobs_path.mkdir(parents=True, exist_ok=True)
-        self.active_jobs: Dict[str, BusinessJob] = {}
-        self._load_pending_jobs()
-
-    def _load_pending_jobs(self):
-        """Carga jobs pendientes del disco."""
-        for job_file in self.jobs_path.glob("*.json"):
-            try:
-                with open(job_file) as f:
-                    data = json.load(f)
-                if data.get("status") not in ["completed", "failed"]:
-                    job = BusinessJob(**data)
-                    self.active_jobs[job.job_id] = job
-                    log.info(f"Loaded pending job: {job.job_id}")
-            except Exception as e:
-                log.error(f"Error loading job {job_file}: {e}")
+        self.store = store or JobStore()
+        self._import_legacy_jobs()
+
+    def _import_legacy_jobs(self):
+        """Importa (una vez) los JSON por job y processed_files.txt de versiones anteriores."""
+        imported = self.store.import_json_dir(JOBS_NAMESPACE, self.jobs_path)
+        if imported:
+            log.info(f"Imported {imported} job(s) from {self.jobs_path}")
+        legacy = self.jobs_path / "processed_files.txt"
+        imported = self.store.import_processed_list(JOBS_NAMESPACE, legacy)
+        if imported:
+            log.info(f"Imported {imported} processed file(s) from {legacy}")
 
     def create_job(self, empresa: str, source_file: str) -> BusinessJob:
         """Crea un nuevo job de negocio."""
@@ -150,36 +171,41 @@ class JobManager:
             updated_at=datetime.now().isoformat()
         )
 
-        self.active_jobs[job_id] = job
-        self._save_job(job)
+        self.store.save(JOBS_NAMESPACE, job_id, job.status, asdict(job), job.created_at)
 
         log.info(f"Created job {job_id} for {empresa}: {Path(source_file).name}")
         return job
 
-    def update_job(self, job_id: str, **kwargs):
-        """Actualiza un job."""
-        if job_id in self.active_jobs:
-            job = self.active_jobs[job_id]
-            for key, value in kwargs.items():
-                if hasattr(job, key):
-                    setattr(job, key, value)
-            job.updated_at = datetime.now().isoformat()
-            self._save_job(job)
-
-    def _save_job(self, job: BusinessJob):
-        """Guarda job a disco."""
-        job_file = self.jobs_path / f"{job.job_id}.json"
-        with open(job_file, "w") as f:
-            json.dump(asdict(job), f, indent=2)
+    def update_job(self, job_id: str, expected: Optional[List[str]] = None, **kwargs) -> bool:
+        """
+        Actualiza un job en una sola sentencia. Con expected, solo si su
+        estado actual está en esa lista (transición atómica).
+        """
+        fields = {k: v for k, v in kwargs.items() if k in BusinessJob.__dataclass_fields__}
+        status = fields.pop("status", None)
+        return self.store.transition(JOBS_NAMESPACE, job_id, status, expected=expected, **fields)
 
     def get_job(self, job_id: str) -> Optional[BusinessJob]:
-        return self.active_jobs.get(job_id)
+        data = self.store.get(JOBS_NAMESPACE, job_id)
+        return BusinessJob(**data) if data else None
 
-    def list_jobs(self, status: Optional[str] = None) -> List[BusinessJob]:
-        jobs = list(self.active_jobs.values())
-        if status:
-            jobs = [j for j in jobs if j.status == status]
-        return sorted(jobs, key=lambda x: x.created_at, reverse=True)
+    def list_jobs(self, status: Optional[str] = None, limit: Optional[int] = None) -> List[BusinessJob]:
+        return [BusinessJob(**data) for data in self.store.list(JOBS_NAMESPACE, status=status, limit=limit)]
+
+    def counts(self) -> Dict[str, int]:
+        """Jobs por estado (contadores del store, sin recorrer jobs)."""
+        return self.store.counts(JOBS_NAMESPACE)
+
+    def prune(self) -> int:
+        return self.store.prune(JOBS_NAMESPACE)
+
+    def filter_unprocessed(self, paths: List[str]) -> List[str]:
+        """Rutas que aún no generaron un job."""
+        return self.store.filter_unprocessed(JOBS_NAMESPACE, paths)
+
+    def mark_processed(self, rows: List[Tuple[str, int, float, str]]):
+        """Registra (path, size, mtime, job_id) como procesados."""
+        self.store.mark_processed(JOBS_NAMESPACE, rows)
 
 
 # ============================================
@@ -188,27 +214,48 @@ class JobManager:
 class PipelineClient:
     """Cliente para el servicio de pipeline."""
 
-    def __init__(self, base_url: str):
+    def __init__(self, base_url: str, concurrency: int = SUBMIT_CONCURRENCY):
         self.base_url = base_url
-        self.client = httpx.AsyncClient(timeout=300.0)
+        self.client = httpx.AsyncClient(
+            timeout=300.0,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        )
+        self._slots = asyncio.Semaphore(concurrency)
 
     async def submit_job(self, job: BusinessJob) -> Dict[str, Any]:
-        """Envía un job al pipeline."""
-        try:
-            response = await self.client.post(
-                f"{self.base_url}/pipeline/start",
-                json={
-                    "job_id": job.job_id,
-                    "empresa": job.empresa,
-                    "shop_key": job.shop_key,
-                    "source_file": job.source_file,
-                    "images_folder": job.images_folder
-                }
-            )
-            return response.json()
-        except Exception as e:
-            log.error(f"Pipeline submission failed: {e}")
-            return {"error": str(e)}
+        """
+        Envía un job al pipeline. Con la cola del pipeline llena (429) o
+        errores 5xx reintenta respetando Retry-After; un 409 significa que
+        el job ya estaba encolado.
+        """
+        payload = {
+            "job_id": job.job_id,
+            "empresa": job.empresa,
+            "shop_key": job.shop_key,
+            "source_file": job.source_file,
+            "images_folder": job.images_folder
+        }
+        async with self._slots:
+            for attempt in range(SUBMIT_RETRIES + 1):
+                try:
+                    response = await self.client.post(f"{self.base_url}/pipeline/start", json=payload)
+                except httpx.HTTPError as e:
+                    error, delay = str(e), 2 ** attempt
+                else:
+                    if response.status_code < 400:
+                        return response.json()
+                    if response.status_code == 409:
+                        return {"job_id": job.job_id, "status": "queued", "message": "Already queued"}
+                    error = f"HTTP {response.status_code}: {response.text[:200]}"
+                    if response.status_code != 429 and response.status_code < 500:
+                        break
+                    delay = float(response.headers.get("Retry-After", 2 ** attempt))
+                if attempt < SUBMIT_RETRIES:
+                    log.warning(f"Pipeline busy for {job.job_id} ({error}); retrying in {delay:.0f}s")
+                    await asyncio.sleep(delay)
+
+        log.error(f"Pipeline submission failed: {error}")
+        return {"error": error}
 
     async def get_status(self, job_id: str) -> Dict[str, Any]:
         """Obtiene estado de un job."""
@@ -226,27 +273,29 @@ class PipelineClient:
 # FILE HANDLER
 # ============================================
 class CatalogHandler(FileSystemEventHandler):
-    """Handler para detectar nuevos catálogos."""
+    """
+    Handler para detectar nuevos catálogos.
+
+    Los callbacks de watchdog solo pasan la ruta al event loop; la espera
+    a que el archivo termine de copiarse, el registro de jobs y el envío
+    al pipeline ocurren en run().
+    """
 
     def __init__(self, job_manager: JobManager, pipeline_client: PipelineClient):
         self.job_manager = job_manager
         self.pipeline_client = pipeline_client
-        self.processed_files = set()
-        self._load_processed()
-
-    def _load_processed(self):
-        """Carga archivos ya procesados."""
-        cache_file = Path(CONFIG["jobs_path"]) / "processed_files.txt"
-        if cache_file.exists():
-            self.processed_files = set(cache_file.read_text().strip().split("\n"))
-
-    def _save_processed(self, filepath: str):
-        """Guarda archivo como procesado."""
-        self.processed_files.add(filepath)
-        cache_file = Path(CONFIG["jobs_path"]) / "processed_files.txt"
-        cache_file.parent.mkdir(parents=True, exist_ok=True)
-        with open(cache_file, "a") as f:
-            f.write(filepath + "\n")
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.queue: Optional[asyncio.Queue] = None
+        # Ruta -> (size, mtime, desde cuándo no cambia)
+        self._pending: Dict[str, Tuple[int, float, float]] = {}
+        self._ready: List[Tuple[str, int, float]] = []
+        self._ready_since = 0.0
+        self._tasks = set()
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        """Asocia el handler al event loop que procesará los eventos."""
+        self.loop = loop
+        self.queue = asyncio.Queue()
 
     def _detect_empresa(self, filepath: str) -> Optional[str]:
         """Detecta la empresa basado en la ruta."""
@@ -256,36 +305,121 @@ class CatalogHandler(FileSystemEventHandler):
                 return empresa
         return None
 
+    # -----------------------------------------------------
+    # Hilo de watchdog
+    # -----------------------------------------------------
     def on_created(self, event):
-        if event.is_directory:
-            return
+        if not event.is_directory:
+            self._enqueue(event.src_path)
 
-        filepath = event.src_path
-        ext = Path(filepath).suffix.lower()
+    def on_moved(self, event):
+        # Subidas que escriben a un temporal y luego renombran
+        if not event.is_directory:
+            self._enqueue(event.dest_path)
 
-        if ext not in CONFIG["supported_extensions"]:
+    def _enqueue(self, filepath: str):
+        if Path(filepath).suffix.lower() not in CONFIG["supported_extensions"]:
             return
-
-        if filepath in self.processed_files:
-            log.debug(f"Already processed: {filepath}")
+        if self.loop is None or self.loop.is_closed():
+            log.warning(f"Event loop not running, dropped: {filepath}")
             return
-
-        # Esperar a que el archivo termine de escribirse
-        time.sleep(2)
-
-        empresa = self._detect_empresa(filepath)
-        if not empresa:
-            log.warning(f"Could not detect empresa for: {filepath}")
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, filepath)
+
+    # -----------------------------------------------------
+    # Event loop
+    # -----------------------------------------------------
+    async def run(self):
+        """Recibe rutas, espera a que estén completas y envía lotes."""
+        await asyncio.gather(self._collect(), self._watch())
+
+    async def _collect(self):
+        while True:
+            filepath = await self.queue.get()
+            self._pending.setdefault(filepath, (-1, 0.0, 0.0))
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(STABLE_POLL_SECONDS)
+            if self._pending:
+                stats = await asyncio.to_thread(self._stat_all, list(self._pending))
+                self._update_pending(stats)
+
+            if self._ready and (
+                len(self._ready) >= BATCH_MAX_FILES
+                or time.monotonic() - self._ready_since >= BATCH_LINGER_SECONDS
+            ):
+                batch, self._ready = self._ready[:BATCH_MAX_FILES], self._ready[BATCH_MAX_FILES:]
+                self._ready_since = time.monotonic()
+                self.spawn(self.process_batch(batch))
+
+    def spawn(self, coro) -> asyncio.Task:
+        """Lanza una tarea en segundo plano manteniendo la referencia."""
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    @staticmethod
+    def _stat_all(paths: List[str]) -> Dict[str, Optional[Tuple[int, float]]]:
+        stats = {}
+        for path in paths:
+            try:
+                st = os.stat(path)
+                stats[path] = (st.st_size, st.st_mtime)
+            except OSError:
+                stats[path] = None
+        return stats
+
+    def _update_pending(self, stats: Dict[str, Optional[Tuple[int, float]]]):
+        now = time.monotonic()
+        for path, stat in stats.items():
+            if stat is None:
+                # Borrado o renombrado (temporal de la subida): lo reporta on_moved
+                self._pending.pop(path, None)
+                continue
+            size, mtime, since = self._pending[path]
+            if (size, mtime) != stat:
+                self._pending[path] = (*stat, now)
+            elif size == 0:
+                # Creado pero sin datos: se espera un tiempo acotado
+                if now - since >= EMPTY_TIMEOUT_SECONDS:
+                    del self._pending[path]
+                    log.warning(f"Dropped empty file after {EMPTY_TIMEOUT_SECONDS:.0f}s (use --scan once written): {path}")
+            elif now - since >= STABLE_SECONDS:
+                del self._pending[path]
+                if not self._ready:
+                    self._ready_since = now
+                self._ready.append((path, size, mtime))
+
+    async def process_batch(self, batch: List[Tuple[str, int, float]]):
+        """Registra los jobs del lote y los envía al pipeline."""
+        try:
+            jobs = await asyncio.to_thread(self._register, batch)
+        except Exception as e:
+            log.error(f"Error registering batch of {len(batch)} files: {e}")
             return
-
-        log.info(f"New catalog detected: {Path(filepath).name} [{empresa}]")
-
-        # Crear job
-        job = self.job_manager.create_job(empresa, filepath)
-        self._save_processed(filepath)
-
-        # Enviar al pipeline (async)
-        asyncio.create_task(self._submit_to_pipeline(job))
+        if jobs:
+            log.info(f"Submitting batch of {len(jobs)} catalog(s) to pipeline")
+            await asyncio.gather(*(self._submit_to_pipeline(job) for job in jobs))
+
+    def _register(self, batch: List[Tuple[str, int, float]]) -> List[BusinessJob]:
+        """Crea un job por archivo nuevo y lo marca como procesado."""
+        stats = {path: (size, mtime) for path, size, mtime in batch}
+        jobs, rows = [], []
+        for filepath in self.job_manager.filter_unprocessed(list(dict.fromkeys(stats))):
+            empresa = self._detect_empresa(filepath)
+            if not empresa:
+                log.warning(f"Could not detect empresa for: {filepath}")
+                continue
+
+            log.info(f"New catalog detected: {Path(filepath).name} [{empresa}]")
+            job = self.job_manager.create_job(empresa, filepath)
+            jobs.append(job)
+            rows.append((filepath, *stats[filepath], job.job_id))
+
+        if rows:
+            self.job_manager.mark_processed(rows)
+        return jobs
 
     async def _submit_to_pipeline(self, job: BusinessJob):
         """Envía job al pipeline de forma asíncrona."""
@@ -294,8 +428,9 @@ class CatalogHandler(FileSystemEventHandler):
             if "error" in result:
                 self.job_manager.update_job(job.job_id, status=JobStatus.FAILED.value, errors=[result["error"]])
                 log.error(f"Job {job.job_id} failed: {result['error']}")
-            else:
-                self.job_manager.update_job(job.job_id, status=JobStatus.EXTRACTING.value)
+            elif self.job_manager.update_job(
+                job.job_id, expected=[JobStatus.PENDING.value], status=JobStatus.EXTRACTING.value
+            ):
                 log.info(f"Job {job.job_id} submitted to pipeline")
         except Exception as e:
             self.job_manager.update_job(job.job_id, status=JobStatus.FAILED.value, errors=[str(e)])
@@ -330,27 +465,54 @@ class ODIBusinessDaemon:
             log.error(f"Watch path not found: {watch_path}")
             return
 
+        try:
+            asyncio.run(self.run(watch_path))
+        except KeyboardInterrupt:
+            log.info("Business Daemon stopped")
+
+    async def run(self, watch_path: Path):
+        self.handler.attach(asyncio.get_running_loop())
+
         # Configurar observer
         self.observer.schedule(self.handler, str(watch_path), recursive=True)
         self.observer.start()
 
+        # Jobs creados que no alcanzaron a enviarse antes de un reinicio
+        pending = self.job_manager.list_jobs(JobStatus.PENDING.value)
+        if pending:
+            log.info(f"Resubmitting {len(pending)} pending job(s)")
+            for job in pending:
+                self.handler.spawn(self.handler._submit_to_pipeline(job))
+
         log.info("Business Daemon started. Waiting for catalogs...")
 
         try:
-            while True:
-                time.sleep(10)
-                # Reportar estado cada minuto
-                jobs = self.job_manager.list_jobs()
-                pending = len([j for j in jobs if j.status == JobStatus.PENDING.value])
-                running = len([j for j in jobs if j.status not in [JobStatus.PENDING.value, JobStatus.COMPLETED.value, JobStatus.FAILED.value]])
-                if pending > 0 or running > 0:
-                    log.info(f"Jobs: {pending} pending, {running} running")
-
-        except KeyboardInterrupt:
+            await asyncio.gather(self.handler.run(), self._report())
+        finally:
             self.observer.stop()
-            log.info("Business Daemon stopped")
-
-        self.observer.join()
+            await asyncio.to_thread(self.observer.join)
+            await self.pipeline_client.close()
+
+    async def _report(self):
+        last_prune = 0.0
+        while True:
+            await asyncio.sleep(10)
+            if time.monotonic() - last_prune >= PRUNE_INTERVAL_SECONDS:
+                last_prune = time.monotonic()
+                try:
+                    pruned = await asyncio.to_thread(self.job_manager.prune)
+                    if pruned:
+                        log.info(f"Pruned {pruned} finished job(s)")
+                except Exception as e:
+                    log.error(f"Error pruning jobs: {e}")
+
+            # Reportar estado
+            counts = self.job_manager.counts()
+            pending = counts.get(JobStatus.PENDING.value, 0)
+            running = sum(n for status, n in counts.items() if status not in [JobStatus.PENDING.value, JobStatus.COMPLETED.value, JobStatus.FAILED.value])
+            waiting = len(self.handler._pending) + len(self.handler._ready)
+            if pending > 0 or running > 0 or waiting > 0:
+                log.info(f"Jobs: {pending} pending, {running} running; files settling: {waiting}")
 
     def process_existing(self):
         """Procesa catálogos existentes que no han sido procesados."""
@@ -360,16 +522,24 @@ class ODIBusinessDaemon:
         if not watch_path.exists():
             return
 
-        for ext in CONFIG["supported_extensions"]:
-            for filepath in watch_path.rglob(f"*{ext}"):
-                if str(filepath) in self.handler.processed_files:
-                    continue
-
-                empresa = self.handler._detect_empresa(str(filepath))
-                if empresa:
-                    log.info(f"Found unprocessed: {filepath.name} [{empresa}]")
-                    job = self.job_manager.create_job(empresa, str(filepath))
-                    self.handler._save_processed(str(filepath))
+        files = [
+            str(filepath)
+            for ext in CONFIG["supported_extensions"]
+            for filepath in watch_path.rglob(f"*{ext}")
+        ]
+        new_files = self.job_manager.filter_unprocessed(files)
+        log.info(f"Found {len(new_files)} unprocessed of {len(files)} catalogs")
+        if new_files:
+            asyncio.run(self._process_files(new_files))
+
+    async def _process_files(self, paths: List[str]):
+        stats = CatalogHandler._stat_all(paths)
+        batch = [(path, *stat) for path, stat in stats.items() if stat is not None]
+        try:
+            for i in range(0, len(batch), BATCH_MAX_FILES):
+                await self.handler.process_batch(batch[i:i + BATCH_MAX_FILES])
+        finally:
+            await self.pipeline_client.close()
 
 
 def main():
@@ -384,9 +554,9 @@ def main():
     daemon = ODIBusinessDaemon()
 
     if args.list_jobs:
-        jobs = daemon.job_manager.list_jobs()
-        print(f"\nTotal jobs: {len(jobs)}\n")
-        for job in jobs[:20]:
+        counts = daemon.job_manager.counts()
+        print(f"\nTotal jobs: {sum(counts.values())} {counts}\n")
+        for job in daemon.job_manager.list_jobs(limit=20):
             print(f"  [{job.status:12}] {job.job_id} | {job.empresa:10} | {Path(job.source_file).name}")
     elif args.scan:
         daemon.process_existing()
@@ -23,7 +23,9 @@ Uso:
 """
 import os
 import re
+import time
 import logging
+from concurrent.futures import ThreadPoolExecutor, wait
 from typing import List, Dict, Any, Optional, Literal
 from datetime import datetime
 from pathlib import Path
@@ -41,6 +43,12 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
 
+# Recuperación híbrida (BM25 + códigos exactos + vectores)
+try:
+    from .odi_lexical_index import LexicalIndex, lexical_index_path, fuse_results
+except ImportError:
+    from odi_lexical_index import LexicalIndex, lexical_index_path, fuse_results
+
 # ============================================
 # CONFIGURACIÓN
 # ============================================
@@ -64,6 +72,10 @@ LOBES = {
     }
 }
 
+# Búsqueda multi-lóbulo
+LOBE_TIMEOUT_S = float(os.getenv("ODI_LOBE_TIMEOUT_S", "2.0"))  # Presupuesto de latencia por lóbulo
+RRF_K = 60  # Constante de Reciprocal Rank Fusion
+
 # Logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 log = logging.getLogger(__name__)
@@ -205,6 +217,8 @@ class ODICortex:
         self.llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.3)
         self.router = SemanticRouter()
         self.vectorstores = {}
+        self.lexical = {}
+        self.executor = ThreadPoolExecutor(max_workers=len(LOBES), thread_name_prefix="lobe")
 
         # Cargar vector stores
         for lobe_name, config in LOBES.items():
@@ -216,28 +230,91 @@ class ODICortex:
                         collection_name=config["collection"]
                     )
                     self.vectorstores[lobe_name] = vs
+                    self.lexical[lobe_name] = LexicalIndex(
+                        lexical_index_path(config["embeddings"], config["collection"]),
+                        source_field="path"
+                    )
                     log.info(f"Loaded lobe: {lobe_name}")
                 except Exception as e:
                     log.error(f"Error loading {lobe_name}: {e}")
 
-    def search(self, query: str, lobe: str, k: int = 5) -> List[Dict]:
-        """Búsqueda en un lóbulo específico."""
+    def _search_by_vector(self, embedding: List[float], lobe: str, k: int) -> List[Dict]:
+        """Búsqueda en un lóbulo con un embedding ya calculado."""
         if lobe not in self.vectorstores:
             return []
 
         vs = self.vectorstores[lobe]
-        results = vs.similarity_search_with_score(query, k=k)
+        results = vs.similarity_search_by_vector_with_relevance_scores(embedding, k=k)
 
         return [
             {
                 "content": doc.page_content,
                 "metadata": doc.metadata,
-                "score": float(score),
+                "relevance": float(score),
                 "lobe": lobe
             }
             for doc, score in results
         ]
 
+    def _search_hybrid(self, query: str, embedding: List[float], lobe: str, k: int) -> List[Dict]:
+        """Búsqueda híbrida en un lóbulo: vectorial + BM25 + códigos exactos."""
+        vector_results = self._search_by_vector(embedding, lobe, k)
+        lexical_results = [
+            {**r, "lobe": lobe} for r in self.lexical[lobe].search(query, k=k)
+        ] if lobe in self.lexical else []
+        return fuse_results(vector_results, lexical_results, k)
+
+    def search(self, query: str, lobe: str, k: int = 5) -> List[Dict]:
+        """Búsqueda en un lóbulo específico."""
+        if lobe not in self.vectorstores:
+            return []
+        return self._search_hybrid(query, self.embeddings.embed_query(query), lobe, k)
+
+    def search_lobes(self, query: str, lobes: List[str], k: int = 5) -> List[Dict]:
+        """
+        Búsqueda concurrente en varios lóbulos con fusión de resultados.
+
+        La query se embebe una sola vez y cada lóbulo se consulta en paralelo
+        con ese vector. Los lóbulos que no responden dentro de LOBE_TIMEOUT_S
+        se descartan para no bloquear la respuesta. Los rankings se fusionan
+        con Reciprocal Rank Fusion, ya que las distancias de distintas
+        colecciones no son comparables entre sí.
+        """
+        lobes = [lobe for lobe in lobes if lobe in self.vectorstores]
+        if not lobes:
+            return []
+
+        embedding = self.embeddings.embed_query(query)
+        if len(lobes) == 1:
+            return self._search_hybrid(query, embedding, lobes[0], k)
+
+        start = time.monotonic()
+        futures = {
+            self.executor.submit(self._search_hybrid, query, embedding, lobe, k): lobe
+            for lobe in lobes
+        }
+        done, not_done = wait(futures, timeout=LOBE_TIMEOUT_S)
+
+        for future in not_done:
+            future.cancel()
+            log.warning(f"Lobe {futures[future]} exceeded {LOBE_TIMEOUT_S}s budget, skipped")
+
+        fused = []
+        for future in done:
+            lobe = futures[future]
+            try:
+                results = future.result()
+            except Exception as e:
+                log.error(f"Search error in lobe {lobe}: {e}")
+                continue
+            for rank, result in enumerate(results):
+                result["fused_score"] = 1.0 / (RRF_K + rank + 1)
+                fused.append(result)
+
+        fused.sort(key=lambda x: (x["match"] != "exact", -x["fused_score"]))
+        log.info(f"Searched {len(done)}/{len(lobes)} lobes in {time.monotonic() - start:.3f}s")
+        return fused[:k]
+
     def query(self, request: QueryRequest) -> QueryResponse:
         """Consulta RAG con routing automático."""
 
@@ -249,15 +326,8 @@ class ODICortex:
         else:
             lobes_to_query = [request.lobe]
 
-        # Buscar en lóbulos
-        all_results = []
-        for lobe in lobes_to_query:
-            results = self.search(request.question, lobe, k=request.k)
-            all_results.extend(results)
-
-        # Ordenar por score y tomar los mejores
-        all_results.sort(key=lambda x: x["score"])
-        top_results = all_results[:request.k]
+        # Buscar en lóbulos (en paralelo, con fusión de rankings)
+        top_results = self.search_lobes(request.question, lobes_to_query, k=request.k)
 
         # Construir contexto
         context = "\n\n---\n\n".join([
@@ -296,7 +366,8 @@ class ODICortex:
                     "source": r["metadata"].get("source", "unknown"),
                     "folder": r["metadata"].get("folder", "unknown"),
                     "lobe": r["lobe"],
-                    "score": r["score"]
+                    "match": r["match"],
+                    "fused_score": r["fused_score"]
                 }
                 for r in top_results
             ]
@@ -5,19 +5,28 @@ ODI Feedback Loop Processor
 Procesa feedback en tiempo real y dispara acciones automaticas.
 
 Funcionalidades:
-- Escucha eventos de Redis (queries, feedbacks, indexed)
+- Consume Redis Streams (feedback, indexed, alert) con consumer groups:
+  varios workers comparten la carga, con lectura bloqueante (XREADGROUP)
+- ACKs en lote y reclamo (XAUTOCLAIM) de entradas de consumers caidos
 - Dispara webhooks a n8n/Systeme.io
 - Genera alertas cuando hay feedback negativo
-- Actualiza metricas en tiempo real
+- Actualiza metricas en tiempo real (ventanas 1m/5m/1h, GET /metrics en
+  FEEDBACK_METRICS_PORT)
 - Re-entrena/ajusta basado en feedback
 
+Requiere Redis >= 6.2 (XAUTOCLAIM) y redis-py >= 5.0.1 (redis.asyncio, aclose()).
+
 Uso:
     python odi_feedback_loop.py
+
+Productores:
+    XADD odi:stream:feedback * data '{"query_id": ..., "rating": 1}'
 """
 
 import os
 import json
 import logging
+import socket
 import asyncio
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional, List
@@ -26,13 +35,19 @@ from collections import defaultdict
 import time
 
 from dotenv import load_dotenv
-import redis
+import redis.asyncio as aioredis
+from redis.exceptions import ResponseError
 import httpx
 from rich.console import Console
 from rich.live import Live
 from rich.table import Table
 from rich.panel import Panel
 
+try:
+    from .odi_metrics import REGISTRY as METRICS, serve_metrics
+except ImportError:
+    from odi_metrics import REGISTRY as METRICS, serve_metrics
+
 # Load config
 load_dotenv("/opt/odi/config/.env")
 
@@ -47,8 +62,25 @@ CONFIG = {
     "alert_threshold_rating": 2,  # Rating <= this triggers alert
     "alert_threshold_count": 3,   # Number of low ratings before alert
     "metrics_window_minutes": 60,  # Window for metrics calculation
+    "metrics_port": int(os.getenv("FEEDBACK_METRICS_PORT", "8805")),
 }
 
+# Redis Streams
+FEEDBACK_STREAM = "odi:stream:feedback"
+INDEXED_STREAM = "odi:stream:indexed"
+ALERT_STREAM = "odi:stream:alert"
+DEAD_LETTER_STREAM = "odi:stream:dead"
+CONSUMER_GROUP = os.getenv("FEEDBACK_GROUP", "odi-feedback-loop")
+CONSUMER_NAME = os.getenv("FEEDBACK_CONSUMER", f"{socket.gethostname()}-{os.getpid()}")
+STREAM_MAXLEN = 100000        # XADD MAXLEN ~ (recorte aproximado)
+READ_COUNT = 100              # Entradas por XREADGROUP
+READ_BLOCK_MS = 5000          # Bloqueo de XREADGROUP (sin polling)
+ACK_BATCH_SIZE = 100          # XACK en lote: al llegar a N ids...
+ACK_FLUSH_SECONDS = 0.5       # ...o cada N segundos
+CLAIM_IDLE_MS = 60000         # Entradas sin ACK por mas de esto se reclaman
+CLAIM_INTERVAL_SECONDS = 30
+MAX_DELIVERIES = 5            # Luego va a DEAD_LETTER_STREAM
+
 # Logging
 logging.basicConfig(
     level=os.getenv("LOG_LEVEL", "INFO"),
@@ -104,33 +136,45 @@ class ODIMetrics:
     feedback_count: int = 0
     webhook_success: int = 0
     webhook_failed: int = 0
+    stream_pending: int = 0
+    entries_reclaimed: int = 0
+    entries_dead: int = 0
 
 
 class ODIFeedbackLoop:
     """Procesador principal del feedback loop."""
 
-    def __init__(self):
-        self.redis = redis.Redis(
+    def __init__(self, redis_client: Optional[aioredis.Redis] = None,
+                 consumer_name: str = CONSUMER_NAME):
+        self.redis = redis_client or aioredis.Redis(
             host=CONFIG["redis_host"],
             port=CONFIG["redis_port"],
             db=CONFIG["redis_db"],
             decode_responses=True
         )
 
-        self.pubsub = self.redis.pubsub()
+        self.consumer = consumer_name
+        self.handlers = {
+            FEEDBACK_STREAM: self._handle_feedback_event,
+            INDEXED_STREAM: self._handle_index_event,
+            ALERT_STREAM: self._handle_alert,
+        }
         self.metrics = ODIMetrics()
-        self.recent_feedbacks: List[FeedbackEvent] = []
+        self.window_seconds = CONFIG["metrics_window_minutes"] * 60
         self.running = True
 
+        # IDs procesados pendientes de XACK, por stream
+        self._acks: Dict[str, List[str]] = defaultdict(list)
+        self._ack_ready = asyncio.Event()
+
         # HTTP client for webhooks
         self.http_client: Optional[httpx.AsyncClient] = None
 
     async def start(self):
         """Inicia el feedback loop."""
-        logger.info("Starting ODI Feedback Loop...")
+        logger.info(f"Starting ODI Feedback Loop (consumer {self.consumer})...")
 
-        # Subscribe to Redis channels
-        self.pubsub.subscribe("odi:indexed", "odi:feedback_new", "odi:alert")
+        await self._ensure_groups()
 
         # Initialize HTTP client
         self.http_client = httpx.AsyncClient(timeout=30.0)
@@ -140,31 +184,43 @@ class ODIFeedbackLoop:
 
         # Start tasks
         await asyncio.gather(
-            self._listen_redis(),
-            self._process_feedback_queue(),
+            self._consume_streams(),
+            self._ack_flusher(),
+            self._reclaimer(),
             self._metrics_reporter(),
-            self._alert_checker()
+            serve_metrics(METRICS, port=CONFIG["metrics_port"])
         )
 
     async def stop(self):
         """Detiene el feedback loop."""
         self.running = False
+        self._ack_ready.set()
+        await self._flush_acks()
         if self.http_client:
             await self.http_client.aclose()
-        self.pubsub.close()
+        await self.redis.aclose()
         logger.info("ODI Feedback Loop stopped")
 
+    async def _ensure_groups(self):
+        """Crea los streams y el consumer group si no existen."""
+        for stream in self.handlers:
+            try:
+                await self.redis.xgroup_create(stream, CONSUMER_GROUP, id="0", mkstream=True)
+            except ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+
     async def _load_initial_metrics(self):
         """Carga metricas iniciales desde Redis."""
         try:
             # Total queries
-            self.metrics.queries_total = self.redis.llen("odi:queries")
+            self.metrics.queries_total = await self.redis.llen("odi:queries")
 
             # Total feedbacks
-            self.metrics.feedback_count = self.redis.llen("odi:feedbacks")
+            self.metrics.feedback_count = await self.redis.llen("odi:feedbacks")
 
-            # Calculate average rating from recent feedbacks
-            feedbacks_raw = self.redis.lrange("odi:feedbacks", 0, 99)
+            # Average rating from recent feedbacks (hasta que llegue feedback nuevo)
+            feedbacks_raw = await self.redis.lrange("odi:feedbacks", 0, 99)
             if feedbacks_raw:
                 ratings = []
                 for fb in feedbacks_raw:
@@ -181,48 +237,124 @@ class ODIFeedbackLoop:
         except Exception as e:
             logger.error(f"Error loading initial metrics: {e}")
 
-    async def _listen_redis(self):
-        """Escucha eventos de Redis."""
-        logger.info("Listening to Redis channels...")
+    # -----------------------------------------------------
+    # Consumo de streams
+    # -----------------------------------------------------
+    async def _consume_streams(self):
+        """Lee entradas nuevas del grupo con XREADGROUP bloqueante."""
+        logger.info("Consuming Redis streams...")
 
+        # Primero lo que quedo asignado a este consumer sin ACK (reinicio con el mismo nombre)
+        await self._read_group({stream: "0" for stream in self.handlers}, block=None)
+
+        streams = {stream: ">" for stream in self.handlers}
         while self.running:
             try:
-                message = self.pubsub.get_message(timeout=1.0)
-                if message and message["type"] == "message":
-                    channel = message["channel"]
-                    data = message["data"]
-
-                    if channel == "odi:indexed":
-                        await self._handle_index_event(data)
-                    elif channel == "odi:feedback_new":
-                        await self._handle_feedback_event(data)
-                    elif channel == "odi:alert":
-                        await self._handle_alert(data)
-
-                await asyncio.sleep(0.1)
-
+                await self._read_group(streams, block=READ_BLOCK_MS)
             except Exception as e:
-                logger.error(f"Error in Redis listener: {e}")
+                logger.error(f"Error in stream consumer: {e}")
                 await asyncio.sleep(1)
 
-    async def _process_feedback_queue(self):
-        """Procesa la cola de feedbacks."""
-        logger.info("Processing feedback queue...")
+    async def _read_group(self, streams: Dict[str, str], block: Optional[int]):
+        response = await self.redis.xreadgroup(
+            CONSUMER_GROUP, self.consumer, streams, count=READ_COUNT, block=block
+        )
+        for stream, entries in response or []:
+            for entry_id, fields in entries:
+                if fields:  # Entradas recortadas por MAXLEN llegan sin campos
+                    await self._dispatch(stream, entry_id, fields)
+                else:
+                    self._ack(stream, entry_id)
+
+    async def _dispatch(self, stream: str, entry_id: str, fields: Dict[str, str]):
+        """Procesa una entrada; solo se confirma (ACK) si el handler no falla."""
+        name = stream.rsplit(":", 1)[-1]
+        # El id de la entrada lleva el ms del XADD: lag productor -> consumer
+        METRICS.histogram("stream_lag_ms", stream=name).record(
+            max(time.time() * 1000 - int(entry_id.split("-", 1)[0]), 0)
+        )
+        try:
+            with METRICS.timer("stream_handler_ms", stream=name):
+                await self.handlers[stream](fields.get("data", "{}"))
+        except Exception as e:
+            METRICS.counter("stream_errors_total", stream=name).inc()
+            # Sin ACK: queda pendiente y el reclaimer la reintenta
+            logger.error(f"Error processing {stream} {entry_id}: {e}")
+            return
+        self._ack(stream, entry_id)
+
+    def _ack(self, stream: str, entry_id: str):
+        self._acks[stream].append(entry_id)
+        if sum(len(ids) for ids in self._acks.values()) >= ACK_BATCH_SIZE:
+            self._ack_ready.set()
 
+    async def _flush_acks(self):
+        acks, self._acks = self._acks, defaultdict(list)
+        if not acks:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for stream, ids in acks.items():
+                pipe.xack(stream, CONSUMER_GROUP, *ids)
+            await pipe.execute()
+
+    async def _ack_flusher(self):
+        """Confirma en lote: al llenarse ACK_BATCH_SIZE o cada ACK_FLUSH_SECONDS."""
         while self.running:
             try:
-                # Check for new feedbacks in list
-                feedback_raw = self.redis.lpop("odi:feedback_queue")
+                await asyncio.wait_for(self._ack_ready.wait(), timeout=ACK_FLUSH_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._ack_ready.clear()
+            try:
+                await self._flush_acks()
+            except Exception as e:
+                logger.error(f"Error flushing ACKs: {e}")
 
-                if feedback_raw:
-                    feedback_data = json.loads(feedback_raw)
-                    await self._process_feedback(feedback_data)
+    async def _reclaimer(self):
+        """Reclama entradas sin ACK de consumers caidos (XAUTOCLAIM)."""
+        while self.running:
+            await asyncio.sleep(CLAIM_INTERVAL_SECONDS)
+            for stream in self.handlers:
+                try:
+                    await self._reclaim(stream)
+                except Exception as e:
+                    logger.error(f"Error reclaiming {stream}: {e}")
+
+    async def _reclaim(self, stream: str):
+        start = "0-0"
+        while self.running:
+            result = await self.redis.xautoclaim(
+                stream, CONSUMER_GROUP, self.consumer,
+                min_idle_time=CLAIM_IDLE_MS, start_id=start, count=READ_COUNT
+            )
+            start, entries = result[0], result[1]
+            for entry_id, fields in entries:
+                self.metrics.entries_reclaimed += 1
+                if await self._deliveries(stream, entry_id) > MAX_DELIVERIES:
+                    await self._dead_letter(stream, entry_id, fields)
+                elif fields:
+                    await self._dispatch(stream, entry_id, fields)
                 else:
-                    await asyncio.sleep(1)
+                    self._ack(stream, entry_id)
+            if start == "0-0":
+                break
 
-            except Exception as e:
-                logger.error(f"Error processing feedback: {e}")
-                await asyncio.sleep(1)
+    async def _deliveries(self, stream: str, entry_id: str) -> int:
+        pending = await self.redis.xpending_range(
+            stream, CONSUMER_GROUP, min=entry_id, max=entry_id, count=1
+        )
+        return pending[0]["times_delivered"] if pending else 0
+
+    async def _dead_letter(self, stream: str, entry_id: str, fields: Dict[str, str]):
+        """Entrada que fallo MAX_DELIVERIES veces: se aparta y se confirma."""
+        await self.redis.xadd(
+            DEAD_LETTER_STREAM,
+            {"stream": stream, "entry_id": entry_id, "data": (fields or {}).get("data", "")},
+            maxlen=STREAM_MAXLEN, approximate=True
+        )
+        self._ack(stream, entry_id)
+        self.metrics.entries_dead += 1
+        logger.warning(f"Dead-lettered {stream} {entry_id} after {MAX_DELIVERIES} deliveries")
 
     async def _process_feedback(self, feedback_data: Dict[str, Any]):
         """Procesa un feedback individual."""
@@ -235,21 +367,17 @@ class ODIFeedbackLoop:
                 timestamp=feedback_data.get("timestamp", datetime.now().isoformat())
             )
 
-            # Update metrics
+            # Update metrics (ventana movil, memoria fija)
             self.metrics.feedback_count += 1
-            self.recent_feedbacks.append(event)
-
-            # Keep only last 100
-            if len(self.recent_feedbacks) > 100:
-                self.recent_feedbacks = self.recent_feedbacks[-100:]
-
-            # Recalculate average
-            if self.recent_feedbacks:
-                self.metrics.avg_rating = sum(f.rating for f in self.recent_feedbacks) / len(self.recent_feedbacks)
+            ratings = METRICS.histogram("feedback_rating")
+            ratings.record(event.rating)
+            self.metrics.avg_rating = ratings.window(self.window_seconds)["mean"]
 
             # Check for low rating
             if event.rating <= CONFIG["alert_threshold_rating"]:
-                self.metrics.low_rating_count += 1
+                low_ratings = METRICS.counter("feedback_low_rating_total")
+                low_ratings.inc()
+                self.metrics.low_rating_count = low_ratings.window(self.window_seconds)
                 logger.warning(f"Low rating received: {event.rating} for query {event.query_id}")
 
                 # Check if we should alert
@@ -270,52 +398,40 @@ class ODIFeedbackLoop:
 
     async def _handle_index_event(self, data: str):
         """Maneja evento de indexacion."""
-        try:
-            event_data = json.loads(data)
-            event = IndexEvent(
-                file=event_data.get("file", "unknown"),
-                chunks=event_data.get("chunks", 0),
-                timestamp=event_data.get("timestamp", datetime.now().isoformat())
-            )
-
-            self.metrics.documents_indexed += event.chunks
-            self.metrics.last_index_time = event.timestamp
+        event_data = json.loads(data)
+        event = IndexEvent(
+            file=event_data.get("file", "unknown"),
+            chunks=event_data.get("chunks", 0),
+            timestamp=event_data.get("timestamp", datetime.now().isoformat())
+        )
 
-            logger.info(f"Index event: {event.file} ({event.chunks} chunks)")
+        self.metrics.documents_indexed += event.chunks
+        self.metrics.last_index_time = event.timestamp
 
-            # Notify webhook
-            await self._send_webhook("indexed", asdict(event))
+        logger.info(f"Index event: {event.file} ({event.chunks} chunks)")
 
-        except Exception as e:
-            logger.error(f"Error handling index event: {e}")
+        # Notify webhook
+        await self._send_webhook("indexed", asdict(event))
 
     async def _handle_feedback_event(self, data: str):
-        """Maneja evento de feedback desde pubsub."""
-        try:
-            feedback_data = json.loads(data)
-            await self._process_feedback(feedback_data)
-        except Exception as e:
-            logger.error(f"Error handling feedback event: {e}")
+        """Maneja evento de feedback del stream."""
+        await self._process_feedback(json.loads(data))
 
     async def _handle_alert(self, data: str):
         """Maneja alerta."""
-        try:
-            alert_data = json.loads(data)
-            logger.warning(f"Alert received: {alert_data}")
-            await self._send_webhook("alert", alert_data)
-        except Exception as e:
-            logger.error(f"Error handling alert: {e}")
+        alert_data = json.loads(data)
+        logger.warning(f"Alert received: {alert_data}")
+        await self._send_webhook("alert", alert_data)
 
     async def _send_alert(self, alert_data: Dict[str, Any]):
-        """Envia una alerta."""
+        """Envia una alerta (el consumer del stream de alertas dispara el webhook)."""
         alert_data["timestamp"] = datetime.now().isoformat()
         alert_data["service"] = "odi-feedback-loop"
 
-        # Publish to Redis
-        self.redis.publish("odi:alert", json.dumps(alert_data))
-
-        # Send webhook
-        await self._send_webhook("alert", alert_data)
+        await self.redis.xadd(
+            ALERT_STREAM, {"data": json.dumps(alert_data)},
+            maxlen=STREAM_MAXLEN, approximate=True
+        )
 
         logger.warning(f"Alert sent: {alert_data.get('type')}")
 
@@ -333,25 +449,29 @@ class ODIFeedbackLoop:
                 "timestamp": datetime.now().isoformat()
             }
 
-            response = await self.http_client.post(
-                webhook_url,
-                json=payload,
-                headers={
-                    "Content-Type": "application/json",
-                    "X-ODI-Secret": CONFIG.get("feedback_webhook_secret", ""),
-                    "X-ODI-Event": event_type
-                }
-            )
+            with METRICS.timer("webhook_ms", event=event_type):
+                response = await self.http_client.post(
+                    webhook_url,
+                    json=payload,
+                    headers={
+                        "Content-Type": "application/json",
+                        "X-ODI-Secret": CONFIG.get("feedback_webhook_secret", ""),
+                        "X-ODI-Event": event_type
+                    }
+                )
 
             if response.status_code < 400:
                 self.metrics.webhook_success += 1
+                METRICS.counter("webhook_total", event=event_type, result="ok").inc()
                 logger.debug(f"Webhook sent successfully: {event_type}")
             else:
                 self.metrics.webhook_failed += 1
+                METRICS.counter("webhook_total", event=event_type, result="failed").inc()
                 logger.warning(f"Webhook failed: {response.status_code}")
 
         except Exception as e:
             self.metrics.webhook_failed += 1
+            METRICS.counter("webhook_total", event=event_type, result="failed").inc()
             logger.error(f"Error sending webhook: {e}")
 
     async def _metrics_reporter(self):
@@ -359,16 +479,29 @@ class ODIFeedbackLoop:
         while self.running:
             try:
                 # Update queries count
-                self.metrics.queries_total = self.redis.llen("odi:queries")
+                self.metrics.queries_total = await self.redis.llen("odi:queries")
+
+                # Entradas entregadas al grupo y aun sin ACK
+                pending = 0
+                for stream in self.handlers:
+                    summary = await self.redis.xpending(stream, CONSUMER_GROUP)
+                    pending += summary["pending"]
+                self.metrics.stream_pending = pending
+
+                # Bajas de la ultima hora (ventana movil, sin reinicio manual)
+                self.metrics.low_rating_count = METRICS.counter("feedback_low_rating_total").window(self.window_seconds)
 
                 # Store metrics in Redis for API access
-                self.redis.set("odi:metrics", json.dumps(asdict(self.metrics)))
+                await self.redis.set("odi:metrics", json.dumps(asdict(self.metrics)))
 
                 # Log summary every minute
+                lag = METRICS.histogram("stream_lag_ms", stream="feedback").window(300)
                 logger.info(
                     f"Metrics: queries={self.metrics.queries_total}, "
                     f"avg_rating={self.metrics.avg_rating:.2f}, "
-                    f"feedbacks={self.metrics.feedback_count}"
+                    f"feedbacks={self.metrics.feedback_count}, "
+                    f"pending={self.metrics.stream_pending}, "
+                    f"lag_p99={lag['p99']:.1f}ms"
                 )
 
                 await asyncio.sleep(60)
@@ -377,20 +510,6 @@ class ODIFeedbackLoop:
                 logger.error(f"Error in metrics reporter: {e}")
                 await asyncio.sleep(10)
 
-    async def _alert_checker(self):
-        """Verifica condiciones de alerta periodicamente."""
-        while self.running:
-            try:
-                # Reset low rating counter every hour
-                await asyncio.sleep(3600)
-                if self.metrics.low_rating_count > 0:
-                    logger.info(f"Resetting low rating counter (was {self.metrics.low_rating_count})")
-                    self.metrics.low_rating_count = 0
-
-            except Exception as e:
-                logger.error(f"Error in alert checker: {e}")
-                await asyncio.sleep(60)
-
 
 def display_dashboard(metrics: ODIMetrics):
     """Muestra dashboard en consola."""
@@ -402,10 +521,12 @@ def display_dashboard(metrics: ODIMetrics):
     table.add_row("Total Queries", str(metrics.queries_total))
     table.add_row("Total Feedbacks", str(metrics.feedback_count))
     table.add_row("Avg Rating", f"{metrics.avg_rating:.2f}")
-    table.add_row("Low Ratings (this hour)", str(metrics.low_rating_count))
+    table.add_row("Low Ratings (last hour)", str(metrics.low_rating_count))
     table.add_row("Docs Indexed", str(metrics.documents_indexed))
     table.add_row("Webhook Success", str(metrics.webhook_success))
     table.add_row("Webhook Failed", str(metrics.webhook_failed))
+    table.add_row("Stream Pending", str(metrics.stream_pending))
+    table.add_row("Reclaimed", str(metrics.entries_reclaimed))
 
     return Panel(table, title="[bold blue]ODI Feedback Loop[/bold blue]")
 
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+ODI Job Store v1.0
+==================
+Almacén de jobs compartido (SQLite WAL) para el Business Daemon y el
+Pipeline Service. Reemplaza un JSON por job:
+
+- Una fila por job (namespace + job_id), con el job completo en JSON y
+  columnas indexadas de estado y tiempos.
+- Consultas de estado por clave primaria y listados por índice: no
+  dependen de cuántos jobs se acumulen.
+- Conteo por estado mantenido por triggers (dashboards sin COUNT(*)).
+- Transiciones atómicas: UPDATE condicionado al estado esperado.
+- Retención: prune() borra jobs terminados más antiguos que N días.
+- Archivos ya procesados por namespace (tabla processed), indexados por
+  ruta: filter_unprocessed() y mark_processed().
+
+Uso:
+    store = JobStore()
+    store.save("pipeline", job_id, "extracting", job.model_dump())
+    store.transition("business", job_id, "extracting", expected=["pending"])
+    store.get("pipeline", job_id)
+    store.list("business", status="pending", limit=20)
+    store.counts("pipeline")          # {"completed": 120, "failed": 3, ...}
+    store.filter_unprocessed("business", paths)
+
+Autor: ODI Team
+Version: 1.0
+"""
+
+import os
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, List, Iterable, Tuple
+
+# ============================================
+# CONFIGURACIÓN
+# ============================================
+JOBS_DB = Path(os.getenv("ODI_JOBS_DB", "/opt/odi/data/odi_jobs.db"))
+JOB_RETENTION_DAYS = int(os.getenv("ODI_JOB_RETENTION_DAYS", "30"))
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+class JobStore:
+    """Jobs en SQLite (WAL) con una conexión por hilo."""
+
+    def __init__(self, db_path: Path = JOBS_DB, terminal: Iterable[str] = TERMINAL_STATUSES):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.terminal = tuple(terminal)
+        self._local = threading.local()
+        self._init_db()
+
+    def _get_conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        conn = self._get_conn()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                namespace TEXT NOT NULL,
+                job_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                data TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                finished_at TEXT,
+                PRIMARY KEY (namespace, job_id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(namespace, status, created_at);
+            CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs(namespace, created_at);
+            CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs(finished_at) WHERE finished_at IS NOT NULL;
+
+            CREATE TABLE IF NOT EXISTS job_counts (
+                namespace TEXT NOT NULL,
+                status TEXT NOT NULL,
+                n INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (namespace, status)
+            );
+            CREATE TRIGGER IF NOT EXISTS jobs_count_insert AFTER INSERT ON jobs BEGIN
+                INSERT INTO job_counts (namespace, status, n) VALUES (NEW.namespace, NEW.status, 1)
+                    ON CONFLICT(namespace, status) DO UPDATE SET n = n + 1;
+            END;
+            CREATE TRIGGER IF NOT EXISTS jobs_count_delete AFTER DELETE ON jobs BEGIN
+                UPDATE job_counts SET n = n - 1 WHERE namespace = OLD.namespace AND status = OLD.status;
+            END;
+            CREATE TRIGGER IF NOT EXISTS jobs_count_update AFTER UPDATE OF status ON jobs
+            WHEN OLD.status != NEW.status BEGIN
+                UPDATE job_counts SET n = n - 1 WHERE namespace = OLD.namespace AND status = OLD.status;
+                INSERT INTO job_counts (namespace, status, n) VALUES (NEW.namespace, NEW.status, 1)
+                    ON CONFLICT(namespace, status) DO UPDATE SET n = n + 1;
+            END;
+
+            CREATE TABLE IF NOT EXISTS processed (
+                namespace TEXT NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER,
+                mtime REAL,
+                job_id TEXT,
+                processed_at TEXT NOT NULL,
+                PRIMARY KEY (namespace, path)
+            );
+
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+        """)
+        conn.commit()
+
+    def _finished_at(self, status: str, now: str) -> Optional[str]:
+        return now if status in self.terminal else None
+
+    # -----------------------------------------------------
+    # Escritura
+    # -----------------------------------------------------
+    def save(self, namespace: str, job_id: str, status: str, data: Dict[str, Any],
+             created_at: Optional[str] = None):
+        """Inserta o reemplaza el job completo en una sola sentencia."""
+        now = datetime.now().isoformat()
+        conn = self._get_conn()
+        with conn:
+            conn.execute(
+                """INSERT INTO jobs (namespace, job_id, status, data, created_at, updated_at, finished_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(namespace, job_id) DO UPDATE SET
+                       status = excluded.status,
+                       data = excluded.data,
+                       updated_at = excluded.updated_at,
+                       finished_at = excluded.finished_at""",
+                (namespace, job_id, status, json.dumps(data, default=str),
+                 created_at or now, now, self._finished_at(status, now))
+            )
+
+    def transition(self, namespace: str, job_id: str, status: Optional[str] = None,
+                   expected: Optional[Iterable[str]] = None, status_field: str = "status",
+                   **fields) -> bool:
+        """
+        Cambia estado y/o campos del job de forma atómica. Con expected,
+        solo aplica si el estado actual está en esa lista. Devuelve False
+        si el job no existe o no estaba en un estado esperado.
+        """
+        now = datetime.now().isoformat()
+        if status is not None:
+            fields[status_field] = status
+        fields["updated_at"] = now
+
+        paths = ", ".join(["?, json(?)"] * len(fields))
+        params: List[Any] = []
+        for key, value in fields.items():
+            params.extend([f'$."{key}"', json.dumps(value, default=str)])
+
+        sql = f"UPDATE jobs SET data = json_set(data, {paths}), updated_at = ?"
+        params.append(now)
+        if status is not None:
+            sql += ", status = ?, finished_at = ?"
+            params.extend([status, self._finished_at(status, now)])
+        sql += " WHERE namespace = ? AND job_id = ?"
+        params.extend([namespace, job_id])
+        if expected is not None:
+            expected = list(expected)
+            sql += f" AND status IN ({','.join('?' * len(expected))})"
+            params.extend(expected)
+
+        conn = self._get_conn()
+        with conn:
+            return conn.execute(sql, params).rowcount > 0
+
+    def prune(self, namespace: Optional[str] = None, days: int = JOB_RETENTION_DAYS) -> int:
+        """Borra jobs terminados hace más de `days` días. Devuelve cuántos."""
+        cutoff = (datetime.now() - timedelta(days=days)).isoformat()
+        sql = "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?"
+        params: List[Any] = [cutoff]
+        if namespace is not None:
+            sql += " AND namespace = ?"
+            params.append(namespace)
+        conn = self._get_conn()
+        with conn:
+            return conn.execute(sql, params).rowcount
+
+    def mark_processed(self, namespace: str, rows: Iterable[Tuple[str, int, float, str]]):
+        """Registra (path, size, mtime, job_id) en una sola transacción."""
+        now = datetime.now().isoformat()
+        conn = self._get_conn()
+        with conn:
+            conn.executemany(
+                """INSERT OR REPLACE INTO processed (namespace, path, size, mtime, job_id, processed_at)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                [(namespace, *row, now) for row in rows]
+            )
+
+    # -----------------------------------------------------
+    # Lectura
+    # -----------------------------------------------------
+    def get(self, namespace: str, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._get_conn().execute(
+            "SELECT data FROM jobs WHERE namespace = ? AND job_id = ?", (namespace, job_id)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list(self, namespace: str, status: Optional[str] = None,
+             limit: Optional[int] = 20, offset: int = 0) -> List[Dict[str, Any]]:
+        """Jobs más recientes primero (por created_at, vía índice)."""
+        sql = "SELECT data FROM jobs WHERE namespace = ?"
+        params: List[Any] = [namespace]
+        if status:
+            sql += " AND status = ?"
+            params.append(status)
+        sql += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
+        params.extend([-1 if limit is None else limit, offset])
+        return [json.loads(r[0]) for r in self._get_conn().execute(sql, params)]
+
+    def counts(self, namespace: str) -> Dict[str, int]:
+        rows = self._get_conn().execute(
+            "SELECT status, n FROM job_counts WHERE namespace = ? AND n > 0", (namespace,)
+        ).fetchall()
+        return dict(rows)
+
+    def filter_unprocessed(self, namespace: str, paths: List[str]) -> List[str]:
+        """Devuelve las rutas que aún no se procesaron (consulta por lotes)."""
+        seen = set()
+        conn = self._get_conn()
+        for i in range(0, len(paths), 500):
+            chunk = paths[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            seen.update(r[0] for r in conn.execute(
+                f"SELECT path FROM processed WHERE namespace = ? AND path IN ({marks})", [namespace, *chunk]
+            ))
+        return [p for p in paths if p not in seen]
+
+    def processed_count(self, namespace: str) -> int:
+        return self._get_conn().execute(
+            "SELECT COUNT(*) FROM processed WHERE namespace = ?", (namespace,)
+        ).fetchone()[0]
+
+    # -----------------------------------------------------
+    # Migración
+    # -----------------------------------------------------
+    def import_json_dir(self, namespace: str, path: Path, status_field: str = "status") -> int:
+        """
+        Importa (una sola vez por namespace) los JSON de un job por archivo.
+        Los archivos se dejan en disco.
+        """
+        key = f"imported:{namespace}"
+        conn = self._get_conn()
+        if conn.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone():
+            return 0
+
+        rows = []
+        for job_file in Path(path).glob("*.json"):
+            try:
+                data = json.loads(job_file.read_text())
+                status = data.get(status_field) or "pending"
+                created = data.get("created_at") or datetime.now().isoformat()
+                updated = data.get("updated_at") or created
+                rows.append((namespace, data["job_id"], status, json.dumps(data, default=str),
+                             created, updated, updated if status in self.terminal else None))
+            except Exception:
+                continue  # Archivos que no son jobs (o corruptos) se ignoran
+
+        with conn:
+            conn.executemany(
+                """INSERT OR IGNORE INTO jobs
+                   (namespace, job_id, status, data, created_at, updated_at, finished_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                rows
+            )
+            conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (key, datetime.now().isoformat()))
+        return len(rows)
+
+    def import_processed_list(self, namespace: str, path: Path) -> int:
+        """
+        Importa (una sola vez por namespace) una lista de rutas procesadas,
+        una por línea. El archivo se deja en disco.
+        """
+        key = f"imported:processed:{namespace}"
+        conn = self._get_conn()
+        path = Path(path)
+        if not path.exists() or conn.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone():
+            return 0
+
+        now = datetime.now().isoformat()
+        paths = [p for p in path.read_text().split("\n") if p.strip()]
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO processed (namespace, path, processed_at) VALUES (?, ?, ?)",
+                [(namespace, p, now) for p in paths]
+            )
+            conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (key, now))
+        return len(paths)
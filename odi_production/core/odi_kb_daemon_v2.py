@@ -14,9 +14,10 @@ Uso:
 """
 import os
 import sys
-import gc
 import time
 import logging
+import threading
+import uuid
 from pathlib import Path
 from datetime import datetime
 from watchdog.observers import Observer
@@ -30,6 +31,12 @@ from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import Chroma
 from langchain_core.documents import Document
 
+# Índice léxico (BM25 + códigos exactos) junto a cada colección
+try:
+    from .odi_lexical_index import LexicalIndex, lexical_index_path
+except ImportError:
+    from odi_lexical_index import LexicalIndex, lexical_index_path
+
 # ============================================
 # CONFIGURACIÓN MULTI-LÓBULO
 # ============================================
@@ -51,8 +58,14 @@ LOBES = {
 }
 
 LOG_FILE = "/opt/odi/logs/kb_daemon_v2.log"
-BATCH_SIZE = 10
-SLEEP_BETWEEN = 5
+BATCH_SIZE = 10             # Archivos por pasada de process_batch
+
+# Escrituras al vector store: se acumulan chunks y se escriben en lote.
+# El buffer acota la memoria (en lugar de sleeps entre archivos).
+WRITE_BATCH_CHUNKS = int(os.getenv("KB_WRITE_BATCH_CHUNKS", "200"))
+WRITE_FLUSH_SECONDS = float(os.getenv("KB_WRITE_FLUSH_SECONDS", "5"))
+RESCAN_INTERVAL = 60        # Segundos entre escaneos de archivos pendientes
+TEXT_BLOCK_CHARS = 20000    # Tamaño de bloque al leer archivos de texto
 
 # Extensions
 EXTENSIONS = {".pdf", ".txt", ".md", ".json", ".csv", ".py", ".yaml", ".yml"}
@@ -70,6 +83,10 @@ logging.basicConfig(
 log = logging.getLogger(__name__)
 
 
+class FileReadError(Exception):
+    """El archivo no se pudo leer o parsear (distinto de un fallo de escritura)."""
+
+
 class LobeIndexer:
     """Indexador para un lóbulo específico."""
 
@@ -92,6 +109,24 @@ class LobeIndexer:
         self.splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
         self.embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
 
+        # Vector store compartido durante toda la vida del daemon
+        self.vectorstore = Chroma(
+            persist_directory=self.embeddings_path,
+            embedding_function=self.embeddings,
+            collection_name=self.collection_name
+        )
+        self.lexical = LexicalIndex(
+            lexical_index_path(self.embeddings_path, self.collection_name),
+            source_field="path"
+        )
+
+        # Buffer de escritura (el watcher y el loop principal escriben aquí)
+        self.lock = threading.RLock()
+        self.pending_docs = []      # Chunks aún no escritos
+        self.pending_files = []     # Archivos completos esperando el flush
+        self.first_pending_at = None
+        self.failed_paths = set()   # Archivos a medio escribir cuyo lote falló
+
         log.info(f"Lobe [{self.name}] initialized: {len(self.indexed)} files indexed")
 
     def _load_cache(self) -> set:
@@ -105,68 +140,152 @@ class LobeIndexer:
             f.write(filepath + "\n")
         self.indexed.add(filepath)
 
-    def _read_file(self, filepath: Path) -> str:
-        ext = filepath.suffix.lower()
+    def _iter_blocks(self, filepath: Path):
+        """
+        Lee el archivo por bloques (página a página en PDFs) sin cargarlo
+        entero. Los errores de lectura/parsing salen como FileReadError.
+        """
         try:
-            if ext == ".pdf":
+            if filepath.suffix.lower() == ".pdf":
                 import pdfplumber
                 with pdfplumber.open(filepath) as pdf:
-                    return "\n".join((p.extract_text() or "")[:3000] for p in pdf.pages[:15])
+                    for page_number, page in enumerate(pdf.pages, 1):
+                        yield page_number, page.extract_text() or ""
+                        page.flush_cache()
             else:
-                return filepath.read_text(errors="ignore")[:15000]
+                with open(filepath, "r", errors="ignore") as f:
+                    while True:
+                        block = f.read(TEXT_BLOCK_CHARS)
+                        if not block:
+                            break
+                        yield None, block
         except Exception as e:
-            log.error(f"[{self.name}] Error reading {filepath}: {e}")
-            return ""
+            raise FileReadError(e) from e
+
+    def _buffer(self, doc: Document):
+        with self.lock:
+            # Un lote de este archivo ya falló: el resto de sus chunks se descarta
+            if doc.metadata["path"] in self.failed_paths:
+                return
+            if not self.pending_docs and not self.pending_files:
+                self.first_pending_at = time.monotonic()
+            self.pending_docs.append(doc)
+            if len(self.pending_docs) >= WRITE_BATCH_CHUNKS:
+                self.flush()
+
+    def flush(self) -> int:
+        """Escribe los chunks acumulados y marca como indexados los archivos completos."""
+        with self.lock:
+            docs, self.pending_docs = self.pending_docs, []
+            files, self.pending_files = self.pending_files, []
+            self.first_pending_at = None
+
+            if docs:
+                try:
+                    self.vectorstore.add_documents(docs)
+                    self.lexical.upsert(
+                        [str(uuid.uuid4()) for _ in docs],
+                        [d.page_content for d in docs],
+                        [d.metadata for d in docs]
+                    )
+                except Exception as e:
+                    log.error(f"[{self.name}] Error writing batch of {len(docs)} chunks: {e}")
+                    # Los archivos no se marcan: se reintentan en el próximo escaneo
+                    for relative_path in {d.metadata["path"] for d in docs}:
+                        self._delete_file_chunks(relative_path)
+                        self.failed_paths.add(relative_path)
+                    for filepath in files:
+                        self.failed_paths.discard(str(Path(filepath).relative_to(self.path)))
+                    return 0
+
+            for filepath in files:
+                self._save_to_cache(filepath)
+
+            if docs:
+                log.info(f"[{self.name}] Flushed {len(docs)} chunks ({len(files)} files completed)")
+            return len(docs)
+
+    def flush_if_due(self):
+        with self.lock:
+            if self.first_pending_at is not None and \
+                    time.monotonic() - self.first_pending_at >= WRITE_FLUSH_SECONDS:
+                self.flush()
+
+    def _delete_file_chunks(self, relative_path: str):
+        """Elimina los chunks (escritos o en buffer) de un archivo."""
+        with self.lock:
+            self.pending_docs = [d for d in self.pending_docs if d.metadata["path"] != relative_path]
+            try:
+                self.vectorstore._collection.delete(where={"path": relative_path})
+                self.lexical.delete_source(relative_path)
+            except Exception as e:
+                log.error(f"[{self.name}] Error deleting chunks of {relative_path}: {e}")
 
     def index_file(self, filepath: Path) -> bool:
-        """Indexa un archivo en este lóbulo."""
+        """Indexa un archivo en este lóbulo (procesado en streaming, página a página)."""
         if str(filepath) in self.indexed:
             return False
 
+        relative_path = str(filepath.relative_to(self.path))
         try:
             log.info(f"[{self.name}] Indexing: {filepath.name}")
 
-            text = self._read_file(filepath)
-            if len(text) < 50:
+            # Metadata con origen del lóbulo
+            metadata = {
+                "source": filepath.name,
+                "folder": filepath.parent.name,
+                "path": relative_path,
+                "lobe": self.name,  # Identificador del lóbulo
+                "indexed_at": datetime.now().isoformat()
+            }
+
+            chunk_count = 0
+            carry = ""
+            for page_number, text in self._iter_blocks(filepath):
+                text = carry + text
+                if not text.strip():
+                    continue
+                chunks = self.splitter.split_text(text)
+                # En texto plano el último chunk puede quedar cortado: pasa al bloque siguiente
+                carry = chunks.pop() if page_number is None and len(chunks) > 1 else ""
+                page_metadata = {**metadata, "page": page_number} if page_number else metadata
+                for c in chunks:
+                    self._buffer(Document(page_content=c, metadata=page_metadata))
+                    chunk_count += 1
+
+            if carry:
+                self._buffer(Document(page_content=carry, metadata=metadata))
+                chunk_count += 1
+
+            with self.lock:
+                if relative_path in self.failed_paths:
+                    # Borra lo que alcanzó a escribirse antes de marcarlo de nuevo pendiente
+                    self._delete_file_chunks(relative_path)
+                    self.failed_paths.discard(relative_path)
+                    return False
+                self.pending_files.append(str(filepath))
+                if self.first_pending_at is None:
+                    self.first_pending_at = time.monotonic()
+
+            if chunk_count == 0:
                 log.warning(f"[{self.name}] Skipping (too short): {filepath.name}")
-                self._save_to_cache(str(filepath))
-                return False
-
-            chunks = self.splitter.split_text(text)[:25]
-            if not chunks:
-                self._save_to_cache(str(filepath))
                 return False
 
-            # Metadata con origen del lóbulo
-            docs = [Document(
-                page_content=c,
-                metadata={
-                    "source": filepath.name,
-                    "folder": filepath.parent.name,
-                    "path": str(filepath.relative_to(self.path)),
-                    "lobe": self.name,  # Identificador del lóbulo
-                    "indexed_at": datetime.now().isoformat()
-                }
-            ) for c in chunks]
-
-            # Guardar en vector store
-            vs = Chroma(
-                persist_directory=self.embeddings_path,
-                embedding_function=self.embeddings,
-                collection_name=self.collection_name
-            )
-            vs.add_documents(docs)
-            vs.persist()
-            del vs
+            log.info(f"[{self.name}] ✓ {filepath.name} ({chunk_count} chunks queued)")
+            return True
 
+        except FileReadError as e:
+            # Corrupto o ilegible: se marca como saltado para no re-parsearlo en cada escaneo
+            log.error(f"[{self.name}] Error reading {filepath}: {e}")
+            self._delete_file_chunks(relative_path)
+            with self.lock:
+                self.failed_paths.discard(relative_path)
             self._save_to_cache(str(filepath))
-            log.info(f"[{self.name}] ✓ {filepath.name} ({len(docs)} chunks)")
-
-            gc.collect()
-            return True
+            return False
 
         except Exception as e:
             log.error(f"[{self.name}] Error indexing {filepath}: {e}")
+            self._delete_file_chunks(relative_path)
             return False
 
     def get_pending_files(self) -> list:
@@ -195,8 +314,8 @@ class LobeIndexer:
         for f in pending[:BATCH_SIZE]:
             if self.index_file(f):
                 processed += 1
-            time.sleep(SLEEP_BETWEEN)
 
+        self.flush()
         return processed
 
 
@@ -234,6 +353,7 @@ class MultiLobeHandler(FileSystemEventHandler):
             if indexer and str(path) in indexer.indexed:
                 log.info(f"File modified in [{indexer.name}], re-indexing: {path.name}")
                 indexer.indexed.discard(str(path))
+                indexer._delete_file_chunks(str(path.relative_to(indexer.path)))
                 time.sleep(2)
                 indexer.index_file(path)
 
@@ -264,7 +384,6 @@ def main():
             if processed == 0:
                 break
             log.info(f"[{name}] Batch complete: {processed} files")
-            time.sleep(10)
         log.info(f"[{name}] All pending files processed")
 
     log.info("Starting watch mode on all lobes...")
@@ -281,9 +400,17 @@ def main():
     observer.start()
 
     try:
+        last_scan = time.monotonic()
         while True:
-            time.sleep(60)
+            time.sleep(1)
+            # Escrituras pendientes del watcher
+            for indexer in lobe_indexers.values():
+                indexer.flush_if_due()
+
             # Verificar periódicamente
+            if time.monotonic() - last_scan < RESCAN_INTERVAL:
+                continue
+            last_scan = time.monotonic()
             for name, indexer in lobe_indexers.items():
                 pending = indexer.get_pending_files()
                 if pending:
@@ -291,6 +418,8 @@ def main():
                     indexer.process_batch()
     except KeyboardInterrupt:
         observer.stop()
+        for indexer in lobe_indexers.values():
+            indexer.flush()
         log.info("Daemon stopped")
 
     observer.join()
@@ -28,7 +28,9 @@ from pathlib import Path
 from datetime import datetime
 from typing import List, Dict, Any, Optional, Generator
 from dataclasses import dataclass, asdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import time
+import uuid
 
 # Third party
 from dotenv import load_dotenv
@@ -40,11 +42,22 @@ from watchdog.events import FileSystemEventHandler
 import redis
 
 # LangChain
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import Chroma
 from langchain.schema import Document
 
+# Índice léxico (BM25 + códigos exactos) junto a la colección
+try:
+    from .odi_lexical_index import LexicalIndex, lexical_index_path
+except ImportError:
+    from odi_lexical_index import LexicalIndex, lexical_index_path
+
+# Etapas compartidas del pipeline de indexación
+try:
+    from .odi_kb_pipeline import EmbeddingBatcher, build_text_splitter, load_file_job
+except ImportError:
+    from odi_kb_pipeline import EmbeddingBatcher, build_text_splitter, load_file_job
+
 # Document loaders
 import pdfplumber
 import markdown
@@ -66,6 +79,9 @@ CONFIG = {
     "redis_host": os.getenv("REDIS_HOST", "localhost"),
     "redis_port": int(os.getenv("REDIS_PORT", "6379")),
     "redis_db": int(os.getenv("REDIS_DB", "0")),
+    "loader_workers": int(os.getenv("LOADER_WORKERS", os.cpu_count() or 2)),
+    "embed_batch_size": int(os.getenv("EMBED_BATCH_SIZE", "256")),
+    "embed_concurrency": int(os.getenv("EMBED_CONCURRENCY", "4")),
 }
 
 # Logging
@@ -265,11 +281,7 @@ class ODIKnowledgeBaseIndexer:
 
         # Initialize components
         self.hash_cache = FileHashCache(str(self.cache_file))
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=CONFIG["chunk_size"],
-            chunk_overlap=CONFIG["chunk_overlap"],
-            separators=["\n\n", "\n", ". ", " ", ""]
-        )
+        self.text_splitter = build_text_splitter(CONFIG["chunk_size"], CONFIG["chunk_overlap"])
 
         # OpenAI Embeddings
         api_key = os.getenv("OPENAI_API_KEY")
@@ -289,6 +301,7 @@ class ODIKnowledgeBaseIndexer:
             embedding_function=self.embeddings,
             collection_name="odi_knowledge_base"
         )
+        self.lexical = LexicalIndex(lexical_index_path(str(self.embeddings_path), "odi_knowledge_base"))
 
         # Redis for real-time updates
         try:
@@ -339,54 +352,76 @@ class ODIKnowledgeBaseIndexer:
             # Compute hash
             file_hash = DocumentLoader.compute_hash(str(file_path))
 
-            # Extract metadata
-            relative_path = file_path.relative_to(self.profesion_path)
-            metadata = {
-                "source": str(relative_path),
-                "file_name": file_path.name,
-                "file_type": file_path.suffix.lower(),
-                "file_hash": file_hash,
-                "indexed_at": datetime.now().isoformat(),
-                "category": str(relative_path.parent) if relative_path.parent != Path(".") else "root"
-            }
-
             # Split into chunks
-            chunks = self.text_splitter.split_text(content)
-
-            # Create documents
-            documents = []
-            for i, chunk in enumerate(chunks):
-                doc = Document(
-                    page_content=chunk,
-                    metadata={
-                        **metadata,
-                        "chunk_index": i,
-                        "total_chunks": len(chunks)
-                    }
-                )
-                documents.append(doc)
+            item = self._build_documents(file_path, file_hash, self.text_splitter.split_text(content))
 
             # Add to vectorstore
-            if documents:
-                self.vectorstore.add_documents(documents)
-                self.hash_cache.set_hash(str(file_path), file_hash)
-
-                # Publish to Redis
-                if self.redis:
-                    self.redis.publish("odi:indexed", json.dumps({
-                        "file": str(relative_path),
-                        "chunks": len(documents),
-                        "timestamp": datetime.now().isoformat()
-                    }))
+            if item["documents"]:
+                self.vectorstore.add_documents(item["documents"])
+                self._file_indexed(item)
 
-            logger.info(f"Indexado: {relative_path} ({len(documents)} chunks)")
-            return len(documents)
+            logger.info(f"Indexado: {item['relative_path']} ({len(item['documents'])} chunks)")
+            return len(item["documents"])
 
         except Exception as e:
             logger.error(f"Error indexando {file_path}: {e}")
             self.stats["errors"] += 1
             return 0
 
+    def _build_documents(self, file_path: Path, file_hash: str, chunks: List[str]) -> Dict[str, Any]:
+        """Construye los Document de LangChain para los chunks de un archivo."""
+        # Extract metadata
+        relative_path = file_path.relative_to(self.profesion_path)
+        metadata = {
+            "source": str(relative_path),
+            "file_name": file_path.name,
+            "file_type": file_path.suffix.lower(),
+            "file_hash": file_hash,
+            "indexed_at": datetime.now().isoformat(),
+            "category": str(relative_path.parent) if relative_path.parent != Path(".") else "root"
+        }
+
+        # Create documents
+        documents = []
+        for i, chunk in enumerate(chunks):
+            doc = Document(
+                page_content=chunk,
+                metadata={
+                    **metadata,
+                    "chunk_index": i,
+                    "total_chunks": len(chunks)
+                }
+            )
+            documents.append(doc)
+
+        return {
+            "file_path": file_path,
+            "relative_path": relative_path,
+            "file_hash": file_hash,
+            "documents": documents
+        }
+
+    def _file_indexed(self, item: Dict[str, Any]):
+        """Registra el hash del archivo, actualiza el índice léxico y publica en Redis."""
+        self.hash_cache.set_hash(str(item["file_path"]), item["file_hash"])
+
+        # Índice léxico: reemplaza los chunks previos del archivo
+        documents = item["documents"]
+        self.lexical.delete_source(str(item["relative_path"]))
+        self.lexical.upsert(
+            [str(uuid.uuid4()) for _ in documents],
+            [doc.page_content for doc in documents],
+            [doc.metadata for doc in documents]
+        )
+
+        # Stream consumido por el feedback loop (consumer group)
+        if self.redis:
+            self.redis.xadd("odi:stream:indexed", {"data": json.dumps({
+                "file": str(item["relative_path"]),
+                "chunks": len(item["documents"]),
+                "timestamp": datetime.now().isoformat()
+            })}, maxlen=100000, approximate=True)
+
     def index_all(self, force: bool = False) -> Dict[str, Any]:
         """Indexa todos los documentos."""
         console.print("\n[bold blue]ODI Knowledge Base Indexer[/bold blue]\n")
@@ -406,16 +441,7 @@ class ODIKnowledgeBaseIndexer:
             console=console
         ) as progress:
             task = progress.add_task("Indexando...", total=len(files))
-
-            for file_path in files:
-                if force or self.should_index(file_path):
-                    chunks = self.index_file(file_path)
-                    self.stats["files_processed"] += 1
-                    self.stats["chunks_created"] += chunks
-                else:
-                    logger.debug(f"Sin cambios: {file_path}")
-
-                progress.update(task, advance=1)
+            self._index_pipelined(files, force, on_loaded=lambda: progress.update(task, advance=1))
 
         self.stats["last_run"] = datetime.now().isoformat()
 
@@ -439,6 +465,64 @@ class ODIKnowledgeBaseIndexer:
 
         return self.stats
 
+    def _index_pipelined(self, files: List[Path], force: bool, on_loaded=None):
+        """
+        Pipeline de indexacion: loaders en procesos -> cola de chunks -> embeddings en lote.
+
+        La carga de PDFs y las llamadas a la API de embeddings se solapan, y
+        los chunks de muchos archivos viajan juntos en cada request.
+        """
+        def file_done(item):
+            if item["documents"]:
+                self._file_indexed(item)
+                logger.info(f"Indexado: {item['relative_path']} ({len(item['documents'])} chunks)")
+
+        def file_failed(item, error):
+            logger.error(f"Error indexando {item['file_path']}: {error}")
+            self.stats["errors"] += 1
+
+        batcher = EmbeddingBatcher(
+            self.embeddings,
+            self.vectorstore._collection,
+            batch_size=CONFIG["embed_batch_size"],
+            concurrency=CONFIG["embed_concurrency"],
+            on_file_done=file_done,
+            on_file_failed=file_failed
+        )
+
+        with ProcessPoolExecutor(max_workers=CONFIG["loader_workers"]) as loaders:
+            futures = {
+                loaders.submit(
+                    load_file_job, str(path), self.hash_cache.get_hash(str(path)), force,
+                    DocumentLoader, CONFIG["chunk_size"], CONFIG["chunk_overlap"]
+                ): path
+                for path in files
+            }
+            for future in as_completed(futures):
+                file_path = futures[future]
+                try:
+                    loaded = future.result()
+                    if loaded["skipped"]:
+                        logger.debug(f"Sin cambios: {file_path}")
+                    else:
+                        item = self._build_documents(file_path, loaded["hash"], loaded["chunks"])
+                        self.stats["files_processed"] += 1
+                        self.stats["chunks_created"] += len(item["documents"])
+                        documents = item["documents"]
+                        batcher.put(
+                            item,
+                            [str(uuid.uuid4()) for _ in documents],
+                            [doc.page_content for doc in documents],
+                            [doc.metadata for doc in documents]
+                        )
+                except Exception as e:
+                    logger.error(f"Error indexando {file_path}: {e}")
+                    self.stats["errors"] += 1
+                if on_loaded:
+                    on_loaded()
+
+        batcher.flush()
+
     def watch(self):
         """Modo watch: detecta cambios y reindexar automaticamente."""
         console.print("[bold blue]ODI Indexer - Modo Watch[/bold blue]")
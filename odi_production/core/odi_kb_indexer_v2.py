@@ -26,6 +26,7 @@ from typing import List, Dict, Any, Optional, Generator
 from dataclasses import dataclass, asdict
 import time
 import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 # Third party
 from dotenv import load_dotenv
@@ -33,11 +34,22 @@ import redis
 import httpx
 
 # LangChain
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import Chroma
 from langchain.schema import Document
 
+# Índice léxico (BM25 + códigos exactos) junto a la colección
+try:
+    from .odi_lexical_index import LexicalIndex, lexical_index_path
+except ImportError:
+    from odi_lexical_index import LexicalIndex, lexical_index_path
+
+# Etapas compartidas del pipeline de indexación
+try:
+    from .odi_kb_pipeline import EmbeddingBatcher, build_text_splitter, load_file_job
+except ImportError:
+    from odi_kb_pipeline import EmbeddingBatcher, build_text_splitter, load_file_job
+
 # Document loaders
 try:
     import pdfplumber
@@ -81,6 +93,11 @@ CONFIG = {
     # n8n webhook
     "n8n_webhook": "http://localhost:5678/webhook/odi-kb-indexed",
 
+    # Pipeline de indexación
+    "loader_workers": int(os.getenv("KB_LOADER_WORKERS", os.cpu_count() or 2)),
+    "embed_batch_size": int(os.getenv("KB_EMBED_BATCH_SIZE", "256")),
+    "embed_concurrency": int(os.getenv("KB_EMBED_CONCURRENCY", "4")),
+
     # Extensiones soportadas
     "extensions": {".pdf", ".md", ".txt", ".json", ".csv", ".html", ".py", ".yaml", ".yml"}
 }
@@ -239,6 +256,10 @@ class FileHashCache:
         self.hashes[file_path] = file_hash
         self._save()
 
+    def remove(self, file_path: str):
+        if self.hashes.pop(file_path, None) is not None:
+            self._save()
+
 
 # ============================================
 # MAIN INDEXER
@@ -262,11 +283,7 @@ class ODIKBIndexerV2:
         self.hash_cache = FileHashCache(str(self.cache_file))
 
         # Text splitter
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=CONFIG["chunk_size"],
-            chunk_overlap=CONFIG["chunk_overlap"],
-            separators=["\n\n", "\n", ". ", " ", ""]
-        )
+        self.text_splitter = build_text_splitter(CONFIG["chunk_size"], CONFIG["chunk_overlap"])
 
         # OpenAI
         api_key = os.getenv("OPENAI_API_KEY")
@@ -285,6 +302,7 @@ class ODIKBIndexerV2:
             embedding_function=self.embeddings,
             collection_name="odi_profesion_kb"
         )
+        self.lexical = LexicalIndex(lexical_index_path(str(self.embeddings_path), "odi_profesion_kb"))
 
         # Redis
         try:
@@ -305,9 +323,51 @@ class ODIKBIndexerV2:
             "files_processed": 0,
             "files_skipped": 0,
             "chunks_created": 0,
+            "chunks_unchanged": 0,
+            "chunks_deleted": 0,
+            "files_removed": 0,
             "errors": 0
         }
 
+    @staticmethod
+    def chunk_id(source: str, chunk: str) -> str:
+        """ID determinístico de un chunk: (archivo, hash del contenido)."""
+        content_hash = hashlib.md5(chunk.encode("utf-8")).hexdigest()
+        return hashlib.sha1(f"{source}:{content_hash}".encode("utf-8")).hexdigest()
+
+    def _existing_chunk_ids(self, source: str) -> set:
+        """IDs de los chunks ya indexados para un archivo."""
+        existing = self.vectorstore._collection.get(where={"source": source}, include=[])
+        return set(existing["ids"])
+
+    def remove_file(self, file_path: Path) -> int:
+        """Elimina del índice todos los chunks de un archivo."""
+        relative_path = file_path.relative_to(self.profesion_path)
+        stale_ids = self._existing_chunk_ids(str(relative_path))
+        if stale_ids:
+            self.vectorstore.delete(ids=list(stale_ids))
+        self.lexical.delete_source(str(relative_path))
+        self.hash_cache.remove(str(file_path))
+        self.stats["chunks_deleted"] += len(stale_ids)
+        logger.info(f"✗ {relative_path} ({len(stale_ids)} chunks removed)")
+        return len(stale_ids)
+
+    def prune_deleted_files(self) -> int:
+        """Recolecta los chunks de archivos que ya no existen en disco."""
+        removed = 0
+        for cached_path in list(self.hash_cache.hashes):
+            file_path = Path(cached_path)
+            if file_path.exists():
+                continue
+            try:
+                self.remove_file(file_path)
+                self.stats["files_removed"] += 1
+                removed += 1
+            except Exception as e:
+                logger.error(f"Error removing {file_path}: {e}")
+                self.stats["errors"] += 1
+        return removed
+
     def discover_files(self) -> Generator[Path, None, None]:
         """Descubre todos los archivos indexables."""
         for ext in CONFIG["extensions"]:
@@ -330,62 +390,115 @@ class ODIKBIndexerV2:
 
             # Load content
             content = DocumentLoader.load(str(file_path))
-            if not content or len(content) < 50:
-                logger.debug(f"Skipping (insufficient content): {file_path}")
-                return 0
+            chunks = self.text_splitter.split_text(content) if content and len(content) >= 50 else []
 
-            # Metadata
-            relative_path = file_path.relative_to(self.profesion_path)
-            metadata = {
-                "source": str(relative_path),
-                "file_name": file_path.name,
-                "file_type": file_path.suffix.lower(),
-                "category": str(relative_path.parent) if str(relative_path.parent) != "." else "root",
-                "indexed_at": datetime.now().isoformat(),
-                "file_hash": current_hash
-            }
+            plan = self._plan_file(file_path, current_hash, chunks)
+            if plan is None:
+                return 0
 
-            # Split into chunks
-            chunks = self.text_splitter.split_text(content)
-
-            # Create documents
-            documents = []
-            for i, chunk in enumerate(chunks):
-                doc = Document(
-                    page_content=chunk,
-                    metadata={
-                        **metadata,
-                        "chunk_index": i,
-                        "total_chunks": len(chunks)
-                    }
-                )
-                documents.append(doc)
-
-            # Add to vectorstore
-            if documents:
-                self.vectorstore.add_documents(documents)
-                self.hash_cache.set_hash(str(file_path), current_hash)
-                self.stats["files_processed"] += 1
-                self.stats["chunks_created"] += len(documents)
-
-                # Publish to Redis
-                if self.redis:
-                    self.redis.publish("odi:kb:indexed", json.dumps({
-                        "file": str(relative_path),
-                        "chunks": len(documents),
-                        "timestamp": datetime.now().isoformat()
-                    }))
-
-                logger.info(f"✓ {relative_path} ({len(documents)} chunks)")
-                return len(documents)
+            if plan["new_ids"]:
+                documents = [
+                    Document(page_content=text, metadata=metadata)
+                    for text, metadata in zip(plan["new_texts"], plan["new_metadatas"])
+                ]
+                self.vectorstore.add_documents(documents, ids=plan["new_ids"])
 
-            return 0
+            self._finish_file(plan)
+            return len(plan["new_ids"])
 
         except Exception as e:
             logger.error(f"Error indexing {file_path}: {e}")
             self.stats["errors"] += 1
             return 0
 
+    def _plan_file(self, file_path: Path, current_hash: str, chunks: List[str]) -> Optional[Dict[str, Any]]:
+        """
+        Calcula el diff de chunks de un archivo contra el índice.
+
+        Refresca la metadata de los chunks que no cambiaron y devuelve los
+        nuevos que falta embeber. Los obsoletos se borran en _finish_file,
+        una vez escritos los nuevos, para no dejar el archivo a medio
+        indexar si el embedding falla.
+        """
+        if not chunks:
+            logger.debug(f"Skipping (insufficient content): {file_path}")
+            if str(file_path) in self.hash_cache.hashes:
+                self.remove_file(file_path)
+            return None
+
+        # Metadata
+        relative_path = file_path.relative_to(self.profesion_path)
+        metadata = {
+            "source": str(relative_path),
+            "file_name": file_path.name,
+            "file_type": file_path.suffix.lower(),
+            "category": str(relative_path.parent) if str(relative_path.parent) != "." else "root",
+            "indexed_at": datetime.now().isoformat(),
+            "file_hash": current_hash
+        }
+
+        # IDs determinísticos, sin duplicados
+        unique_chunks = {}
+        for chunk in chunks:
+            unique_chunks.setdefault(self.chunk_id(metadata["source"], chunk), chunk)
+
+        # Diff contra lo ya indexado: solo se embeben los chunks nuevos
+        existing_ids = self._existing_chunk_ids(metadata["source"])
+        stale_ids = existing_ids - unique_chunks.keys()
+        kept_ids = [cid for cid in unique_chunks if cid in existing_ids]
+        new_ids = [cid for cid in unique_chunks if cid not in existing_ids]
+
+        chunk_metadata = {
+            cid: {**metadata, "chunk_index": i, "total_chunks": len(unique_chunks)}
+            for i, cid in enumerate(unique_chunks)
+        }
+
+        if kept_ids:
+            self.vectorstore._collection.update(
+                ids=kept_ids,
+                metadatas=[chunk_metadata[cid] for cid in kept_ids]
+            )
+
+        return {
+            "file_path": file_path,
+            "relative_path": relative_path,
+            "file_hash": current_hash,
+            "total_chunks": len(unique_chunks),
+            "kept": len(kept_ids),
+            "stale": len(stale_ids),
+            "stale_ids": list(stale_ids),
+            "new_ids": new_ids,
+            "new_texts": [unique_chunks[cid] for cid in new_ids],
+            "new_metadatas": [chunk_metadata[cid] for cid in new_ids],
+        }
+
+    def _finish_file(self, plan: Dict[str, Any]):
+        """Marca un archivo como indexado una vez escritos todos sus chunks."""
+        if plan["stale_ids"]:
+            self.vectorstore.delete(ids=plan["stale_ids"])
+            self.lexical.delete(plan["stale_ids"])
+        self.lexical.upsert(plan["new_ids"], plan["new_texts"], plan["new_metadatas"])
+        self.hash_cache.set_hash(str(plan["file_path"]), plan["file_hash"])
+        self.stats["files_processed"] += 1
+        self.stats["chunks_created"] += len(plan["new_ids"])
+        self.stats["chunks_unchanged"] += plan["kept"]
+        self.stats["chunks_deleted"] += plan["stale"]
+
+        # Publish to Redis
+        if self.redis:
+            self.redis.publish("odi:kb:indexed", json.dumps({
+                "file": str(plan["relative_path"]),
+                "chunks": plan["total_chunks"],
+                "chunks_embedded": len(plan["new_ids"]),
+                "chunks_deleted": plan["stale"],
+                "timestamp": datetime.now().isoformat()
+            }))
+
+        logger.info(
+            f"✓ {plan['relative_path']} ({len(plan['new_ids'])} new, {plan['kept']} unchanged, "
+            f"{plan['stale']} removed)"
+        )
+
     def index_all(self, force: bool = False):
         """Indexa todo el directorio profesion."""
         logger.info("=" * 60)
@@ -403,10 +516,13 @@ class ODIKBIndexerV2:
             logger.warning("No files found!")
             return
 
-        # Process files
-        for i, file_path in enumerate(files, 1):
-            logger.info(f"[{i}/{len(files)}] Processing: {file_path.name}")
-            self.index_file(file_path, force=force)
+        # Process files (loaders en paralelo → cola de chunks → embeddings en lote)
+        self._index_pipelined(files, force=force)
+
+        # Garbage-collect chunks of deleted files
+        removed = self.prune_deleted_files()
+        if removed:
+            logger.info(f"Removed {removed} deleted files from index")
 
         # Persist
         logger.info("Persisting vector store...")
@@ -425,9 +541,59 @@ class ODIKBIndexerV2:
         logger.info(f"  Files processed: {self.stats['files_processed']}")
         logger.info(f"  Files skipped:   {self.stats['files_skipped']}")
         logger.info(f"  Chunks created:  {self.stats['chunks_created']}")
+        logger.info(f"  Chunks kept:     {self.stats['chunks_unchanged']}")
+        logger.info(f"  Chunks deleted:  {self.stats['chunks_deleted']}")
         logger.info(f"  Errors:          {self.stats['errors']}")
         logger.info("=" * 60)
 
+    def _index_pipelined(self, files: List[Path], force: bool = False):
+        """
+        Indexa muchos archivos solapando carga y embedding.
+
+        Los loaders corren en un pool de procesos; cada archivo cargado se
+        diffea contra el índice y sus chunks nuevos entran a la cola del
+        EmbeddingBatcher, que los agrupa con los de otros archivos en
+        requests de embedding grandes con concurrencia acotada.
+        """
+        batcher = EmbeddingBatcher(
+            self.embeddings,
+            self.vectorstore._collection,
+            batch_size=CONFIG["embed_batch_size"],
+            concurrency=CONFIG["embed_concurrency"],
+            on_file_done=self._finish_file,
+            on_file_failed=self._fail_file
+        )
+
+        with ProcessPoolExecutor(max_workers=CONFIG["loader_workers"]) as loaders:
+            futures = {
+                loaders.submit(
+                    load_file_job, str(path), self.hash_cache.hashes.get(str(path)), force,
+                    DocumentLoader, CONFIG["chunk_size"], CONFIG["chunk_overlap"]
+                ): path
+                for path in files
+            }
+            for i, future in enumerate(as_completed(futures), 1):
+                file_path = futures[future]
+                try:
+                    loaded = future.result()
+                    if loaded["skipped"]:
+                        self.stats["files_skipped"] += 1
+                        continue
+                    logger.info(f"[{i}/{len(files)}] Loaded: {file_path.name}")
+                    plan = self._plan_file(file_path, loaded["hash"], loaded["chunks"])
+                    if plan is not None:
+                        batcher.put(plan, plan["new_ids"], plan["new_texts"], plan["new_metadatas"])
+                except Exception as e:
+                    logger.error(f"Error indexing {file_path}: {e}")
+                    self.stats["errors"] += 1
+
+        batcher.flush()
+
+    def _fail_file(self, plan: Dict[str, Any], error: Exception):
+        """El hash no se guarda: el archivo se reintenta en la próxima corrida."""
+        logger.error(f"Error embedding {plan['relative_path']}: {error}")
+        self.stats["errors"] += 1
+
     def _notify_n8n(self):
         """Notifica a n8n que se completó la indexación."""
         try:
@@ -503,6 +669,11 @@ class ODIKBIndexerV2:
             def on_created(self, event):
                 self.on_modified(event)
 
+            def on_deleted(self, event):
+                if not event.is_directory and event.src_path in self.indexer.hash_cache.hashes:
+                    logger.info(f"Deletion detected: {event.src_path}")
+                    self.indexer.remove_file(Path(event.src_path))
+
         observer = Observer()
         observer.schedule(Handler(self), str(self.profesion_path), recursive=True)
         observer.start()
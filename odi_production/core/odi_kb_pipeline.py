@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+ODI KB Pipeline - etapas compartidas de los indexadores
+=======================================================
+Piezas comunes de odi_kb_indexer y odi_kb_indexer_v2:
+
+- build_text_splitter(): splitter de chunks con los separadores de ODI.
+- load_file_job(): etapa de carga (hash, extracción de texto y split) que
+  corre en un ProcessPoolExecutor.
+- EmbeddingBatcher: etapa de embedding; agrupa chunks de muchos archivos
+  en lotes grandes con concurrencia acotada.
+
+Uso:
+    loaders.submit(load_file_job, path, known_hash, force, DocumentLoader, 1000, 200)
+    batcher = EmbeddingBatcher(embeddings, collection, 256, 4, on_done, on_failed)
+    batcher.put(item, ids, texts, metadatas)
+    batcher.flush()
+"""
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, ALL_COMPLETED
+from typing import List, Dict, Any, Optional, Tuple
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+logger = logging.getLogger(__name__)
+
+
+def build_text_splitter(chunk_size: int, chunk_overlap: int) -> RecursiveCharacterTextSplitter:
+    """Splitter compartido por los indexadores y los procesos loader."""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        separators=["\n\n", "\n", ". ", " ", ""]
+    )
+
+
+_worker_splitters: Dict[Tuple[int, int], RecursiveCharacterTextSplitter] = {}
+
+
+def load_file_job(file_path: str, known_hash: Optional[str], force: bool, loader,
+                  chunk_size: int, chunk_overlap: int) -> Dict[str, Any]:
+    """
+    Etapa de carga del pipeline: hash, extracción de texto y split.
+
+    Se ejecuta en un ProcessPoolExecutor (el parsing de PDFs es CPU-bound),
+    por eso es una función de módulo que solo devuelve tipos serializables.
+    `loader` es la clase DocumentLoader del indexador (compute_hash y load).
+    """
+    file_hash = loader.compute_hash(file_path)
+    if not force and known_hash == file_hash:
+        return {"path": file_path, "hash": file_hash, "skipped": True, "chunks": []}
+
+    content = loader.load(file_path)
+    if not content or len(content) < 50:
+        logger.warning(f"Contenido insuficiente: {file_path}")
+        return {"path": file_path, "hash": file_hash, "skipped": False, "chunks": []}
+
+    key = (chunk_size, chunk_overlap)
+    if key not in _worker_splitters:
+        _worker_splitters[key] = build_text_splitter(chunk_size, chunk_overlap)
+    return {
+        "path": file_path,
+        "hash": file_hash,
+        "skipped": False,
+        "chunks": _worker_splitters[key].split_text(content)
+    }
+
+
+class EmbeddingBatcher:
+    """
+    Etapa de embedding del pipeline.
+
+    Los chunks de todos los archivos entran a una cola compartida y se
+    empaquetan en lotes de `batch_size` (mezclando archivos) que se embeben
+    en un pool de hilos con a lo sumo `concurrency` requests en vuelo. Un
+    archivo se da por terminado cuando todos sus chunks fueron escritos:
+    entonces se invoca `on_file_done(item)` u `on_file_failed(item, error)`.
+    """
+
+    def __init__(self, embeddings, collection, batch_size: int, concurrency: int,
+                 on_file_done, on_file_failed):
+        self.embeddings = embeddings
+        self.collection = collection
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.on_file_done = on_file_done
+        self.on_file_failed = on_file_failed
+        self.queue = deque()
+        self.pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="embed")
+        self.in_flight: Dict[Any, List] = {}
+        self.remaining: Dict[int, int] = {}
+        self.failed: Dict[int, Exception] = {}
+
+    def put(self, item: Any, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]]):
+        """Encola los chunks de un archivo; `item` se devuelve tal cual en los callbacks."""
+        if not ids:
+            self.on_file_done(item)
+            return
+        self.remaining[id(item)] = len(ids)
+        for chunk in zip(ids, texts, metadatas):
+            self.queue.append((item, *chunk))
+        while len(self.queue) >= self.batch_size:
+            self._submit()
+
+    def flush(self):
+        """Envía lo que quede en la cola y espera los lotes en vuelo."""
+        while self.queue:
+            self._submit()
+        self._drain(ALL_COMPLETED)
+        self.pool.shutdown()
+
+    def _submit(self):
+        batch = [self.queue.popleft() for _ in range(min(self.batch_size, len(self.queue)))]
+        while len(self.in_flight) >= self.concurrency:
+            self._drain(FIRST_COMPLETED)
+        future = self.pool.submit(self.embeddings.embed_documents, [text for _, _, text, _ in batch])
+        self.in_flight[future] = batch
+
+    def _drain(self, return_when):
+        if not self.in_flight:
+            return
+        done, _ = wait(self.in_flight, return_when=return_when)
+        for future in done:
+            batch = self.in_flight.pop(future)
+            try:
+                self.collection.upsert(
+                    ids=[cid for _, cid, _, _ in batch],
+                    embeddings=future.result(),
+                    documents=[text for _, _, text, _ in batch],
+                    metadatas=[metadata for _, _, _, metadata in batch]
+                )
+            except Exception as e:
+                for item, _, _, _ in batch:
+                    self.failed.setdefault(id(item), e)
+            for item, _, _, _ in batch:
+                self._chunk_written(item)
+
+    def _chunk_written(self, item: Any):
+        key = id(item)
+        self.remaining[key] -= 1
+        if self.remaining[key]:
+            return
+        del self.remaining[key]
+        error = self.failed.pop(key, None)
+        if error is None:
+            self.on_file_done(item)
+        else:
+            self.on_file_failed(item, error)
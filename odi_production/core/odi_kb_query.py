@@ -9,6 +9,7 @@ Endpoints:
     POST /search         - Busqueda semantica simple
     GET  /health         - Health check
     GET  /stats          - Estadisticas del indice
+    GET  /metrics        - Metricas (Prometheus; ?format=json)
     POST /feedback       - Enviar feedback sobre respuesta
 
 Uso:
@@ -35,6 +36,18 @@ from langchain_community.vectorstores import Chroma
 from langchain.chains import RetrievalQA
 from langchain.prompts import PromptTemplate
 
+# Recuperación híbrida (BM25 + códigos exactos + vectores)
+try:
+    from .odi_lexical_index import LexicalIndex, lexical_index_path, fuse_results
+except ImportError:
+    from odi_lexical_index import LexicalIndex, lexical_index_path, fuse_results
+
+# Metricas en proceso (latencias p50/p95/p99 por ventana)
+try:
+    from .odi_metrics import REGISTRY as METRICS, install_fastapi
+except ImportError:
+    from odi_metrics import REGISTRY as METRICS, install_fastapi
+
 # Load config
 load_dotenv("/opt/odi/config/.env")
 
@@ -71,6 +84,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+install_fastapi(app)
+
 # ============================================================================
 # Models
 # ============================================================================
@@ -166,6 +181,7 @@ class ODIKnowledgeBaseService:
             embedding_function=self.embeddings,
             collection_name="odi_knowledge_base"
         )
+        self.lexical = LexicalIndex(lexical_index_path(str(embeddings_path), "odi_knowledge_base"))
 
         # Redis
         try:
@@ -214,23 +230,36 @@ Respuesta amigable:""",
         self._initialized = True
         logger.info("ODI Knowledge Base Service inicializado")
 
+    def retrieve(self, query: str, k: int = 10, filter_dict: Optional[Dict] = None) -> List[Dict]:
+        """
+        Recuperacion hibrida: fusiona busqueda vectorial y lexica (BM25).
+
+        Los chunks que contienen exactamente un codigo de la query (ej.
+        "CB190R") van primero, por lo que basta un k pequeno para lookups precisos.
+        """
+        if filter_dict:
+            results = self.vectorstore.similarity_search_with_score(
+                query, k=k, filter=filter_dict
+            )
+        else:
+            results = self.vectorstore.similarity_search_with_score(query, k=k)
+
+        vector_results = [
+            {"content": doc.page_content, "metadata": doc.metadata, "distance": float(score)}
+            for doc, score in results
+        ]
+        lexical_results = self.lexical.search(query, k=k, where=filter_dict)
+        return fuse_results(vector_results, lexical_results, k)
+
     def search(self, query: str, k: int = 10, filter_dict: Optional[Dict] = None) -> List[Dict]:
-        """Busqueda semantica simple."""
+        """Busqueda hibrida simple."""
         try:
-            if filter_dict:
-                results = self.vectorstore.similarity_search_with_score(
-                    query, k=k, filter=filter_dict
-                )
-            else:
-                results = self.vectorstore.similarity_search_with_score(query, k=k)
-
             return [
                 {
-                    "content": doc.page_content[:500] + "..." if len(doc.page_content) > 500 else doc.page_content,
-                    "metadata": doc.metadata,
-                    "score": float(score)
+                    **result,
+                    "content": result["content"][:500] + "..." if len(result["content"]) > 500 else result["content"]
                 }
-                for doc, score in results
+                for result in self.retrieve(query, k=k, filter_dict=filter_dict)
             ]
         except Exception as e:
             logger.error(f"Error en busqueda: {e}")
@@ -241,77 +270,85 @@ Respuesta amigable:""",
         import uuid
 
         query_id = str(uuid.uuid4())[:8]
+        METRICS.counter("rag_queries_total", voice=voice).inc()
 
         try:
-            # Retrieve relevant documents
-            docs = self.vectorstore.similarity_search(question, k=k)
-
-            if not docs:
-                return {
-                    "query_id": query_id,
-                    "answer": "No encontre informacion relevante sobre esa pregunta en la base de conocimiento.",
-                    "sources": [],
-                    "confidence": 0.0
-                }
-
-            # Build context
-            doc_context = "\n\n".join([
-                f"[Fuente: {doc.metadata.get('source', 'desconocida')}]\n{doc.page_content}"
-                for doc in docs
-            ])
-
-            if context:
-                doc_context = f"Contexto adicional: {context}\n\n{doc_context}"
-
-            # Select prompt
-            prompt = self.prompts.get(voice, self.prompts["ramona"])
-
-            # Generate answer
-            formatted_prompt = prompt.format(context=doc_context, question=question)
-            response = self.llm.invoke(formatted_prompt)
-            answer = response.content
-
-            # Extract sources
-            sources = [
-                {
-                    "file": doc.metadata.get("source", "desconocido"),
-                    "category": doc.metadata.get("category", ""),
-                    "chunk": doc.metadata.get("chunk_index", 0),
-                    "snippet": doc.page_content[:200] + "..."
-                }
-                for doc in docs
-            ]
-
-            # Calculate confidence (basic heuristic)
-            confidence = min(1.0, len(docs) / k * 0.8 + 0.2)
-
-            # Log to Redis
-            if self.redis:
-                self.redis.lpush("odi:queries", json.dumps({
-                    "query_id": query_id,
-                    "question": question,
-                    "voice": voice,
-                    "sources_count": len(sources),
-                    "timestamp": datetime.now().isoformat()
-                }))
-                self.redis.ltrim("odi:queries", 0, 999)  # Keep last 1000
-
+            with METRICS.timer("rag_query_ms"):
+                return self._answer(query_id, question, k, voice, context)
+        except Exception as e:
+            METRICS.counter("rag_errors_total").inc()
+            logger.error(f"Error en query RAG: {e}")
             return {
                 "query_id": query_id,
-                "answer": answer,
-                "sources": sources,
-                "confidence": confidence
+                "answer": f"Error procesando la consulta: {str(e)}",
+                "sources": [],
+                "confidence": 0.0
             }
 
-        except Exception as e:
-            logger.error(f"Error en query RAG: {e}")
+    def _answer(self, query_id: str, question: str, k: int, voice: str, context: str) -> Dict[str, Any]:
+        # Retrieve relevant documents
+        with METRICS.timer("rag_stage_ms", stage="retrieve"):
+            docs = self.retrieve(question, k=k)
+
+        if not docs:
             return {
                 "query_id": query_id,
-                "answer": f"Error procesando la consulta: {str(e)}",
+                "answer": "No encontre informacion relevante sobre esa pregunta en la base de conocimiento.",
                 "sources": [],
                 "confidence": 0.0
             }
 
+        # Build context
+        doc_context = "\n\n".join([
+            f"[Fuente: {doc['metadata'].get('source', 'desconocida')}]\n{doc['content']}"
+            for doc in docs
+        ])
+
+        if context:
+            doc_context = f"Contexto adicional: {context}\n\n{doc_context}"
+
+        # Select prompt
+        prompt = self.prompts.get(voice, self.prompts["ramona"])
+
+        # Generate answer
+        formatted_prompt = prompt.format(context=doc_context, question=question)
+        with METRICS.timer("rag_stage_ms", stage="llm"):
+            response = self.llm.invoke(formatted_prompt)
+        answer = response.content
+
+        # Extract sources
+        sources = [
+            {
+                "file": doc["metadata"].get("source", "desconocido"),
+                "category": doc["metadata"].get("category", ""),
+                "chunk": doc["metadata"].get("chunk_index", 0),
+                "snippet": doc["content"][:200] + "...",
+                "match": doc["match"]
+            }
+            for doc in docs
+        ]
+
+        # Calculate confidence (basic heuristic)
+        confidence = min(1.0, len(docs) / k * 0.8 + 0.2)
+
+        # Log to Redis
+        if self.redis:
+            self.redis.lpush("odi:queries", json.dumps({
+                "query_id": query_id,
+                "question": question,
+                "voice": voice,
+                "sources_count": len(sources),
+                "timestamp": datetime.now().isoformat()
+            }))
+            self.redis.ltrim("odi:queries", 0, 999)  # Keep last 1000
+
+        return {
+            "query_id": query_id,
+            "answer": answer,
+            "sources": sources,
+            "confidence": confidence
+        }
+
     def get_stats(self) -> Dict[str, Any]:
         """Obtiene estadisticas."""
         try:
@@ -332,6 +369,13 @@ Respuesta amigable:""",
             stats["total_queries"] = self.redis.llen("odi:queries")
             stats["total_feedbacks"] = self.redis.llen("odi:feedbacks")
 
+        # Latencias de consulta (ventanas móviles, memoria fija)
+        stats["latency_ms"] = {
+            "query": METRICS.histogram("rag_query_ms").snapshot(),
+            "retrieve": METRICS.histogram("rag_stage_ms", stage="retrieve").snapshot(),
+            "llm": METRICS.histogram("rag_stage_ms", stage="llm").snapshot(),
+        }
+
         return stats
 
 
@@ -434,13 +478,16 @@ async def submit_feedback(request: FeedbackRequest, background_tasks: Background
         "timestamp": datetime.now().isoformat()
     }
 
-    # Store in Redis
+    # Store in Redis; el feedback loop lo consume del stream (alertas + webhook)
+    webhook_url = CONFIG.get("feedback_webhook_url")
     if service.redis:
         service.redis.lpush("odi:feedbacks", json.dumps(feedback_data))
-
-    # Send to webhook in background
-    webhook_url = CONFIG.get("feedback_webhook_url")
-    if webhook_url:
+        service.redis.xadd(
+            "odi:stream:feedback", {"data": json.dumps(feedback_data)},
+            maxlen=100000, approximate=True
+        )
+    elif webhook_url:
+        # Sin Redis el feedback loop no lo recibe: webhook directo
         background_tasks.add_task(send_feedback_webhook, feedback_data, webhook_url)
 
     return {
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+ODI Lexical Index - BM25 + códigos exactos junto a cada colección Chroma
+========================================================================
+Índice invertido local (SQLite FTS5) que los indexadores mantienen en
+paralelo a cada colección de embeddings, y utilidades de fusión para la
+recuperación híbrida léxica + vectorial.
+
+Los embeddings rankean mal referencias exactas como "CB190R" o
+"12345-KYJ-900". Este índice:
+- Tokeniza el contenido con unicode61 (sin acentos) y rankea con BM25.
+- Extrae los tokens tipo código (letras + dígitos) a una tabla indexada
+  para un camino rápido de coincidencia exacta.
+
+Uso:
+    index = LexicalIndex(lexical_index_path(persist_dir, "odi_ind_motos"))
+    index.upsert(ids, texts, metadatas)
+    hits = index.search("kit arrastre CB190R", k=5)
+    results = fuse_results(vector_hits, hits, k=5)
+"""
+import re
+import json
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Iterable
+
+# ============================================
+# CONFIGURACIÓN
+# ============================================
+RRF_K = 60              # Constante de Reciprocal Rank Fusion
+RETRIEVER_SCORES = ("distance", "relevance", "bm25", "code_hits")   # Valor propio de cada retriever
+MIN_TOKEN_LEN = 2       # Tokens más cortos no entran a la query FTS
+
+# Tokens tipo código: al menos una letra y un dígito (CB190R, NKD-125, 12345-KYJ-900)
+# o números largos (SKUs numéricos de 5+ dígitos)
+CODE_PATTERN = re.compile(r"\b(?=[\w\-./]*\d)(?=[\w\-./]*[a-z])[a-z0-9][\w\-./]{2,}\b|\b\d{5,}\b", re.I)
+# Medidas y grados de viscosidad (150cc, 12V, 1.5mm, 10W40) no son códigos
+UNIT_PATTERN = re.compile(
+    r"\d+(?:[.,]\d+)?(?:cc|v|vac|vdc|w|kw|a|ah|mah|mm|cm|m|in|hp|kg|g|lb|nm|rpm|psi|bar|l|ml|km|kmh|t)"
+    r"|\d{1,2}w-?\d{2,3}",
+    re.I
+)
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def lexical_index_path(persist_directory: str, collection_name: str) -> Path:
+    """Ruta del índice léxico que acompaña a una colección Chroma."""
+    return Path(persist_directory) / f"{collection_name}.lexical.db"
+
+
+def normalize_code(token: str) -> str:
+    """CB-190R, cb190r y CB.190R se consideran el mismo código."""
+    return re.sub(r"[\-./_]", "", token).upper()
+
+
+def extract_codes(text: str) -> List[str]:
+    """Extrae los códigos/SKUs normalizados presentes en un texto."""
+    return list(dict.fromkeys(
+        normalize_code(m.group(0)) for m in CODE_PATTERN.finditer(text or "")
+        if not UNIT_PATTERN.fullmatch(m.group(0))
+    ))
+
+
+def result_key(result: Dict[str, Any]) -> str:
+    """Clave para identificar el mismo chunk en rankings de distintas fuentes."""
+    source = (result.get("metadata") or {}).get("source", "")
+    return hashlib.md5(f"{source}\x00{result['content']}".encode("utf-8")).hexdigest()
+
+
+# ============================================
+# ÍNDICE LÉXICO
+# ============================================
+class LexicalIndex:
+    """Índice BM25 + códigos exactos persistido en SQLite (FTS5, WAL mode)."""
+
+    def __init__(self, db_path: Path, source_field: str = "source"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.source_field = source_field
+        self._conn = None
+        self._lock = threading.Lock()
+        self._init_db()
+
+    def _get_conn(self) -> sqlite3.Connection:
+        """Get or create persistent connection."""
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        return self._conn
+
+    def _init_db(self):
+        conn = self._get_conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                doc_id TEXT PRIMARY KEY,
+                source TEXT,
+                content TEXT,
+                metadata TEXT,
+                indexed_at TEXT
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_source ON chunks(source)")
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+                content, content='chunks', content_rowid='rowid',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        """)
+        # Mantener FTS sincronizado con la tabla base
+        conn.executescript("""
+            CREATE TRIGGER IF NOT EXISTS chunks_ai AFTER INSERT ON chunks BEGIN
+                INSERT INTO chunks_fts(rowid, content) VALUES (new.rowid, new.content);
+            END;
+            CREATE TRIGGER IF NOT EXISTS chunks_ad AFTER DELETE ON chunks BEGIN
+                INSERT INTO chunks_fts(chunks_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+            END;
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS codes (
+                code TEXT,
+                doc_id TEXT
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_codes_code ON codes(code)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_codes_doc ON codes(doc_id)")
+        conn.commit()
+
+    # ------------------------------------------
+    # Escritura
+    # ------------------------------------------
+    def upsert(self, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]]):
+        """Inserta o reemplaza chunks."""
+        if not ids:
+            return
+        now = datetime.now().isoformat()
+        with self._lock:
+            conn = self._get_conn()
+            self._delete_ids(conn, ids)
+            conn.executemany(
+                "INSERT INTO chunks (doc_id, source, content, metadata, indexed_at) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (doc_id, str((metadata or {}).get(self.source_field, "")), text,
+                     json.dumps(metadata or {}, ensure_ascii=False), now)
+                    for doc_id, text, metadata in zip(ids, texts, metadatas)
+                ]
+            )
+            conn.executemany(
+                "INSERT INTO codes (code, doc_id) VALUES (?, ?)",
+                [(code, doc_id) for doc_id, text in zip(ids, texts) for code in extract_codes(text)]
+            )
+            conn.commit()
+
+    def delete(self, ids: Iterable[str]):
+        """Elimina chunks por ID."""
+        ids = list(ids)
+        if not ids:
+            return
+        with self._lock:
+            conn = self._get_conn()
+            self._delete_ids(conn, ids)
+            conn.commit()
+
+    def delete_source(self, source: str):
+        """Elimina todos los chunks de un archivo."""
+        with self._lock:
+            conn = self._get_conn()
+            conn.execute(
+                "DELETE FROM codes WHERE doc_id IN (SELECT doc_id FROM chunks WHERE source = ?)",
+                (source,)
+            )
+            conn.execute("DELETE FROM chunks WHERE source = ?", (source,))
+            conn.commit()
+
+    def _delete_ids(self, conn: sqlite3.Connection, ids: List[str]):
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            conn.execute(f"DELETE FROM codes WHERE doc_id IN ({placeholders})", batch)
+            conn.execute(f"DELETE FROM chunks WHERE doc_id IN ({placeholders})", batch)
+
+    # ------------------------------------------
+    # Lectura
+    # ------------------------------------------
+    def search(self, query: str, k: int = 10, where: Optional[Dict[str, Any]] = None) -> List[Dict]:
+        """
+        Búsqueda léxica.
+
+        Los chunks que contienen exactamente un código de la query van
+        primero (match="exact", con `code_hits`); el resto se completa con
+        BM25 (match="lexical", con `bm25`: más alto = más relevante).
+        """
+        exact = self.lookup_codes(extract_codes(query), k=k, where=where)
+        if len(exact) >= k:
+            return exact
+
+        seen = {r["id"] for r in exact}
+        lexical = [r for r in self._bm25(query, k + len(exact), where) if r["id"] not in seen]
+        return exact + lexical[:k - len(exact)]
+
+    def lookup_codes(self, codes: List[str], k: int = 10, where: Optional[Dict[str, Any]] = None) -> List[Dict]:
+        """Camino rápido: chunks que mencionan alguno de los códigos exactos."""
+        if not codes:
+            return []
+        filter_sql, filter_params = self._where_sql(where)
+        placeholders = ",".join("?" * len(codes))
+        with self._lock:
+            rows = self._get_conn().execute(
+                f"""SELECT c.doc_id, c.content, c.metadata, COUNT(*) AS hits
+                    FROM codes x JOIN chunks c ON c.doc_id = x.doc_id
+                    WHERE x.code IN ({placeholders}){filter_sql}
+                    GROUP BY c.doc_id
+                    ORDER BY hits DESC
+                    LIMIT ?""",
+                [*codes, *filter_params, k]
+            ).fetchall()
+        return [
+            {"id": doc_id, "content": content, "metadata": json.loads(metadata),
+             "code_hits": hits, "match": "exact"}
+            for doc_id, content, metadata, hits in rows
+        ]
+
+    def _bm25(self, query: str, k: int, where: Optional[Dict[str, Any]]) -> List[Dict]:
+        terms = [t for t in WORD_PATTERN.findall(query.lower()) if len(t) >= MIN_TOKEN_LEN]
+        if not terms:
+            return []
+        match = " OR ".join(f'"{t}"' for t in dict.fromkeys(terms))
+        filter_sql, filter_params = self._where_sql(where)
+        with self._lock:
+            rows = self._get_conn().execute(
+                f"""SELECT c.doc_id, c.content, c.metadata, bm25(chunks_fts) AS rank
+                    FROM chunks_fts JOIN chunks c ON c.rowid = chunks_fts.rowid
+                    WHERE chunks_fts MATCH ?{filter_sql}
+                    ORDER BY rank
+                    LIMIT ?""",
+                [match, *filter_params, k]
+            ).fetchall()
+        # bm25() de FTS5 es negativo: más bajo = más relevante
+        return [
+            {"id": doc_id, "content": content, "metadata": json.loads(metadata),
+             "bm25": -float(rank), "match": "lexical"}
+            for doc_id, content, metadata, rank in rows
+        ]
+
+    @staticmethod
+    def _where_sql(where: Optional[Dict[str, Any]]):
+        if not where:
+            return "", []
+        clauses, params = [], []
+        for field, value in where.items():
+            if not re.fullmatch(r"\w+", field):
+                raise ValueError(f"Invalid filter field: {field}")
+            clauses.append(f" AND json_extract(c.metadata, '$.{field}') = ?")
+            params.append(value)
+        return "".join(clauses), params
+
+    def count(self) -> int:
+        with self._lock:
+            return self._get_conn().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def close(self):
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+
+
+# ============================================
+# FUSIÓN HÍBRIDA
+# ============================================
+def fuse_results(vector_results: List[Dict], lexical_results: List[Dict], k: int) -> List[Dict]:
+    """
+    Fusiona rankings vectorial y léxico con Reciprocal Rank Fusion.
+
+    Las coincidencias exactas de código se ubican siempre primero. El
+    ranking lo da `fused_score`; los valores de cada retriever quedan en
+    claves propias (`distance` o `relevance` del vectorial, `bm25`,
+    `code_hits`) porque no son comparables entre sí. `match` indica el
+    origen: "exact", "lexical", "vector" o "hybrid".
+    """
+    fused: Dict[str, Dict] = {}
+
+    for ranking, default_match in ((vector_results, "vector"), (lexical_results, "lexical")):
+        for rank, result in enumerate(ranking):
+            key = result_key(result)
+            entry = fused.get(key)
+            if entry is None:
+                entry = {**result, "match": result.get("match", default_match), "fused_score": 0.0}
+                entry.pop("id", None)
+                fused[key] = entry
+            else:
+                if entry["match"] != "exact":
+                    entry["match"] = "exact" if result.get("match") == "exact" else "hybrid"
+                for name in RETRIEVER_SCORES:
+                    if name in result:
+                        entry.setdefault(name, result[name])
+            entry["fused_score"] += 1.0 / (RRF_K + rank + 1)
+
+    return sorted(
+        fused.values(),
+        key=lambda r: (r["match"] != "exact", -r["fused_score"])
+    )[:k]
@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+ODI Metrics v1.0
+================
+Metricas en proceso para los servicios ODI (API, KB Query, Pipeline,
+Feedback Loop), expuestas en /metrics.
+
+- Counter: sin locks; cada hilo incrementa su propia celda y la lectura
+  suma las celdas.
+- Histogram: buckets logaritmicos estilo DDSketch (error relativo 1%),
+  memoria acotada por metrica sin importar el volumen.
+- Ventanas moviles 1m / 5m / 1h (slots de 10 s y de 1 min).
+
+Uso:
+    from odi_metrics import REGISTRY, install_fastapi
+
+    install_fastapi(app)                        # middleware HTTP + GET /metrics
+    with REGISTRY.timer("rag_query_ms"):
+        ...
+    REGISTRY.counter("feedback_total").inc()
+    REGISTRY.snapshot()["histograms"]["rag_query_ms"]["5m"]["p99"]
+
+Autor: ODI Team
+Version: 1.0
+"""
+
+import json
+import math
+import time
+import threading
+from collections import deque
+from typing import Dict, Any, Optional, List, Tuple, Callable
+
+# ============================================
+# CONFIGURACIÓN
+# ============================================
+SLOT_SECONDS = 10                    # Resolucion de las ventanas cortas
+COARSE_SLOT_SECONDS = 60             # Resolucion de la ventana de 1h
+WINDOWS = {"1m": 60, "5m": 300, "1h": 3600}
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+RELATIVE_ACCURACY = 0.01             # DDSketch: error relativo de los cuantiles
+MIN_VALUE = 1e-3                     # Valores menores caen en el bucket cero
+MAX_VALUE = 1e9                      # Valores mayores se recortan al ultimo bucket
+NAMESPACE = "odi"
+
+_GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+_MIN_INDEX = math.ceil(math.log(MIN_VALUE) / _LOG_GAMMA)
+_MAX_INDEX = math.ceil(math.log(MAX_VALUE) / _LOG_GAMMA)
+_ZERO_BUCKET = _MIN_INDEX - 1
+
+
+def _bucket(value: float) -> int:
+    if value <= MIN_VALUE:
+        return _ZERO_BUCKET
+    return min(math.ceil(math.log(value) / _LOG_GAMMA), _MAX_INDEX)
+
+
+def _bucket_value(index: int) -> float:
+    if index == _ZERO_BUCKET:
+        return 0.0
+    return 2 * _GAMMA ** index / (_GAMMA + 1)
+
+
+# ============================================
+# COUNTER
+# ============================================
+class _CounterCell:
+    """Celda de un hilo: total + conteo por slot (solo la escribe su hilo)."""
+
+    __slots__ = ("total", "slots")
+
+    def __init__(self):
+        self.total = 0
+        self.slots = deque(maxlen=WINDOWS["1h"] // SLOT_SECONDS + 1)
+
+
+class Counter:
+    """Contador monotono sin locks en el camino de escritura."""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._cells: List[_CounterCell] = []
+        self._cells_lock = threading.Lock()   # Solo al registrar un hilo nuevo
+
+    def _cell(self) -> _CounterCell:
+        cell = getattr(self._local, "cell", None)
+        if cell is None:
+            cell = self._local.cell = _CounterCell()
+            with self._cells_lock:
+                self._cells.append(cell)
+        return cell
+
+    def inc(self, n: int = 1):
+        cell = self._cell()
+        slot = int(time.monotonic() // SLOT_SECONDS)
+        if cell.slots and cell.slots[-1][0] == slot:
+            cell.slots[-1][1] += n
+        else:
+            cell.slots.append([slot, n])
+        cell.total += n
+
+    @property
+    def value(self) -> int:
+        return sum(cell.total for cell in list(self._cells))
+
+    def window(self, seconds: int) -> int:
+        oldest = int(time.monotonic() // SLOT_SECONDS) - seconds // SLOT_SECONDS
+        return sum(
+            count
+            for cell in list(self._cells)
+            for slot, count in list(cell.slots)
+            if slot > oldest
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        data = {"total": self.value}
+        for name, seconds in WINDOWS.items():
+            data[name] = self.window(seconds)
+        return data
+
+
+# ============================================
+# HISTOGRAM
+# ============================================
+class _Slot:
+    __slots__ = ("id", "count", "sum", "min", "max", "buckets")
+
+    def __init__(self, slot_id: int):
+        self.id = slot_id
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.buckets: Dict[int, int] = {}
+
+    def add(self, value: float, bucket: int):
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+
+class Histogram:
+    """
+    Histograma de latencias con buckets logaritmicos (DDSketch).
+
+    Guarda una ventana fina (slots de SLOT_SECONDS, 5 min) y una gruesa
+    (slots de COARSE_SLOT_SECONDS, 1 h); como los buckets estan acotados
+    entre MIN_VALUE y MAX_VALUE, la memoria por metrica tiene tope fijo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fine: deque = deque(maxlen=WINDOWS["5m"] // SLOT_SECONDS)
+        self._coarse: deque = deque(maxlen=WINDOWS["1h"] // COARSE_SLOT_SECONDS)
+        self.count = 0
+        self.sum = 0.0
+
+    @staticmethod
+    def _current(ring: deque, slot_id: int) -> _Slot:
+        if not ring or ring[-1].id != slot_id:
+            ring.append(_Slot(slot_id))
+        return ring[-1]
+
+    def record(self, value: float):
+        bucket = _bucket(value)
+        now = time.monotonic()
+        with self._lock:
+            self._current(self._fine, int(now // SLOT_SECONDS)).add(value, bucket)
+            self._current(self._coarse, int(now // COARSE_SLOT_SECONDS)).add(value, bucket)
+            self.count += 1
+            self.sum += value
+
+    def _merged(self, seconds: int) -> Tuple[int, float, float, float, Dict[int, int]]:
+        now = time.monotonic()
+        if seconds <= WINDOWS["5m"]:
+            ring, width = self._fine, SLOT_SECONDS
+        else:
+            ring, width = self._coarse, COARSE_SLOT_SECONDS
+        oldest = int(now // width) - seconds // width
+
+        count, total, lo, hi, buckets = 0, 0.0, math.inf, -math.inf, {}
+        with self._lock:
+            for slot in ring:
+                if slot.id <= oldest:
+                    continue
+                count += slot.count
+                total += slot.sum
+                lo, hi = min(lo, slot.min), max(hi, slot.max)
+                for b, c in slot.buckets.items():
+                    buckets[b] = buckets.get(b, 0) + c
+        return count, total, lo, hi, buckets
+
+    def window(self, seconds: int) -> Dict[str, Any]:
+        count, total, lo, hi, buckets = self._merged(seconds)
+        data = {"count": count, "sum": round(total, 3), "mean": round(total / count, 3) if count else 0.0}
+        if not count:
+            data.update({"min": 0.0, "max": 0.0, **{_qname(q): 0.0 for q in QUANTILES}})
+            return data
+
+        data["min"], data["max"] = round(lo, 3), round(hi, 3)
+        ordered = sorted(buckets.items())
+        for q in QUANTILES:
+            rank, seen = q * (count - 1), 0
+            for b, c in ordered:
+                seen += c
+                if seen > rank:
+                    # La estimacion del bucket nunca sale del rango observado
+                    data[_qname(q)] = round(min(max(_bucket_value(b), lo), hi), 3)
+                    break
+        return data
+
+    def snapshot(self) -> Dict[str, Any]:
+        data = {"total": self.count, "total_sum": round(self.sum, 3)}
+        for name, seconds in WINDOWS.items():
+            data[name] = self.window(seconds)
+        return data
+
+
+def _qname(q: float) -> str:
+    return f"p{q * 100:g}"
+
+
+# ============================================
+# REGISTRO
+# ============================================
+def _key(name: str, labels: Dict[str, Any]) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _display(key) -> str:
+    name, labels = key
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+
+
+class _Timer:
+    """Mide la duracion del bloque en ms (sirve con `with` y `async with`)."""
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.record((time.perf_counter() - self.start) * 1000)
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, *exc):
+        return self.__exit__(*exc)
+
+
+class MetricsRegistry:
+    """Metricas de un proceso, indexadas por nombre + labels."""
+
+    def __init__(self, namespace: str = NAMESPACE):
+        self.namespace = namespace
+        self._counters: Dict[Any, Counter] = {}
+        self._histograms: Dict[Any, Histogram] = {}
+        self._gauges: Dict[Any, Callable[[], float]] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, **labels) -> Counter:
+        key = _key(name, labels)
+        metric = self._counters.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._counters.setdefault(key, Counter())
+        return metric
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        key = _key(name, labels)
+        metric = self._histograms.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._histograms.setdefault(key, Histogram())
+        return metric
+
+    def gauge(self, name: str, fn: Callable[[], float], **labels):
+        """Valor leido al exportar (profundidad de cola, pendientes, ...)."""
+        with self._lock:
+            self._gauges[_key(name, labels)] = fn
+
+    def timer(self, name: str, **labels) -> _Timer:
+        return _Timer(self.histogram(name, **labels))
+
+    def _gauge_values(self) -> Dict[Any, Optional[float]]:
+        values = {}
+        for key, fn in list(self._gauges.items()):
+            try:
+                values[key] = float(fn())
+            except Exception:
+                values[key] = None
+        return values
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "counters": {_display(k): c.snapshot() for k, c in list(self._counters.items())},
+            "histograms": {_display(k): h.snapshot() for k, h in list(self._histograms.items())},
+            "gauges": {_display(k): v for k, v in self._gauge_values().items()},
+        }
+
+    def render_prometheus(self) -> str:
+        """Formato de texto de Prometheus (summary por ventana con label window)."""
+        lines = []
+
+        def labels(pairs, **extra) -> str:
+            items = list(pairs) + list(extra.items())
+            if not items:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+        for name, group in _grouped(self._counters):
+            metric = f"{self.namespace}_{name}"
+            lines.append(f"# TYPE {metric} counter")
+            for pairs, counter in group:
+                lines.append(f"{metric}{labels(pairs)} {counter.value}")
+            lines.append(f"# TYPE {metric}_window gauge")
+            for pairs, counter in group:
+                for window, seconds in WINDOWS.items():
+                    lines.append(f"{metric}_window{labels(pairs, window=window)} {counter.window(seconds)}")
+
+        for name, group in _grouped(self._histograms):
+            metric = f"{self.namespace}_{name}"
+            lines.append(f"# TYPE {metric} summary")
+            for pairs, histogram in group:
+                for window, seconds in WINDOWS.items():
+                    stats = histogram.window(seconds)
+                    for q in QUANTILES:
+                        lines.append(f"{metric}{labels(pairs, window=window, quantile=f'{q:g}')} {stats[_qname(q)]}")
+                    lines.append(f"{metric}_sum{labels(pairs, window=window)} {stats['sum']}")
+                    lines.append(f"{metric}_count{labels(pairs, window=window)} {stats['count']}")
+
+        gauges = self._gauge_values()
+        for name, group in _grouped(gauges):
+            metric = f"{self.namespace}_{name}"
+            lines.append(f"# TYPE {metric} gauge")
+            for pairs, value in group:
+                if value is not None:
+                    lines.append(f"{metric}{labels(pairs)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _grouped(metrics: Dict[Any, Any]) -> List[Tuple[str, List[Tuple[Any, Any]]]]:
+    groups: Dict[str, List[Tuple[Any, Any]]] = {}
+    for (name, pairs), metric in list(metrics.items()):
+        groups.setdefault(name, []).append((pairs, metric))
+    return sorted(groups.items())
+
+
+REGISTRY = MetricsRegistry()
+
+
+# ============================================
+# EXPOSICIÓN
+# ============================================
+def install_fastapi(app, registry: MetricsRegistry = REGISTRY, path: str = "/metrics"):
+    """Middleware de latencia/conteo por ruta + endpoint GET /metrics (?format=json)."""
+    from fastapi.responses import PlainTextResponse, JSONResponse
+
+    @app.middleware("http")
+    async def _metrics_middleware(request, call_next):
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            # Ruta plantilla (/v1/orders/{order_id}), no la URL: cardinalidad acotada
+            route = getattr(request.scope.get("route"), "path", "unmatched")
+            registry.histogram("http_request_ms", route=route).record((time.perf_counter() - start) * 1000)
+            registry.counter("http_requests_total", route=route, status=f"{status // 100}xx").inc()
+
+    @app.get(path, include_in_schema=False)
+    async def _metrics(format: str = "prometheus"):
+        if format == "json":
+            return JSONResponse(registry.snapshot())
+        return PlainTextResponse(registry.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+async def serve_metrics(registry: MetricsRegistry = REGISTRY, host: str = "0.0.0.0", port: int = 8805):
+    """Servidor HTTP minimo (asyncio) con GET /metrics para servicios sin FastAPI."""
+    import asyncio
+
+    async def handle(reader, writer):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            target = request_line[1] if len(request_line) > 1 else "/"
+            if target.split("?")[0] != "/metrics":
+                status, body, ctype = "404 Not Found", b"not found\n", "text/plain"
+            elif "format=json" in target:
+                status, ctype = "200 OK", "application/json"
+                body = json.dumps(registry.snapshot()).encode("utf-8")
+            else:
+                status, ctype = "200 OK", "text/plain; version=0.0.4"
+                body = registry.render_prometheus().encode("utf-8")
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {ctype}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    async with server:
+        await server.serve_forever()
@@ -15,8 +15,18 @@ Pipeline:
 API Endpoints:
   POST /pipeline/start        - Inicia pipeline
   GET  /pipeline/status/{id}  - Estado del job
-  GET  /pipeline/jobs         - Lista jobs
+  GET  /pipeline/jobs         - Lista jobs (?status=, ?limit=, ?offset=)
   POST /pipeline/retry/{id}   - Reintentar job fallido
+  GET  /pipeline/queue        - Estado de la cola y capacidad
+  GET  /metrics               - Latencias por etapa y ruta (Prometheus; ?format=json)
+
+Ejecución:
+  Los jobs entran a una cola persistente (SQLite) y los procesa un pool
+  de workers. Cada etapa guarda un checkpoint: un reinicio retoma el job
+  desde la última etapa completada. Con la cola llena, /pipeline/start
+  responde 429. Los jobs viven en el JobStore compartido (SQLite WAL,
+  namespace "pipeline"); los terminados se purgan tras
+  ODI_JOB_RETENTION_DAYS.
 
 Uso:
     uvicorn odi_pipeline_service:app --host 0.0.0.0 --port 8804
@@ -26,20 +36,38 @@ import sys
 import json
 import asyncio
 import logging
+import sqlite3
+import threading
+import hashlib
+import time
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Dict, Any, Optional, List
 from enum import Enum
 import base64
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
-import httpx
 
 # OpenAI for Vision
-from openai import OpenAI
+from openai import AsyncOpenAI
+
+try:
+    from .odi_shopify_sync import ShopifySyncEngine
+except ImportError:
+    from odi_shopify_sync import ShopifySyncEngine
+
+try:
+    from .odi_metrics import REGISTRY as METRICS, install_fastapi
+except ImportError:
+    from odi_metrics import REGISTRY as METRICS, install_fastapi
+
+try:
+    from .odi_job_store import JobStore, JOB_RETENTION_DAYS
+except ImportError:
+    from odi_job_store import JobStore, JOB_RETENTION_DAYS
 
 load_dotenv("/opt/odi/.env")
 
@@ -89,15 +117,35 @@ SHOPIFY_STORES = {
     },
 }
 
-JOBS_PATH = Path("/opt/odi/data/pipeline_jobs")
-JOBS_PATH.mkdir(parents=True, exist_ok=True)
+JOBS_PATH = Path("/opt/odi/data/pipeline_jobs")   # JSON por job (legado, se importa al JobStore)
+JOBS_NAMESPACE = "pipeline"
+PRUNE_INTERVAL_SECONDS = 6 * 3600
+
+# Cola persistente y pool de workers
+QUEUE_DB = Path(os.getenv("PIPELINE_QUEUE_DB", "/opt/odi/data/pipeline_queue.db"))
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "2"))
+MAX_QUEUE_DEPTH = int(os.getenv("PIPELINE_MAX_QUEUE", "50"))  # queued + running
+QUEUE_POLL_SECONDS = 2.0
+
+# Máximo de jobs simultáneos por etapa (las demás etapas no tienen límite)
+STAGE_LIMITS = {
+    "extracting": int(os.getenv("PIPELINE_EXTRACT_CONCURRENCY", "1")),
+    "enriching": int(os.getenv("PIPELINE_ENRICH_CONCURRENCY", "2")),
+    "uploading": int(os.getenv("PIPELINE_UPLOAD_CONCURRENCY", "1")),
+}
+
+# Enriquecimiento por lotes
+ENRICH_BATCH_SIZE = int(os.getenv("ENRICH_BATCH_SIZE", "20"))      # Productos por request
+ENRICH_CONCURRENCY = int(os.getenv("ENRICH_CONCURRENCY", "4"))     # Requests en vuelo
+ENRICH_RPM = int(os.getenv("ENRICH_RPM", "300"))                   # Límite compartido req/min
+ENRICH_CACHE_DB = Path(os.getenv("ENRICH_CACHE_DB", "/opt/odi/data/enrich_cache.db"))
 
 # Logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 log = logging.getLogger(__name__)
 
 # OpenAI Client
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+async_openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 
 # ============================================
@@ -114,6 +162,16 @@ class PipelineStage(Enum):
     FAILED = "failed"
 
 
+# Etapas con checkpoint, en orden de ejecución
+STAGE_ORDER = [
+    PipelineStage.EXTRACTING.value,
+    PipelineStage.NORMALIZING.value,
+    PipelineStage.ENRICHING.value,
+    PipelineStage.FITTING.value,
+    PipelineStage.UPLOADING.value,
+]
+
+
 class PipelineRequest(BaseModel):
     job_id: str
     empresa: str
@@ -180,42 +238,47 @@ Reglas:
 
 Responde SOLO con el JSON, sin explicaciones."""
 
+    RENDER_DPI = 150
+
     async def extract_from_pdf(self, pdf_path: str) -> List[Dict[str, Any]]:
-        """Extrae productos de un PDF."""
+        """
+        Extrae productos de un PDF, página por página.
+
+        Cada página se rasteriza como máximo una vez y solo si no tiene
+        texto suficiente; la caché de pdfplumber se libera tras cada página,
+        así la memoria no crece con el tamaño del catálogo.
+        """
         import pdfplumber
 
         all_products = []
 
         try:
             with pdfplumber.open(pdf_path) as pdf:
-                for i, page in enumerate(pdf.pages[:50]):  # Máximo 50 páginas
-                    log.info(f"  Extracting page {i+1}/{len(pdf.pages)}")
-
-                    # Convertir página a imagen
-                    img = page.to_image(resolution=150)
-                    img_bytes = img.original.tobytes()
-
-                    # También extraer texto directo
-                    text = page.extract_text() or ""
-
-                    # Si hay mucho texto, usar OCR simple
-                    if len(text) > 100:
-                        products = self._extract_from_text(text)
-                        all_products.extend(products)
-                    else:
-                        # Usar Vision API para páginas con imágenes
-                        products = await self._extract_with_vision(pdf_path, i)
+                total = len(pdf.pages)
+                for i, page in enumerate(pdf.pages):
+                    log.info(f"  Extracting page {i+1}/{total}")
+                    try:
+                        # Texto directo primero (sin rasterizar)
+                        text = page.extract_text() or ""
+
+                        if len(text) > 100:
+                            products = await self._extract_from_text(text)
+                        else:
+                            # Usar Vision API para páginas con imágenes
+                            products = await self._extract_with_vision(page, i)
                         all_products.extend(products)
+                    finally:
+                        page.flush_cache()
 
         except Exception as e:
             log.error(f"PDF extraction error: {e}")
 
         return all_products
 
-    def _extract_from_text(self, text: str) -> List[Dict[str, Any]]:
+    async def _extract_from_text(self, text: str) -> List[Dict[str, Any]]:
         """Extrae productos de texto usando LLM."""
         try:
-            response = openai_client.chat.completions.create(
+            response = await async_openai_client.chat.completions.create(
                 model="gpt-4o-mini",
                 messages=[
                     {"role": "system", "content": self.EXTRACTION_PROMPT},
@@ -232,22 +295,26 @@ Responde SOLO con el JSON, sin explicaciones."""
             log.error(f"Text extraction error: {e}")
             return []
 
-    async def _extract_with_vision(self, pdf_path: str, page_num: int) -> List[Dict[str, Any]]:
-        """Extrae productos usando Vision API."""
-        try:
-            import pdf2image
+    def _render_page_png(self, page) -> bytes:
+        """Rasteriza la página una sola vez (mismo renderer que el texto) y la codifica a PNG."""
+        import io
 
-            images = pdf2image.convert_from_path(pdf_path, first_page=page_num+1, last_page=page_num+1, dpi=150)
-            if not images:
-                return []
+        image = page.to_image(resolution=self.RENDER_DPI).original
+        buffer = io.BytesIO()
+        try:
+            image.save(buffer, format="PNG")
+        finally:
+            image.close()
+        return buffer.getvalue()
 
-            # Convertir a base64
-            import io
-            buffer = io.BytesIO()
-            images[0].save(buffer, format="PNG")
-            img_base64 = base64.b64encode(buffer.getvalue()).decode()
+    async def _extract_with_vision(self, page, page_num: int) -> List[Dict[str, Any]]:
+        """Extrae productos usando Vision API."""
+        try:
+            png = await asyncio.to_thread(self._render_page_png, page)
+            img_base64 = base64.b64encode(png).decode()
+            del png
 
-            response = openai_client.chat.completions.create(
+            response = await async_openai_client.chat.completions.create(
                 model="gpt-4o-mini",
                 messages=[
                     {"role": "system", "content": self.EXTRACTION_PROMPT},
@@ -274,7 +341,7 @@ Responde SOLO con el JSON, sin explicaciones."""
             return result.get("products", [])
 
         except Exception as e:
-            log.error(f"Vision extraction error: {e}")
+            log.error(f"Vision extraction error (page {page_num + 1}): {e}")
             return []
 
 
@@ -353,8 +420,68 @@ class ProductNormalizer:
 # ============================================
 # ENRIQUECEDOR
 # ============================================
+class AsyncRateLimiter:
+    """Token bucket compartido: como máximo `rate` requests por minuto."""
+
+    def __init__(self, rate_per_minute: int):
+        self.interval = 60.0 / max(rate_per_minute, 1)
+        self._next_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_at - now
+            self._next_at = max(now, self._next_at) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class EnrichmentCache:
+    """Descripciones generadas, indexadas por hash del contenido del producto."""
+
+    def __init__(self, db_path: Path = ENRICH_CACHE_DB):
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS enrichments (key TEXT PRIMARY KEY, description TEXT, created_at TEXT)"
+        )
+        self._conn.commit()
+
+    def get_many(self, keys: List[str]) -> Dict[str, str]:
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                found.update(self._conn.execute(
+                    f"SELECT key, description FROM enrichments WHERE key IN ({placeholders})", batch
+                ).fetchall())
+        return found
+
+    def put_many(self, items: Dict[str, str]):
+        if not items:
+            return
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO enrichments (key, description, created_at) VALUES (?, ?, ?)",
+                [(k, v, now) for k, v in items.items()]
+            )
+            self._conn.commit()
+
+
 class ProductEnricher:
-    """Enriquece productos con descripciones SEO."""
+    """
+    Enriquece productos con descripciones SEO.
+
+    Empaqueta ENRICH_BATCH_SIZE productos por request (salida JSON
+    estructurada), corre ENRICH_CONCURRENCY lotes en paralelo bajo un
+    rate limiter compartido y cachea por hash de contenido. Los productos
+    que un lote no devuelve se reintentan uno a uno.
+    """
 
     ENRICH_PROMPT = """Genera una descripción SEO para este producto de repuestos de motos:
 
@@ -372,94 +499,146 @@ La descripción debe:
 
 Responde SOLO con la descripción, sin comillas ni formato especial."""
 
+    BATCH_PROMPT = """Genera una descripción SEO para CADA producto de repuestos de motos de la lista.
+
+Cada descripción debe:
+- Tener 2-3 oraciones
+- Mencionar beneficios para el usuario
+- Incluir palabras clave relevantes para SEO
+- Ser en español colombiano
+- NO incluir precios
+- NO inventar especificaciones técnicas
+
+Responde SOLO con JSON:
+{"items": [{"id": "<id del producto>", "description": "<descripción>"}]}"""
+
+    def __init__(self):
+        self.rate_limiter = AsyncRateLimiter(ENRICH_RPM)
+        self.slots = asyncio.Semaphore(ENRICH_CONCURRENCY)
+        self.cache = EnrichmentCache()
+
+    @staticmethod
+    def _content_key(p: Dict[str, Any]) -> str:
+        content = json.dumps(
+            [p.get("title", ""), p.get("category", "general"), p.get("brand", "")],
+            ensure_ascii=False
+        )
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
     async def enrich(self, products: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Enriquece productos con descripciones."""
-        enriched = []
+        todo = [p for p in products if not p.get("description")]
+        if not todo:
+            return products
+
+        keys = {id(p): self._content_key(p) for p in todo}
+        cached = await asyncio.to_thread(self.cache.get_many, list(set(keys.values())))
+
+        # Productos idénticos comparten una sola generación
+        pending: Dict[str, Dict[str, Any]] = {}
+        for p in todo:
+            key = keys[id(p)]
+            if key not in cached:
+                pending.setdefault(key, p)
+
+        log.info(f"Enriching {len(todo)} products: {len(todo) - len(pending)} cached, {len(pending)} to generate")
+
+        items = list(pending.items())
+        batches = [items[i:i + ENRICH_BATCH_SIZE] for i in range(0, len(items), ENRICH_BATCH_SIZE)]
+        results = await asyncio.gather(*(self._enrich_batch(batch) for batch in batches))
+
+        generated: Dict[str, str] = {}
+        for batch_result in results:
+            generated.update(batch_result)
+        await asyncio.to_thread(self.cache.put_many, generated)
+
+        descriptions = {**cached, **generated}
+        for p in todo:
+            p["description"] = descriptions.get(keys[id(p)]) or \
+                f"Repuesto de calidad para motos. {p.get('category', '')}."
+
+        return products
+
+    async def _enrich_batch(self, batch: List[tuple]) -> Dict[str, str]:
+        """Un request para todo el lote; lo que falte se reintenta individualmente."""
+        found: Dict[str, str] = {}
+        # Ids posicionales cortos ("0".."N-1"): el modelo los repite sin errores
+        keys = {str(i): key for i, (key, _) in enumerate(batch)}
+        payload = [
+            {"id": str(i), "title": p.get("title", ""), "category": p.get("category", "general"),
+             "brand": p.get("brand", "")}
+            for i, (_, p) in enumerate(batch)
+        ]
 
-        for p in products:
-            if not p.get("description"):
-                try:
-                    response = openai_client.chat.completions.create(
-                        model="gpt-4o-mini",
-                        messages=[
-                            {
-                                "role": "user",
-                                "content": self.ENRICH_PROMPT.format(
-                                    title=p.get("title", ""),
-                                    category=p.get("category", "general"),
-                                    brand=p.get("brand", "")
-                                )
-                            }
-                        ],
-                        temperature=0.7,
-                        max_tokens=200
-                    )
-                    p["description"] = response.choices[0].message.content.strip()
-                except Exception as e:
-                    log.error(f"Enrichment error: {e}")
-                    p["description"] = f"Repuesto de calidad para motos. {p.get('category', '')}."
-
-            enriched.append(p)
-
-        return enriched
+        try:
+            async with self.slots:
+                await self.rate_limiter.acquire()
+                response = await async_openai_client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=[
+                        {"role": "system", "content": self.BATCH_PROMPT},
+                        {"role": "user", "content": json.dumps({"products": payload}, ensure_ascii=False)}
+                    ],
+                    temperature=0.7,
+                    max_tokens=200 * len(batch) + 100,
+                    response_format={"type": "json_object"}
+                )
+            result = json.loads(response.choices[0].message.content)
+            for item in result.get("items", []):
+                key = keys.get(str(item.get("id", "")).strip())
+                description = (item.get("description") or "").strip()
+                if key and description:
+                    found[key] = description
+        except Exception as e:
+            log.error(f"Batch enrichment error ({len(batch)} products): {e}")
+
+        missing = [(key, p) for key, p in batch if key not in found]
+        if missing:
+            singles = await asyncio.gather(*(self._enrich_one(p) for _, p in missing))
+            for (key, _), description in zip(missing, singles):
+                if description:
+                    found[key] = description
+
+        return found
+
+    async def _enrich_one(self, p: Dict[str, Any]) -> Optional[str]:
+        try:
+            async with self.slots:
+                await self.rate_limiter.acquire()
+                response = await async_openai_client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": self.ENRICH_PROMPT.format(
+                                title=p.get("title", ""),
+                                category=p.get("category", "general"),
+                                brand=p.get("brand", "")
+                            )
+                        }
+                    ],
+                    temperature=0.7,
+                    max_tokens=200
+                )
+            return response.choices[0].message.content.strip()
+        except Exception as e:
+            log.error(f"Enrichment error: {e}")
+            return None
 
 
 # ============================================
 # SHOPIFY UPLOADER
 # ============================================
 class ShopifyUploader:
-    """Sube productos a Shopify."""
+    """Sube productos a Shopify vía el motor de sync (concurrente, diff-only)."""
 
     def __init__(self, shop: str, token: str):
         self.shop = shop
-        self.token = token
-        self.base_url = f"https://{shop}/admin/api/2024-01"
-        self.headers = {
-            "X-Shopify-Access-Token": token,
-            "Content-Type": "application/json"
-        }
-
-    async def upload_products(self, products: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Sube productos a Shopify."""
-        results = {"created": 0, "updated": 0, "errors": []}
-
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            for p in products:
-                try:
-                    # Verificar si existe
-                    existing = await self._find_by_sku(client, p.get("sku"))
-
-                    if existing:
-                        # Actualizar
-                        await self._update_product(client, existing["id"], p)
-                        results["updated"] += 1
-                    else:
-                        # Crear
-                        await self._create_product(client, p)
-                        results["created"] += 1
-
-                except Exception as e:
-                    results["errors"].append(f"{p.get('sku')}: {str(e)}")
-                    log.error(f"Shopify upload error: {e}")
-
-        return results
+        self.engine = ShopifySyncEngine(shop, token)
 
-    async def _find_by_sku(self, client: httpx.AsyncClient, sku: str) -> Optional[Dict]:
-        """Busca producto por SKU."""
-        try:
-            response = await client.get(
-                f"{self.base_url}/products.json",
-                headers=self.headers,
-                params={"fields": "id,variants", "limit": 1}
-            )
-            # Simplificado - en producción buscar por SKU real
-            return None
-        except:
-            return None
-
-    async def _create_product(self, client: httpx.AsyncClient, product: Dict[str, Any]):
-        """Crea producto en Shopify."""
-        shopify_product = {
+    @staticmethod
+    def _to_shopify(product: Dict[str, Any]) -> Dict[str, Any]:
+        return {
             "product": {
                 "title": product.get("title"),
                 "body_html": product.get("description", ""),
@@ -476,34 +655,170 @@ class ShopifyUploader:
             }
         }
 
-        response = await client.post(
-            f"{self.base_url}/products.json",
-            headers=self.headers,
-            json=shopify_product
-        )
+    async def upload_products(self, products: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Sube productos a Shopify."""
+        # Un refresco incremental por lote; luego cada decisión es un lookup local
+        try:
+            await asyncio.to_thread(self.engine.index.refresh_if_stale)
+        except Exception as e:
+            log.warning(f"SKU index refresh failed, using cached index: {e}")
 
-        if response.status_code not in [200, 201]:
-            raise Exception(f"Shopify error: {response.status_code} - {response.text}")
+        payloads = [self._to_shopify(p) for p in products]
+        results = await asyncio.to_thread(self.engine.sync, payloads, False)
+        for error in results["errors"]:
+            log.error(f"Shopify upload error: {error}")
+        return results
 
-        return response.json()
 
-    async def _update_product(self, client: httpx.AsyncClient, product_id: int, product: Dict[str, Any]):
-        """Actualiza producto existente."""
-        shopify_product = {
-            "product": {
-                "id": product_id,
-                "title": product.get("title"),
-                "body_html": product.get("description", ""),
-            }
+# ============================================
+# COLA PERSISTENTE
+# ============================================
+class QueueFullError(Exception):
+    """La cola alcanzó MAX_QUEUE_DEPTH."""
+
+
+class PipelineQueue:
+    """
+    Cola de jobs en SQLite (WAL).
+
+    Estados: queued → running → done | failed. Cada etapa completada
+    guarda un checkpoint (etapa + productos) para reanudar tras un reinicio.
+    """
+
+    def __init__(self, db_path: Path = QUEUE_DB, max_depth: int = MAX_QUEUE_DEPTH):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_depth = max_depth
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS queue (
+                job_id TEXT PRIMARY KEY,
+                request TEXT NOT NULL,
+                state TEXT NOT NULL,
+                stage TEXT,
+                checkpoint TEXT,
+                attempts INTEGER DEFAULT 0,
+                enqueued_at TEXT,
+                updated_at TEXT
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_queue_state ON queue(state, enqueued_at)")
+
+    def enqueue(self, request: PipelineRequest):
+        """Admite un job nuevo; QueueFullError si no hay capacidad, ValueError si ya está activo."""
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT state FROM queue WHERE job_id = ?", (request.job_id,)).fetchone()
+                if row and row[0] in ("queued", "running"):
+                    raise ValueError(f"Job {request.job_id} already {row[0]}")
+                if self._active_count() >= self.max_depth:
+                    raise QueueFullError(f"Queue full ({self.max_depth} jobs)")
+                self._conn.execute(
+                    """INSERT OR REPLACE INTO queue
+                       (job_id, request, state, stage, checkpoint, attempts, enqueued_at, updated_at)
+                       VALUES (?, ?, 'queued', NULL, NULL, 0, ?, ?)""",
+                    (request.job_id, request.model_dump_json(), now, now)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def retry(self, job_id: str) -> bool:
+        """Reencola un job fallido conservando su checkpoint."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE queue SET state = 'queued', updated_at = ? WHERE job_id = ? AND state = 'failed'",
+                (datetime.now().isoformat(), job_id)
+            )
+            return cursor.rowcount > 0
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """Toma atómicamente el job más antiguo en cola."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    """SELECT job_id, request, stage, checkpoint FROM queue
+                       WHERE state = 'queued' ORDER BY enqueued_at LIMIT 1"""
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE queue SET state = 'running', attempts = attempts + 1, updated_at = ? WHERE job_id = ?",
+                    (datetime.now().isoformat(), row[0])
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        job_id, request, stage, checkpoint = row
+        return {
+            "request": PipelineRequest(**json.loads(request)),
+            "stage": stage,
+            "products": json.loads(checkpoint) if checkpoint else [],
         }
 
-        response = await client.put(
-            f"{self.base_url}/products/{product_id}.json",
-            headers=self.headers,
-            json=shopify_product
-        )
+    def checkpoint(self, job_id: str, stage: str, products: List[Dict[str, Any]]):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE queue SET stage = ?, checkpoint = ?, updated_at = ? WHERE job_id = ?",
+                (stage, json.dumps(products, default=str), datetime.now().isoformat(), job_id)
+            )
+
+    def finish(self, job_id: str, state: str):
+        # Checkpoint solo se conserva para reintentos de jobs fallidos
+        with self._lock:
+            self._conn.execute(
+                """UPDATE queue SET state = ?, updated_at = ?,
+                   checkpoint = CASE WHEN ? = 'failed' THEN checkpoint ELSE NULL END
+                   WHERE job_id = ?""",
+                (state, datetime.now().isoformat(), state, job_id)
+            )
 
-        return response.json()
+    def requeue_interrupted(self) -> int:
+        """Jobs que quedaron 'running' al caer el proceso vuelven a la cola."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE queue SET state = 'queued', updated_at = ? WHERE state = 'running'",
+                (datetime.now().isoformat(),)
+            )
+            return cursor.rowcount
+
+    def prune(self, days: int = JOB_RETENTION_DAYS) -> int:
+        """Borra entradas done/failed sin actividad en los últimos `days` días."""
+        cutoff = (datetime.now() - timedelta(days=days)).isoformat()
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM queue WHERE state IN ('done', 'failed') AND updated_at < ?", (cutoff,)
+            )
+            return cursor.rowcount
+
+    def _active_count(self) -> int:
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM queue WHERE state IN ('queued', 'running')"
+        ).fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM queue GROUP BY state").fetchall()
+        counts = dict(rows)
+        active = counts.get("queued", 0) + counts.get("running", 0)
+        return {
+            "queued": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "done": counts.get("done", 0),
+            "failed": counts.get("failed", 0),
+            "capacity": self.max_depth,
+            "available": max(self.max_depth - active, 0),
+        }
 
 
 # ============================================
@@ -512,73 +827,116 @@ class ShopifyUploader:
 class PipelineExecutor:
     """Ejecuta el pipeline completo."""
 
-    def __init__(self):
+    def __init__(self, queue: Optional[PipelineQueue] = None, store: Optional[JobStore] = None):
         self.extractor = VisionExtractor()
         self.normalizer = ProductNormalizer()
         self.enricher = ProductEnricher()
-        self.jobs: Dict[str, PipelineJob] = {}
+        self.queue = queue
+        self.store = store or JobStore()
+        self.stage_slots = {stage: asyncio.Semaphore(limit) for stage, limit in STAGE_LIMITS.items()}
+        if JOBS_PATH.exists():
+            imported = self.store.import_json_dir(JOBS_NAMESPACE, JOBS_PATH, status_field="stage")
+            if imported:
+                log.info(f"Imported {imported} job(s) from {JOBS_PATH}")
 
     def _load_job(self, job_id: str) -> Optional[PipelineJob]:
-        job_file = JOBS_PATH / f"{job_id}.json"
-        if job_file.exists():
-            with open(job_file) as f:
-                return PipelineJob(**json.load(f))
-        return self.jobs.get(job_id)
+        data = self.store.get(JOBS_NAMESPACE, job_id)
+        return PipelineJob(**data) if data else None
 
     def _save_job(self, job: PipelineJob):
-        self.jobs[job.job_id] = job
-        job_file = JOBS_PATH / f"{job.job_id}.json"
-        with open(job_file, "w") as f:
-            json.dump(job.model_dump(), f, indent=2, default=str)
-
-    async def execute(self, request: PipelineRequest) -> PipelineJob:
-        """Ejecuta el pipeline completo."""
-        job = PipelineJob(
-            job_id=request.job_id,
-            empresa=request.empresa,
-            shop_key=request.shop_key,
-            source_file=request.source_file,
-            images_folder=request.images_folder,
-            created_at=datetime.now().isoformat(),
-            updated_at=datetime.now().isoformat()
-        )
+        self.store.save(JOBS_NAMESPACE, job.job_id, job.stage, job.model_dump(), job.created_at)
+
+    def _set_stage(self, job: PipelineJob, stage: PipelineStage):
+        """Transición de etapa: actualiza solo stage/updated_at (sin reescribir productos)."""
+        job.stage = stage.value
+        job.updated_at = datetime.now().isoformat()
+        self.store.transition(JOBS_NAMESPACE, job.job_id, job.stage, status_field="stage")
+
+    def _stage_slot(self, stage: str):
+        slot = self.stage_slots.get(stage)
+        return slot if slot is not None else _NoLimit()
+
+    def _checkpoint(self, job: PipelineJob, stage: str, products: List[Dict[str, Any]]):
+        if self.queue:
+            self.queue.checkpoint(job.job_id, stage, products)
+
+    async def execute(
+        self,
+        request: PipelineRequest,
+        resume_stage: Optional[str] = None,
+        resume_products: Optional[List[Dict[str, Any]]] = None
+    ) -> PipelineJob:
+        """
+        Ejecuta el pipeline completo.
+
+        Con resume_stage, salta las etapas ya completadas y continúa con
+        los productos del checkpoint.
+        """
+        job = self._load_job(request.job_id) if resume_stage else None
+        if job is None:
+            job = PipelineJob(
+                job_id=request.job_id,
+                empresa=request.empresa,
+                shop_key=request.shop_key,
+                source_file=request.source_file,
+                images_folder=request.images_folder,
+                created_at=datetime.now().isoformat(),
+                updated_at=datetime.now().isoformat()
+            )
 
         self._save_job(job)
 
-        try:
-            # 1. EXTRAER
-            log.info(f"[{job.job_id}] Stage 1: EXTRACTING")
-            job.stage = PipelineStage.EXTRACTING.value
-            self._save_job(job)
+        done = STAGE_ORDER.index(resume_stage) if resume_stage in STAGE_ORDER else -1
+        products = list(resume_products or [])
+        if resume_stage:
+            log.info(f"[{job.job_id}] Resuming after stage {resume_stage}")
 
-            products = await self.extractor.extract_from_pdf(request.source_file)
-            log.info(f"[{job.job_id}] Extracted {len(products)} products")
+        def pending(stage: PipelineStage) -> bool:
+            return STAGE_ORDER.index(stage.value) > done
 
-            if not products:
-                job.stage = PipelineStage.FAILED.value
-                job.errors.append("No products extracted")
-                self._save_job(job)
-                return job
+        try:
+            # 1. EXTRAER
+            if pending(PipelineStage.EXTRACTING):
+                log.info(f"[{job.job_id}] Stage 1: EXTRACTING")
+                self._set_stage(job, PipelineStage.EXTRACTING)
+
+                async with self._stage_slot(job.stage):
+                    with METRICS.timer("pipeline_stage_ms", stage=job.stage):
+                        products = await self.extractor.extract_from_pdf(request.source_file)
+                log.info(f"[{job.job_id}] Extracted {len(products)} products")
+
+                if not products:
+                    job.stage = PipelineStage.FAILED.value
+                    job.errors.append("No products extracted")
+                    self._save_job(job)
+                    return job
+                self._checkpoint(job, PipelineStage.EXTRACTING.value, products)
 
             # 2. NORMALIZAR
-            log.info(f"[{job.job_id}] Stage 2: NORMALIZING")
-            job.stage = PipelineStage.NORMALIZING.value
-            self._save_job(job)
+            if pending(PipelineStage.NORMALIZING):
+                log.info(f"[{job.job_id}] Stage 2: NORMALIZING")
+                self._set_stage(job, PipelineStage.NORMALIZING)
 
-            products = self.normalizer.normalize(products, request.empresa)
+                with METRICS.timer("pipeline_stage_ms", stage=job.stage):
+                    products = await asyncio.to_thread(self.normalizer.normalize, products, request.empresa)
+                self._checkpoint(job, PipelineStage.NORMALIZING.value, products)
 
             # 3. ENRIQUECER
-            log.info(f"[{job.job_id}] Stage 3: ENRICHING")
-            job.stage = PipelineStage.ENRICHING.value
-            self._save_job(job)
+            if pending(PipelineStage.ENRICHING):
+                log.info(f"[{job.job_id}] Stage 3: ENRICHING")
+                self._set_stage(job, PipelineStage.ENRICHING)
 
-            products = await self.enricher.enrich(products)
+                async with self._stage_slot(job.stage):
+                    with METRICS.timer("pipeline_stage_ms", stage=job.stage):
+                        products = await self.enricher.enrich(products)
+                self._checkpoint(job, PipelineStage.ENRICHING.value, products)
 
             # 4. FITMENT (simplificado por ahora)
-            log.info(f"[{job.job_id}] Stage 4: FITTING")
-            job.stage = PipelineStage.FITTING.value
-            self._save_job(job)
-            # TODO: Integrar con M6.2 Fitment
+            if pending(PipelineStage.FITTING):
+                log.info(f"[{job.job_id}] Stage 4: FITTING")
+                self._set_stage(job, PipelineStage.FITTING)
+                # TODO: Integrar con M6.2 Fitment
+                self._checkpoint(job, PipelineStage.FITTING.value, products)
 
             job.products = products
             job.products_count = len(products)
@@ -586,13 +944,14 @@ class PipelineExecutor:
             # 5. SHOPIFY
             if request.shop_key and request.shop_key in SHOPIFY_STORES:
                 log.info(f"[{job.job_id}] Stage 5: UPLOADING to {request.shop_key}")
-                job.stage = PipelineStage.UPLOADING.value
-                self._save_job(job)
+                self._set_stage(job, PipelineStage.UPLOADING)
 
                 store = SHOPIFY_STORES[request.shop_key]
                 if store.get("shop") and store.get("token"):
                     uploader = ShopifyUploader(store["shop"], store["token"])
-                    result = await uploader.upload_products(products)
+                    async with self._stage_slot(job.stage):
+                        with METRICS.timer("pipeline_stage_ms", stage=job.stage):
+                            result = await uploader.upload_products(products)
                     job.uploaded_count = result["created"] + result["updated"]
                     job.errors.extend(result.get("errors", []))
                 else:
@@ -606,6 +965,7 @@ class PipelineExecutor:
             job.updated_at = datetime.now().isoformat()
             self._save_job(job)
 
+            METRICS.counter("pipeline_products_total").inc(job.products_count)
             log.info(f"[{job.job_id}] Pipeline COMPLETED: {job.products_count} products, {job.uploaded_count} uploaded")
 
         except Exception as e:
@@ -618,6 +978,70 @@ class PipelineExecutor:
         return job
 
 
+class _NoLimit:
+    """Contexto async vacío para etapas sin límite de concurrencia."""
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+# ============================================
+# WORKER POOL
+# ============================================
+class PipelineWorkerPool:
+    """N workers async que consumen la cola persistente."""
+
+    def __init__(self, queue: PipelineQueue, executor: PipelineExecutor, workers: int = PIPELINE_WORKERS):
+        self.queue = queue
+        self.executor = executor
+        self.workers = workers
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        resumed = self.queue.requeue_interrupted()
+        if resumed:
+            log.info(f"Requeued {resumed} interrupted job(s)")
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        log.info(f"Pipeline worker pool started ({self.workers} workers)")
+
+    async def stop(self):
+        # Los jobs en curso quedan 'running' y se reanudan desde su checkpoint al arrancar
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        self._wakeup.set()
+
+    async def _worker(self, worker_id: int):
+        while True:
+            item = await asyncio.to_thread(self.queue.claim)
+            if item is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=QUEUE_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            request = item["request"]
+            log.info(f"[worker {worker_id}] Running job {request.job_id}")
+            try:
+                with METRICS.timer("pipeline_job_ms"):
+                    job = await self.executor.execute(request, item["stage"], item["products"])
+                state = "failed" if job.stage == PipelineStage.FAILED.value else "done"
+            except Exception as e:
+                log.error(f"[worker {worker_id}] Job {request.job_id} crashed: {e}")
+                state = "failed"
+            METRICS.counter("pipeline_jobs_total", state=state).inc()
+            await asyncio.to_thread(self.queue.finish, request.job_id, state)
+
+
 # ============================================
 # FASTAPI APP
 # ============================================
@@ -634,7 +1058,39 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-executor = PipelineExecutor()
+install_fastapi(app)
+
+queue = PipelineQueue()
+executor = PipelineExecutor(queue)
+workers = PipelineWorkerPool(queue, executor)
+
+# Profundidad de cola: se lee al exportar /metrics
+METRICS.gauge("pipeline_queue_depth", lambda: queue.stats()["queued"], state="queued")
+METRICS.gauge("pipeline_queue_depth", lambda: queue.stats()["running"], state="running")
+
+
+@app.on_event("startup")
+async def start_workers():
+    workers.start()
+    asyncio.create_task(prune_jobs())
+
+
+async def prune_jobs():
+    """Retención: purga jobs terminados y entradas viejas de la cola."""
+    while True:
+        try:
+            jobs = await asyncio.to_thread(executor.store.prune, JOBS_NAMESPACE)
+            entries = await asyncio.to_thread(queue.prune)
+            if jobs or entries:
+                log.info(f"Pruned {jobs} job(s) and {entries} queue entr(ies) older than {JOB_RETENTION_DAYS} days")
+        except Exception as e:
+            log.error(f"Error pruning jobs: {e}")
+        await asyncio.sleep(PRUNE_INTERVAL_SECONDS)
+
+
+@app.on_event("shutdown")
+async def stop_workers():
+    await workers.stop()
 
 
 @app.get("/health")
@@ -643,29 +1099,53 @@ async def health():
 
 
 @app.post("/pipeline/start")
-async def start_pipeline(request: PipelineRequest, background_tasks: BackgroundTasks):
-    """Inicia el pipeline de forma asíncrona."""
-    background_tasks.add_task(executor.execute, request)
-    return {"job_id": request.job_id, "status": "started", "message": "Pipeline started in background"}
+async def start_pipeline(request: PipelineRequest):
+    """Encola el pipeline; lo ejecuta el pool de workers."""
+    try:
+        queue.enqueue(request)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "60"})
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    workers.notify()
+    return {
+        "job_id": request.job_id,
+        "status": "queued",
+        "message": "Pipeline queued",
+        "queue": queue.stats()
+    }
+
+
+@app.post("/pipeline/retry/{job_id}")
+async def retry_pipeline(job_id: str):
+    """Reintenta un job fallido desde su última etapa completada."""
+    if not queue.retry(job_id):
+        raise HTTPException(status_code=404, detail="No failed job with that id")
+    workers.notify()
+    return {"job_id": job_id, "status": "queued"}
+
+
+@app.get("/pipeline/queue")
+async def queue_status():
+    """Profundidad de la cola, capacidad y límites por etapa."""
+    return {**queue.stats(), "workers": PIPELINE_WORKERS, "stage_limits": STAGE_LIMITS}
 
 
 @app.get("/pipeline/status/{job_id}")
 async def get_status(job_id: str):
     """Obtiene estado de un job."""
-    job = executor._load_job(job_id)
+    job = executor.store.get(JOBS_NAMESPACE, job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
-    return job.model_dump()
+    return job
 
 
 @app.get("/pipeline/jobs")
-async def list_jobs(limit: int = 20):
-    """Lista jobs recientes."""
-    jobs = []
-    for job_file in sorted(JOBS_PATH.glob("*.json"), reverse=True)[:limit]:
-        with open(job_file) as f:
-            jobs.append(json.load(f))
-    return {"jobs": jobs, "count": len(jobs)}
+async def list_jobs(limit: int = 20, status: Optional[str] = None, offset: int = 0):
+    """Lista jobs recientes (más nuevos primero) y el conteo por etapa."""
+    jobs = executor.store.list(JOBS_NAMESPACE, status=status, limit=limit, offset=offset)
+    return {"jobs": jobs, "count": len(jobs), "totals": executor.store.counts(JOBS_NAMESPACE)}
 
 
 @app.get("/stores")
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+ODI Shopify Bulk v1.0
+=====================
+Operaciones masivas vía GraphQL Bulk Operations para exportar, crear y
+eliminar catálogos completos sin miles de llamadas REST con throttling.
+
+- Consultas: bulkOperationRunQuery → polling → JSONL descargado y parseado
+  en streaming (un producto a la vez, mismo formato que la REST API).
+- Mutaciones: variables en JSONL subidas a un staged upload →
+  bulkOperationRunMutation → polling → resultados por línea.
+
+Uso:
+    from odi_shopify_bulk import ShopifyBulkClient
+
+    bulk = ShopifyBulkClient(shop, token)
+    for product in bulk.export_products():
+        ...
+    stats = bulk.delete_products(ids)   # {"deleted", "errors"}
+
+Pruebas locales contra odi_shopify_mock (SHOPIFY_GRAPHQL_URL apunta al mock).
+
+Autor: ODI Team
+Version: 1.0
+"""
+
+import os
+import json
+import time
+import tempfile
+from typing import Dict, Any, Optional, List, Iterator, Iterable, Tuple
+
+import requests
+
+try:
+    from .odi_shopify_sync import ShopifyRestClient, REQUEST_TIMEOUT
+except ImportError:
+    from odi_shopify_sync import ShopifyRestClient, REQUEST_TIMEOUT
+
+# ============================================
+# CONFIGURACIÓN
+# ============================================
+GRAPHQL_URL = os.getenv("SHOPIFY_GRAPHQL_URL")  # Override (mock local); por defecto la tienda
+BULK_POLL_SECONDS = 1.0                          # Intervalo inicial de polling
+BULK_POLL_MAX_SECONDS = 15.0                     # Techo del backoff de polling
+BULK_TIMEOUT_SECONDS = 6 * 3600                  # Una operación bulk puede tardar horas
+DOWNLOAD_CHUNK = 64 * 1024
+
+PRODUCTS_QUERY = """
+{
+  products {
+    edges {
+      node {
+        id
+        title
+        descriptionHtml
+        vendor
+        productType
+        tags
+        updatedAt
+        variants { edges { node { id sku price } } }
+        images { edges { node { id url altText } } }
+      }
+    }
+  }
+}
+"""
+
+RUN_QUERY = """
+mutation runQuery($query: String!) {
+  bulkOperationRunQuery(query: $query) {
+    bulkOperation { id status }
+    userErrors { field message }
+  }
+}
+"""
+
+RUN_MUTATION = """
+mutation runMutation($mutation: String!, $path: String!) {
+  bulkOperationRunMutation(mutation: $mutation, stagedUploadPath: $path) {
+    bulkOperation { id status }
+    userErrors { field message }
+  }
+}
+"""
+
+STAGED_UPLOAD = """
+mutation stage {
+  stagedUploadsCreate(input: [{
+    resource: BULK_MUTATION_VARIABLES,
+    filename: "bulk_variables.jsonl",
+    mimeType: "text/jsonl",
+    httpMethod: POST
+  }]) {
+    stagedTargets { url resourceUrl parameters { name value } }
+    userErrors { field message }
+  }
+}
+"""
+
+POLL_QUERY = """
+query poll($id: ID!) {
+  node(id: $id) {
+    ... on BulkOperation { id status errorCode objectCount url partialDataUrl }
+  }
+}
+"""
+
+PRODUCT_DELETE = """
+mutation call($input: ProductDeleteInput!) {
+  productDelete(input: $input) { deletedProductId userErrors { field message } }
+}
+"""
+
+PRODUCT_DELETE_IMAGES = """
+mutation call($id: ID!, $imageIds: [ID!]!) {
+  productDeleteImages(id: $id, imageIds: $imageIds) { deletedImageIds userErrors { field message } }
+}
+"""
+
+PRODUCT_CREATE = """
+mutation call($input: ProductInput!) {
+  productCreate(input: $input) { product { id } userErrors { field message } }
+}
+"""
+
+
+class ShopifyBulkError(Exception):
+    """La operación bulk falló o Shopify rechazó la petición."""
+
+
+def to_gid(kind: str, legacy_id: Any) -> str:
+    return f"gid://shopify/{kind}/{legacy_id}"
+
+
+def from_gid(gid: str) -> int:
+    return int(gid.rsplit("/", 1)[1])
+
+
+def product_input(product: Dict[str, Any]) -> Dict[str, Any]:
+    """Payload REST ({"product": {...}} o el dict) → ProductInput de GraphQL."""
+    product = product.get("product", product)
+    tags = product.get("tags") or []
+    if isinstance(tags, str):
+        tags = [t.strip() for t in tags.split(",") if t.strip()]
+
+    data = {
+        "title": product.get("title"),
+        "descriptionHtml": product.get("body_html") or "",
+        "vendor": product.get("vendor") or "",
+        "productType": product.get("product_type") or "",
+        "tags": tags,
+        "variants": [
+            {"sku": v.get("sku"), "price": str(v.get("price") or 0)}
+            for v in product.get("variants", [])
+        ],
+    }
+    # GraphQL solo acepta imágenes por URL (los attachments base64 van por REST)
+    images = [{"src": i["src"], "altText": i.get("alt")} for i in product.get("images", []) if i.get("src")]
+    if images:
+        data["images"] = images
+    return data
+
+
+# ============================================
+# CLIENTE BULK
+# ============================================
+class ShopifyBulkClient:
+    """Exportaciones y mutaciones masivas con Bulk Operations."""
+
+    def __init__(self, shop: str, token: str, client: Optional[ShopifyRestClient] = None,
+                 graphql_url: Optional[str] = None):
+        self.shop = shop
+        self.client = client or ShopifyRestClient(shop, token)
+        self.graphql_url = graphql_url or GRAPHQL_URL or f"{self.client.base_url}/graphql.json"
+
+    def graphql(self, query: str, variables: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        response = self.client.request(
+            "POST", self.graphql_url, json={"query": query, "variables": variables or {}}
+        )
+        response.raise_for_status()
+        body = response.json()
+        if body.get("errors"):
+            raise ShopifyBulkError(f"GraphQL: {body['errors']}")
+        return body["data"]
+
+    @staticmethod
+    def _payload(data: Dict[str, Any], field: str) -> Dict[str, Any]:
+        payload = data[field]
+        if payload.get("userErrors"):
+            raise ShopifyBulkError(f"{field}: {payload['userErrors']}")
+        return payload
+
+    # -----------------------------------------------------
+    # Ciclo de vida de una operación bulk
+    # -----------------------------------------------------
+    def wait(self, operation_id: str) -> Optional[str]:
+        """Espera a que termine la operación. Devuelve la URL del JSONL (None si no hay filas)."""
+        delay = BULK_POLL_SECONDS
+        deadline = time.monotonic() + BULK_TIMEOUT_SECONDS
+        while time.monotonic() < deadline:
+            operation = self.graphql(POLL_QUERY, {"id": operation_id})["node"]
+            status = operation["status"]
+            if status == "COMPLETED":
+                return operation.get("url")
+            if status in ("FAILED", "CANCELED", "EXPIRED"):
+                raise ShopifyBulkError(
+                    f"{operation_id}: {status} ({operation.get('errorCode')}); "
+                    f"parcial: {operation.get('partialDataUrl')}"
+                )
+            time.sleep(delay)
+            delay = min(delay * 1.5, BULK_POLL_MAX_SECONDS)
+        raise ShopifyBulkError(f"{operation_id}: timeout tras {BULK_TIMEOUT_SECONDS}s")
+
+    @staticmethod
+    def iter_jsonl(url: Optional[str]) -> Iterator[Dict[str, Any]]:
+        """Descarga el resultado en streaming, una línea JSON a la vez."""
+        if not url:
+            return
+        # URL firmada de almacenamiento: sin el token de la tienda
+        with requests.get(url, stream=True, timeout=REQUEST_TIMEOUT) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(chunk_size=DOWNLOAD_CHUNK):
+                if line:
+                    yield json.loads(line)
+
+    def run_query(self, query: str) -> Iterator[Dict[str, Any]]:
+        data = self.graphql(RUN_QUERY, {"query": query})
+        operation = self._payload(data, "bulkOperationRunQuery")["bulkOperation"]
+        yield from self.iter_jsonl(self.wait(operation["id"]))
+
+    def _stage_variables(self, variables: Iterable[Dict[str, Any]]) -> Optional[str]:
+        """Sube las variables (una línea JSONL por llamada). None si no hay ninguna."""
+        with tempfile.TemporaryFile() as fh:
+            count = 0
+            for v in variables:
+                fh.write(json.dumps(v, ensure_ascii=False).encode("utf-8") + b"\n")
+                count += 1
+            if not count:
+                return None
+            fh.seek(0)
+
+            target = self._payload(self.graphql(STAGED_UPLOAD), "stagedUploadsCreate")["stagedTargets"][0]
+            params = {p["name"]: p["value"] for p in target["parameters"]}
+            response = requests.post(
+                target["url"], data=params,
+                files={"file": ("bulk_variables.jsonl", fh, "text/jsonl")},
+                timeout=REQUEST_TIMEOUT * 10
+            )
+            response.raise_for_status()
+        return params["key"]
+
+    def run_mutation(self, mutation: str, variables: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Ejecuta `mutation` una vez por variable; devuelve el resultado de cada línea."""
+        path = self._stage_variables(variables)
+        if path is None:
+            return
+        data = self.graphql(RUN_MUTATION, {"mutation": mutation, "path": path})
+        operation = self._payload(data, "bulkOperationRunMutation")["bulkOperation"]
+        yield from self.iter_jsonl(self.wait(operation["id"]))
+
+    @staticmethod
+    def _tally(results: Iterable[Dict[str, Any]], field: str, ok_key: str) -> Tuple[int, List[str]]:
+        ok, errors = 0, []
+        for line in results:
+            payload = (line.get("data") or {}).get(field) or {}
+            problems = line.get("errors") or payload.get("userErrors")
+            if problems or not payload.get(ok_key):
+                errors.append(f"línea {line.get('__lineNumber')}: {problems or 'sin resultado'}")
+            else:
+                ok += 1
+        return ok, errors
+
+    # -----------------------------------------------------
+    # Productos
+    # -----------------------------------------------------
+    def export_products(self) -> Iterator[Dict[str, Any]]:
+        """
+        Todos los productos con variantes e imágenes, en el formato de la REST
+        API (ids numéricos, body_html, tags como texto). El JSONL lista cada
+        variante/imagen después de su producto, así que basta con un producto
+        en memoria.
+        """
+        current = None
+        for line in self.run_query(PRODUCTS_QUERY):
+            gid = line["id"]
+            if "__parentId" not in line:
+                if current:
+                    yield current
+                current = {
+                    "id": from_gid(gid),
+                    "title": line.get("title") or "",
+                    "body_html": line.get("descriptionHtml") or "",
+                    "vendor": line.get("vendor") or "",
+                    "product_type": line.get("productType") or "",
+                    "tags": ", ".join(line.get("tags") or []),
+                    "updated_at": line.get("updatedAt"),
+                    "variants": [],
+                    "images": [],
+                }
+            elif current is None or to_gid("Product", current["id"]) != line["__parentId"]:
+                continue
+            elif "/ProductVariant/" in gid:
+                current["variants"].append(
+                    {"id": from_gid(gid), "sku": line.get("sku") or "", "price": line.get("price") or "0"}
+                )
+            elif "/ProductImage/" in gid:
+                current["images"].append(
+                    {"id": from_gid(gid), "src": line.get("url") or "", "alt": line.get("altText") or ""}
+                )
+        if current:
+            yield current
+
+    def delete_products(self, product_ids: Iterable[int]) -> Dict[str, Any]:
+        variables = ({"input": {"id": to_gid("Product", pid)}} for pid in product_ids)
+        deleted, errors = self._tally(
+            self.run_mutation(PRODUCT_DELETE, variables), "productDelete", "deletedProductId"
+        )
+        return {"deleted": deleted, "errors": errors}
+
+    def delete_images(self, images: Iterable[Tuple[int, int]]) -> Dict[str, Any]:
+        """Elimina imágenes dadas como (product_id, image_id); una llamada por producto."""
+        by_product: Dict[int, List[str]] = {}
+        for product_id, image_id in images:
+            by_product.setdefault(product_id, []).append(to_gid("ProductImage", image_id))
+
+        variables = (
+            {"id": to_gid("Product", pid), "imageIds": ids} for pid, ids in by_product.items()
+        )
+        deleted, errors = 0, []
+        for line in self.run_mutation(PRODUCT_DELETE_IMAGES, variables):
+            payload = (line.get("data") or {}).get("productDeleteImages") or {}
+            problems = line.get("errors") or payload.get("userErrors")
+            if problems:
+                errors.append(f"línea {line.get('__lineNumber')}: {problems}")
+            deleted += len(payload.get("deletedImageIds") or [])
+        return {"deleted": deleted, "errors": errors}
+
+    def create_products(self, products: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        variables = ({"input": product_input(p)} for p in products)
+        created, errors = self._tally(
+            self.run_mutation(PRODUCT_CREATE, variables), "productCreate", "product"
+        )
+        return {"created": created, "errors": errors}
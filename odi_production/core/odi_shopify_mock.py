@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+ODI Shopify Mock v1.0
+=====================
+Tienda Shopify simulada en memoria para probar odi_shopify_bulk sin tocar
+una tienda real. Implementa lo que usa la capa bulk:
+
+- POST /admin/api/<v>/graphql.json: stagedUploadsCreate,
+  bulkOperationRunQuery, bulkOperationRunMutation (productCreate,
+  productDelete, productDeleteImages) y polling con node(id:).
+- POST /upload: destino del staged upload (multipart).
+- GET  /results/<op>.jsonl: resultado de cada operación.
+- GET  /admin/api/<v>/products/count.json
+
+Uso:
+    python3 odi_shopify_mock.py --port 8765 --seed 500
+    SHOPIFY_GRAPHQL_URL=http://127.0.0.1:8765/admin/api/2024-01/graphql.json \\
+        python3 /opt/odi/scripts/kaiqi_correction_total.py
+
+    # En proceso
+    server, graphql_url = start_mock_server(seed=50)
+    bulk = ShopifyBulkClient("mock.myshopify.com", "token", graphql_url=graphql_url)
+
+Autor: ODI Team
+Version: 1.0
+"""
+
+import re
+import json
+import uuid
+import argparse
+import itertools
+import threading
+from email import policy
+from email.parser import BytesParser
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any, List, Tuple
+
+POLLS_UNTIL_DONE = 2    # Polls en RUNNING antes de COMPLETED (ejercita el polling)
+
+
+def gid(kind: str, legacy_id: int) -> str:
+    return f"gid://shopify/{kind}/{legacy_id}"
+
+
+class MockShop:
+    """Estado de la tienda simulada: productos, uploads y operaciones bulk."""
+
+    def __init__(self, seed: int = 0):
+        self.products: Dict[int, Dict[str, Any]] = {}
+        self.uploads: Dict[str, bytes] = {}
+        self.operations: Dict[str, Dict[str, Any]] = {}
+        self.results: Dict[str, bytes] = {}
+        self._ids = itertools.count(1000)
+        self._lock = threading.Lock()
+        for i in range(seed):
+            self.create({
+                "title": f"Producto mock {i}",
+                "descriptionHtml": f"<p>Producto {i}</p>",
+                "vendor": "KAIQI",
+                "productType": "Motor",
+                "tags": ["mock", "kaiqi", f"lote-{i % 10}"],
+                "variants": [{"sku": f"MOCK-{i % max(seed - 3, 1)}", "price": f"{10 + i}.00"}],
+                "images": [{"src": f"https://cdn.example.com/{'dfg' if i % 7 == 0 else 'kaiqi'}-{i}.jpg"}],
+            })
+
+    # -----------------------------------------------------
+    # Productos
+    # -----------------------------------------------------
+    def create(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        pid = next(self._ids)
+        self.products[pid] = {
+            "id": gid("Product", pid),
+            "title": data.get("title") or "",
+            "descriptionHtml": data.get("descriptionHtml") or "",
+            "vendor": data.get("vendor") or "",
+            "productType": data.get("productType") or "",
+            "tags": list(data.get("tags") or []),
+            "updatedAt": "2024-01-01T00:00:00Z",
+            "variants": [
+                {"id": gid("ProductVariant", next(self._ids)), "sku": v.get("sku") or "", "price": str(v.get("price") or "0")}
+                for v in data.get("variants") or [{}]
+            ],
+            "images": [
+                {"id": gid("ProductImage", next(self._ids)), "url": i["src"], "altText": i.get("altText")}
+                for i in data.get("images") or []
+            ],
+        }
+        return self.products[pid]
+
+    def export_lines(self) -> List[Dict[str, Any]]:
+        lines = []
+        for product in self.products.values():
+            parent = product["id"]
+            lines.append({k: v for k, v in product.items() if k not in ("variants", "images")})
+            lines.extend(dict(v, __parentId=parent) for v in product["variants"])
+            lines.extend(dict(i, __parentId=parent) for i in product["images"])
+        return lines
+
+    def apply(self, mutation: str, variables: Dict[str, Any]) -> Dict[str, Any]:
+        if "productDeleteImages" in mutation:
+            product = self.products.get(int(variables["id"].rsplit("/", 1)[1]))
+            if product is None:
+                return {"productDeleteImages": {"deletedImageIds": None,
+                        "userErrors": [{"field": ["id"], "message": "Product does not exist"}]}}
+            ids = set(variables["imageIds"])
+            deleted = [i["id"] for i in product["images"] if i["id"] in ids]
+            product["images"] = [i for i in product["images"] if i["id"] not in ids]
+            return {"productDeleteImages": {"deletedImageIds": deleted, "userErrors": []}}
+
+        if "productDelete" in mutation:
+            pid = variables["input"]["id"]
+            if self.products.pop(int(pid.rsplit("/", 1)[1]), None) is None:
+                return {"productDelete": {"deletedProductId": None,
+                        "userErrors": [{"field": ["id"], "message": "Product does not exist"}]}}
+            return {"productDelete": {"deletedProductId": pid, "userErrors": []}}
+
+        if "productCreate" in mutation:
+            if not (variables["input"].get("title") or "").strip():
+                return {"productCreate": {"product": None,
+                        "userErrors": [{"field": ["title"], "message": "Title can't be blank"}]}}
+            product = self.create(variables["input"])
+            return {"productCreate": {"product": {"id": product["id"]}, "userErrors": []}}
+
+        raise ValueError("Mutación no soportada por el mock")
+
+    # -----------------------------------------------------
+    # GraphQL
+    # -----------------------------------------------------
+    def graphql(self, query: str, variables: Dict[str, Any], base_url: str) -> Dict[str, Any]:
+        with self._lock:
+            if "stagedUploadsCreate" in query:
+                key = f"tmp/{uuid.uuid4().hex}/bulk_variables.jsonl"
+                return {"data": {"stagedUploadsCreate": {"stagedTargets": [{
+                    "url": f"{base_url}/upload",
+                    "resourceUrl": f"{base_url}/upload/{key}",
+                    "parameters": [{"name": "key", "value": key}],
+                }], "userErrors": []}}}
+
+            if "bulkOperationRunQuery" in query:
+                lines = self.export_lines()
+                return {"data": {"bulkOperationRunQuery": {
+                    "bulkOperation": self._start(lines), "userErrors": []}}}
+
+            if "bulkOperationRunMutation" in query:
+                upload = self.uploads.pop(variables["path"], None)
+                if upload is None:
+                    return {"data": {"bulkOperationRunMutation": {"bulkOperation": None,
+                            "userErrors": [{"field": ["stagedUploadPath"], "message": "Upload not found"}]}}}
+                lines = []
+                for n, raw in enumerate(l for l in upload.splitlines() if l.strip()):
+                    result = self.apply(variables["mutation"], json.loads(raw))
+                    lines.append({"data": result, "__lineNumber": n})
+                return {"data": {"bulkOperationRunMutation": {
+                    "bulkOperation": self._start(lines), "userErrors": []}}}
+
+            if "node(" in query:
+                op = self.operations.get(variables["id"])
+                if op is None:
+                    return {"data": {"node": None}}
+                op["polls"] += 1
+                done = op["polls"] > POLLS_UNTIL_DONE
+                return {"data": {"node": {
+                    "id": op["id"],
+                    "status": "COMPLETED" if done else "RUNNING",
+                    "errorCode": None,
+                    "objectCount": str(op["count"]),
+                    "url": f"{base_url}/results/{op['key']}.jsonl" if done and op["count"] else None,
+                    "partialDataUrl": None,
+                }}}
+
+        return {"errors": [{"message": "Query no soportada por el mock"}]}
+
+    def _start(self, lines: List[Dict[str, Any]]) -> Dict[str, Any]:
+        key = uuid.uuid4().hex
+        op_id = gid("BulkOperation", next(self._ids))
+        self.results[key] = b"".join(json.dumps(l).encode("utf-8") + b"\n" for l in lines)
+        self.operations[op_id] = {"id": op_id, "key": key, "count": len(lines), "polls": 0}
+        return {"id": op_id, "status": "CREATED"}
+
+
+def _multipart_fields(content_type: str, body: bytes) -> Dict[str, bytes]:
+    message = BytesParser(policy=policy.default).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + body
+    )
+    return {
+        part.get_param("name", header="content-disposition"): part.get_payload(decode=True)
+        for part in message.iter_parts()
+    }
+
+
+class MockShopifyHandler(BaseHTTPRequestHandler):
+    shop: MockShop = None
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_POST(self):
+        body = self._read_body()
+        if self.path.endswith("/graphql.json"):
+            request = json.loads(body)
+            response = self.shop.graphql(request["query"], request.get("variables") or {}, self._base_url())
+            return self._send(200, json.dumps(response).encode("utf-8"))
+
+        if self.path == "/upload":
+            fields = _multipart_fields(self.headers["Content-Type"], body)
+            with self.shop._lock:
+                self.shop.uploads[fields["key"].decode()] = fields["file"]
+            return self._send(201, b"")
+
+        self._send(404, b'{"errors": "Not Found"}')
+
+    def do_GET(self):
+        match = re.fullmatch(r"/results/(\w+)\.jsonl", self.path)
+        if match and match.group(1) in self.shop.results:
+            return self._send(200, self.shop.results[match.group(1)], "application/jsonl")
+
+        if self.path.split("?")[0].endswith("/products/count.json"):
+            return self._send(200, json.dumps({"count": len(self.shop.products)}).encode("utf-8"))
+
+        self._send(404, b'{"errors": "Not Found"}')
+
+
+def start_mock_server(port: int = 0, seed: int = 0, host: str = "127.0.0.1") -> Tuple[ThreadingHTTPServer, str]:
+    """Levanta el mock en un hilo. Devuelve (server, graphql_url); server.shutdown() para parar."""
+    handler = type("Handler", (MockShopifyHandler,), {"shop": MockShop(seed)})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="shopify-mock", daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}/admin/api/2024-01/graphql.json"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock local de Shopify Bulk Operations")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=0, help="Productos de ejemplo iniciales")
+    args = parser.parse_args()
+
+    handler = type("Handler", (MockShopifyHandler,), {"shop": MockShop(args.seed)})
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    print(f"Shopify mock: http://{args.host}:{args.port}/admin/api/2024-01/graphql.json ({args.seed} productos)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+"""
+ODI Shopify Sync v1.0
+=====================
+Motor de sincronización ODI → Shopify compartido por el SRM Processor,
+el Pipeline Service y los scripts de tienda.
+
+- ShopifyRateLimiter: leaky bucket alimentado por el header
+  X-Shopify-Shop-Api-Call-Limit (en vez de sleeps fijos).
+- ShopifyRestClient: requests con limiter, reintento en 429 / 5xx.
+- ShopifySkuIndex: índice local SKU → (product_id, variant_id, updated_at,
+  content_hash), construido con paginación por cursor y refrescado con
+  updated_at_min.
+- ShopifySyncEngine: pool acotado de workers; solo escribe productos
+  nuevos o cuyo hash de contenido cambió.
+
+Uso:
+    from odi_shopify_sync import ShopifySyncEngine
+
+    engine = ShopifySyncEngine(shop, token)
+    stats = engine.sync(payloads)   # {"created", "updated", "unchanged", "errors"}
+
+Autor: ODI Team
+Version: 1.0
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, List, Iterator, Iterable, Callable, Tuple
+
+import requests
+
+# ============================================
+# CONFIGURACIÓN
+# ============================================
+SHOPIFY_API_VERSION = os.getenv("SHOPIFY_API_VERSION", "2024-01")
+SKU_INDEX_DIR = Path(os.getenv("ODI_SKU_INDEX_DIR", "/opt/odi/data/shopify_index"))
+
+PAGE_SIZE = 250                     # Máximo permitido por la REST Admin API
+INDEX_FIELDS = "id,title,body_html,vendor,product_type,tags,updated_at,variants,images"
+REFRESH_MAX_AGE_SECONDS = 300       # refresh_if_stale: incremental cada 5 min
+FULL_REBUILD_SECONDS = 24 * 3600    # Reconstrucción completa diaria (borrados externos)
+REQUEST_TIMEOUT = 30
+
+CALL_LIMIT_HEADER = "X-Shopify-Shop-Api-Call-Limit"
+BUCKET_CAPACITY = 40                                            # Plan estándar (Plus: 80)
+BUCKET_LEAK_RATE = float(os.getenv("SHOPIFY_LEAK_RATE", "2"))   # req/s (Plus: 4)
+BUCKET_HEADROOM = 4                                             # Margen para requests en vuelo
+SYNC_WORKERS = int(os.getenv("SHOPIFY_SYNC_WORKERS", "4"))
+MAX_RETRIES = 5
+
+
+# ============================================
+# HASH DE CONTENIDO
+# ============================================
+def _normalize_tags(tags: Any) -> List[str]:
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    return sorted({str(t).strip() for t in (tags or []) if str(t).strip()})
+
+
+def _normalize_price(price: Any) -> str:
+    try:
+        return f"{float(price):.2f}"
+    except (TypeError, ValueError):
+        return ""
+
+
+def _normalize_variant(variant: Dict[str, Any]) -> Tuple[str, ...]:
+    """Campos de variante que ODI escribe (sin peso o sin stock == vacío)."""
+    weight = _normalize_price(variant.get("weight"))
+    quantity = variant.get("inventory_quantity")
+    return (
+        str(variant.get("sku") or ""),
+        _normalize_price(variant.get("price")),
+        _normalize_price(variant.get("compare_at_price")),
+        "" if quantity is None else str(quantity),
+        "" if weight in ("", "0.00") else weight,
+        str(variant.get("weight_unit") or "") if weight not in ("", "0.00") else "",
+        str(variant.get("inventory_management") or ""),
+    )
+
+
+def _image_keys(images: Any) -> List[str]:
+    """src de cada imagen (o filename si se sube como attachment), en orden."""
+    return [
+        str(img.get("src") or img.get("filename") or "")
+        for img in (images or []) if isinstance(img, dict)
+    ]
+
+
+def product_content_hash(product: Dict[str, Any]) -> str:
+    """
+    Hash de los campos que ODI escribe en Shopify.
+
+    Acepta tanto un producto leído de Shopify como el payload que se va a
+    enviar ({"product": {...}} o el dict interno), así ambos lados son
+    comparables para decidir si un update hace falta.
+    """
+    product = product.get("product", product)
+    canonical = {
+        "title": (product.get("title") or "").strip(),
+        "body_html": (product.get("body_html") or "").strip(),
+        "vendor": (product.get("vendor") or "").strip(),
+        "product_type": (product.get("product_type") or "").strip(),
+        "tags": _normalize_tags(product.get("tags")),
+        "variants": sorted(_normalize_variant(v) for v in product.get("variants", [])),
+        "images": _image_keys(product.get("images")),
+    }
+    blob = json.dumps(canonical, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+
+def next_page_url(response: requests.Response) -> Optional[str]:
+    """URL de la siguiente página según el header Link (paginación por cursor)."""
+    link = response.headers.get("Link", "")
+    for part in link.split(","):
+        if 'rel="next"' in part:
+            return part.split("<", 1)[1].split(">", 1)[0]
+    return None
+
+
+# ============================================
+# RATE LIMIT + CLIENTE REST
+# ============================================
+class ShopifyRateLimiter:
+    """
+    Leaky bucket de la REST Admin API.
+
+    Lleva una estimación local del nivel del bucket (se vacía a
+    BUCKET_LEAK_RATE req/s) y la corrige con el valor real que Shopify
+    devuelve en X-Shopify-Shop-Api-Call-Limit ("usado/capacidad").
+    """
+
+    def __init__(self, capacity: int = BUCKET_CAPACITY, leak_rate: float = BUCKET_LEAK_RATE):
+        self.capacity = capacity
+        self.leak_rate = leak_rate
+        self.level = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _leak(self, now: float):
+        self.level = max(0.0, self.level - (now - self._updated) * self.leak_rate)
+        self._updated = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                self._leak(time.monotonic())
+                limit = self.capacity - BUCKET_HEADROOM
+                if self.level + 1 <= limit:
+                    self.level += 1
+                    return
+                wait = (self.level + 1 - limit) / self.leak_rate
+            time.sleep(wait)
+
+    def update(self, header: Optional[str]):
+        if not header or "/" not in header:
+            return
+        used, capacity = header.split("/", 1)
+        with self._lock:
+            self._leak(time.monotonic())
+            self.capacity = int(capacity)
+            self.level = float(used)
+
+    def penalize(self):
+        """Tras un 429 el bucket está lleno."""
+        with self._lock:
+            self._leak(time.monotonic())
+            self.level = float(self.capacity)
+
+
+class ShopifyRestClient:
+    """Cliente REST con rate limit compartido y reintentos (429, 5xx, errores de red)."""
+
+    def __init__(self, shop: str, token: str, limiter: Optional[ShopifyRateLimiter] = None,
+                 session: Optional[requests.Session] = None, pool_size: int = SYNC_WORKERS):
+        self.shop = shop
+        self.base_url = f"https://{shop}/admin/api/{SHOPIFY_API_VERSION}"
+        self.limiter = limiter or ShopifyRateLimiter()
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(pool_size, 1))
+            session.mount("https://", adapter)
+        self.session = session
+        self.session.headers.update({"X-Shopify-Access-Token": token, "Content-Type": "application/json"})
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        url = path if path.startswith("http") else f"{self.base_url}{path}"
+        kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+
+        for attempt in range(MAX_RETRIES + 1):
+            self.limiter.acquire()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.RequestException:
+                if attempt == MAX_RETRIES:
+                    raise
+                time.sleep(2 ** attempt)
+                continue
+
+            self.limiter.update(response.headers.get(CALL_LIMIT_HEADER))
+            if response.status_code == 429 and attempt < MAX_RETRIES:
+                self.limiter.penalize()
+                time.sleep(float(response.headers.get("Retry-After", 2)))
+                continue
+            if response.status_code >= 500 and attempt < MAX_RETRIES:
+                time.sleep(2 ** attempt)
+                continue
+            return response
+        return response
+
+
+class ShopifySyncError(Exception):
+    """Shopify rechazó una escritura."""
+
+
+# ============================================
+# ÍNDICE SKU
+# ============================================
+class ShopifySkuIndex:
+    """Índice persistente SKU → (product_id, variant_id, updated_at, content_hash)."""
+
+    def __init__(self, shop: str, token: str, db_path: Optional[Path] = None,
+                 client: Optional[ShopifyRestClient] = None):
+        self.shop = shop
+        self.client = client or ShopifyRestClient(shop, token)
+
+        self.db_path = Path(db_path) if db_path else SKU_INDEX_DIR / f"{shop.replace('.', '_')}.db"
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._checked_at = 0.0
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._init_db()
+
+    def _init_db(self):
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS skus (
+                sku TEXT PRIMARY KEY,
+                product_id INTEGER NOT NULL,
+                variant_id INTEGER,
+                updated_at TEXT,
+                content_hash TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_skus_product ON skus(product_id);
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+        """)
+        self._conn.commit()
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str):
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    # ------------------------------------------
+    # Lectura
+    # ------------------------------------------
+    def lookup(self, sku: str) -> Optional[Dict[str, Any]]:
+        if not sku:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT product_id, variant_id, updated_at, content_hash FROM skus WHERE sku = ?",
+                (sku,)
+            ).fetchone()
+        if not row:
+            return None
+        return {"sku": sku, "product_id": row[0], "variant_id": row[1],
+                "updated_at": row[2], "content_hash": row[3]}
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM skus").fetchone()[0]
+
+    # ------------------------------------------
+    # Escritura
+    # ------------------------------------------
+    def record_product(self, product: Dict[str, Any], content_hash: Optional[str] = None):
+        """
+        Registra (o reemplaza) todas las variantes de un producto de Shopify.
+
+        Tras una escritura propia se pasa el hash del payload enviado: Shopify
+        puede reescribir body_html, y comparar contra lo enviado evita
+        updates repetidos del mismo contenido.
+        """
+        with self._lock:
+            self._record(product, content_hash)
+            self._conn.commit()
+
+    def _record(self, product: Dict[str, Any], content_hash: Optional[str] = None):
+        product_id = product["id"]
+        if content_hash is None:
+            # Producto sin cambios desde nuestra última escritura: conservar su hash
+            row = self._conn.execute(
+                "SELECT content_hash FROM skus WHERE product_id = ? AND updated_at = ? LIMIT 1",
+                (product_id, product.get("updated_at"))
+            ).fetchone()
+            content_hash = row[0] if row else product_content_hash(product)
+        self._conn.execute("DELETE FROM skus WHERE product_id = ?", (product_id,))
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO skus (sku, product_id, variant_id, updated_at, content_hash) VALUES (?, ?, ?, ?, ?)",
+            [
+                (v["sku"], product_id, v.get("id"), product.get("updated_at"), content_hash)
+                for v in product.get("variants", [])
+                if v.get("sku")
+            ]
+        )
+
+    def remove_product(self, product_id: int):
+        with self._lock:
+            self._conn.execute("DELETE FROM skus WHERE product_id = ?", (product_id,))
+            self._conn.commit()
+
+    # ------------------------------------------
+    # Sincronización con la tienda
+    # ------------------------------------------
+    def _iter_products(self, updated_at_min: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        params = {"limit": PAGE_SIZE, "fields": INDEX_FIELDS}
+        if updated_at_min:
+            params["updated_at_min"] = updated_at_min
+        url = "/products.json"
+
+        while url:
+            response = self.client.request("GET", url, params=params)
+            response.raise_for_status()
+            yield from response.json().get("products", [])
+            # Con page_info el cursor ya codifica filtros y límite
+            url, params = next_page_url(response), None
+
+    def refresh(self, full: bool = False) -> int:
+        """
+        Sincroniza el índice con la tienda. Devuelve productos procesados.
+
+        Incremental (updated_at_min) salvo que no exista sincronización previa,
+        se pida `full` o haya pasado FULL_REBUILD_SECONDS.
+        """
+        with self._refresh_lock:
+            with self._lock:
+                last_sync = self._get_meta("last_sync")
+                full_at = float(self._get_meta("full_synced_at") or 0)
+            full = full or not last_sync or time.time() - full_at > FULL_REBUILD_SECONDS
+            started = datetime.now(timezone.utc).isoformat()
+
+            count = 0
+            seen_products = set()
+            batch: List[Dict[str, Any]] = []
+            for product in self._iter_products(None if full else last_sync):
+                batch.append(product)
+                seen_products.add(product["id"])
+                if len(batch) >= PAGE_SIZE:
+                    count += self._write_batch(batch)
+                    batch = []
+            count += self._write_batch(batch)
+
+            with self._lock:
+                if full:
+                    # Lo que no apareció en la lectura completa ya no existe en la tienda
+                    known = {r[0] for r in self._conn.execute("SELECT DISTINCT product_id FROM skus")}
+                    for product_id in known - seen_products:
+                        self._conn.execute("DELETE FROM skus WHERE product_id = ?", (product_id,))
+                    self._set_meta("full_synced_at", str(time.time()))
+                self._set_meta("last_sync", started)
+                self._conn.commit()
+
+            self._checked_at = time.monotonic()
+            return count
+
+    def _write_batch(self, products: List[Dict[str, Any]]) -> int:
+        if not products:
+            return 0
+        with self._lock:
+            for product in products:
+                self._record(product)
+            self._conn.commit()
+        return len(products)
+
+    def refresh_if_stale(self, max_age: float = REFRESH_MAX_AGE_SECONDS) -> bool:
+        """Refresca si la última sincronización de este proceso es más vieja que max_age."""
+        if self._checked_at and time.monotonic() - self._checked_at < max_age:
+            return False
+        self.refresh()
+        return True
+
+
+# ============================================
+# MOTOR DE SINCRONIZACIÓN
+# ============================================
+class ShopifySyncEngine:
+    """
+    Upserts concurrentes y diff-only contra una tienda.
+
+    Cada payload ({"product": {...}} o el dict del producto) se resuelve
+    por el SKU de su primera variante en el índice local: si el hash de
+    contenido coincide no se escribe nada; si existe se actualiza; si no,
+    se crea.
+    """
+
+    def __init__(self, shop: str, token: str, workers: int = SYNC_WORKERS,
+                 index: Optional[ShopifySkuIndex] = None):
+        self.shop = shop
+        self.workers = workers
+        self.client = ShopifyRestClient(shop, token, pool_size=workers)
+        self.index = index or ShopifySkuIndex(shop, token, client=self.client)
+
+    def run(self, items: Iterable[Any], fn: Callable[[Any], Any],
+            progress: Optional[Callable[[int, int], None]] = None) -> List[Tuple[Any, Any, Optional[Exception]]]:
+        """Aplica fn a cada item en el pool; devuelve (item, resultado, error) en orden."""
+        items = list(items)
+        results = []
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = [pool.submit(fn, item) for item in items]
+            for done, (item, future) in enumerate(zip(items, futures), 1):
+                try:
+                    results.append((item, future.result(), None))
+                except Exception as e:
+                    results.append((item, None, e))
+                if progress:
+                    progress(done, len(items))
+        return results
+
+    def upsert(self, payload: Dict[str, Any]) -> str:
+        """Crea o actualiza un producto. Devuelve "created", "updated" o "unchanged"."""
+        product = dict(payload.get("product", payload))
+        variants = product.get("variants") or []
+        sku = next((v.get("sku") for v in variants if v.get("sku")), None)
+        content_hash = product_content_hash(product)
+
+        hit = self.index.lookup(sku) if sku else None
+        if hit and hit["content_hash"] == content_hash:
+            return "unchanged"
+
+        if hit:
+            body = dict(product, id=hit["product_id"])
+            if hit["variant_id"] and len(variants) == 1:
+                body["variants"] = [dict(variants[0], id=hit["variant_id"])]
+            response = self.client.request(
+                "PUT", f"/products/{hit['product_id']}.json", json={"product": body}
+            )
+            if response.status_code == 200:
+                self.index.record_product(response.json()["product"], content_hash)
+                return "updated"
+            if response.status_code != 404:
+                raise ShopifySyncError(f"{sku}: {response.status_code} - {response.text[:200]}")
+            # Borrado fuera de ODI: se vuelve a crear
+            self.index.remove_product(hit["product_id"])
+
+        response = self.client.request("POST", "/products.json", json={"product": product})
+        if response.status_code != 201:
+            raise ShopifySyncError(f"{sku or product.get('title', '')[:50]}: {response.status_code} - {response.text[:200]}")
+        self.index.record_product(response.json()["product"], content_hash)
+        return "created"
+
+    def update_fields(self, product_id: int, fields: Dict[str, Any]) -> Dict[str, Any]:
+        """PUT parcial de un producto (p.ej. solo body_html)."""
+        response = self.client.request(
+            "PUT", f"/products/{product_id}.json", json={"product": {"id": product_id, **fields}}
+        )
+        if response.status_code != 200:
+            raise ShopifySyncError(f"{product_id}: {response.status_code} - {response.text[:200]}")
+        return response.json()["product"]
+
+    def sync(self, payloads: Iterable[Dict[str, Any]], refresh: bool = True,
+             progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """Upsert diff-only de todos los payloads."""
+        if refresh:
+            self.index.refresh_if_stale()
+
+        stats = {"created": 0, "updated": 0, "unchanged": 0, "errors": []}
+        for payload, outcome, error in self.run(payloads, self.upsert, progress):
+            if error:
+                stats["errors"].append(str(error))
+            else:
+                stats[outcome] += 1
+        return stats
@@ -159,7 +159,7 @@ setup_python_env() {
         python-docx \
         markdown \
         beautifulsoup4 \
-        redis \
+        "redis>=5.0.1" \
         fastapi \
         uvicorn \
         python-multipart \
@@ -23,14 +23,17 @@ REPO_PATH="/tmp/extrac/odi_production"
 # ══════════════════════════════════════════════════════════════════════════════
 echo -e "\n${YELLOW}[1/5] Creando directorio API...${NC}"
 mkdir -p $ODI_HOME/api
+mkdir -p $ODI_HOME/core
 mkdir -p $ODI_HOME/logs
+mkdir -p $ODI_HOME/data
 
 # ══════════════════════════════════════════════════════════════════════════════
 # 2. Copiar archivos
 # ══════════════════════════════════════════════════════════════════════════════
 echo -e "\n${YELLOW}[2/5] Copiando archivos...${NC}"
-cp $REPO_PATH/api/main.py $ODI_HOME/api/
+cp $REPO_PATH/api/*.py $ODI_HOME/api/
 cp $REPO_PATH/api/requirements.txt $ODI_HOME/api/
+cp $REPO_PATH/core/odi_metrics.py $ODI_HOME/core/    # Compartido con los servicios de core/
 
 # ══════════════════════════════════════════════════════════════════════════════
 # 3. Instalar dependencias
@@ -58,6 +61,7 @@ Restart=always
 RestartSec=10
 Environment=PYTHONUNBUFFERED=1
 Environment=CORTEX_URL=http://127.0.0.1:8803
+Environment=ODI_API_DB=/opt/odi/data/odi_api.db
 Environment=PIPELINE_URL=http://127.0.0.1:8804
 Environment=JWT_SECRET=odi-production-secret-change-this
 StandardOutput=append:/opt/odi/logs/api.log
@@ -0,0 +1,6 @@
+"""Los módulos de core/ se importan planos, igual que en /opt/odi/core."""
+import sys
+from pathlib import Path
+
+CORE_DIR = Path(__file__).resolve().parent.parent / "core"
+sys.path.insert(0, str(CORE_DIR))
@@ -0,0 +1,164 @@
+import os
+import json
+import asyncio
+import tempfile
+
+import pytest
+
+os.environ.setdefault("LOGS_PATH", tempfile.gettempdir())
+
+fakeredis = pytest.importorskip("fakeredis")
+
+import odi_feedback_loop as fl
+from odi_feedback_loop import ODIFeedbackLoop, CONSUMER_GROUP, FEEDBACK_STREAM, DEAD_LETTER_STREAM
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def make_loop(server, consumer="worker-1", handler=None):
+    """Feedback loop sobre fakeredis; `handler` reemplaza a los handlers reales."""
+    client = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+    loop = ODIFeedbackLoop(redis_client=client, consumer_name=consumer)
+    if handler is not None:
+        loop.handlers = {stream: handler for stream in loop.handlers}
+    await loop._ensure_groups()
+    return loop
+
+
+async def produce(redis, *payloads):
+    return [await redis.xadd(FEEDBACK_STREAM, {"data": json.dumps(p)}) for p in payloads]
+
+
+async def pending_count(redis, stream=FEEDBACK_STREAM):
+    return (await redis.xpending(stream, CONSUMER_GROUP))["pending"]
+
+
+def test_ensure_groups_creates_streams_and_group_idempotently():
+    async def scenario():
+        loop = await make_loop(fakeredis.FakeServer())
+        await loop._ensure_groups()  # BUSYGROUP se ignora
+
+        for stream in loop.handlers:
+            groups = await loop.redis.xinfo_groups(stream)
+            assert [g["name"] for g in groups] == [CONSUMER_GROUP]
+
+    run(scenario())
+
+
+def test_dispatch_and_batched_ack():
+    seen = []
+
+    async def handler(data):
+        seen.append(json.loads(data)["query_id"])
+
+    async def scenario():
+        loop = await make_loop(fakeredis.FakeServer(), handler=handler)
+        await produce(loop.redis, {"query_id": "q1"}, {"query_id": "q2"}, {"query_id": "q3"})
+
+        await loop._read_group({FEEDBACK_STREAM: ">"}, block=None)
+
+        assert seen == ["q1", "q2", "q3"]
+        # Los ACK se acumulan y salen juntos en el flush
+        assert await pending_count(loop.redis) == 3
+        assert len(loop._acks[FEEDBACK_STREAM]) == 3
+
+        await loop._flush_acks()
+        assert await pending_count(loop.redis) == 0
+        assert loop._acks == {}
+
+    run(scenario())
+
+
+def test_ack_batch_size_wakes_the_flusher(monkeypatch):
+    monkeypatch.setattr(fl, "ACK_BATCH_SIZE", 2)
+
+    async def handler(data):
+        pass
+
+    async def scenario():
+        loop = await make_loop(fakeredis.FakeServer(), handler=handler)
+        await produce(loop.redis, {"n": 1}, {"n": 2})
+
+        await loop._read_group({FEEDBACK_STREAM: ">"}, block=None)
+
+        assert loop._ack_ready.is_set()
+
+    run(scenario())
+
+
+def test_failed_handler_leaves_entry_pending():
+    async def handler(data):
+        if json.loads(data)["query_id"] == "bad":
+            raise ValueError("boom")
+
+    async def scenario():
+        loop = await make_loop(fakeredis.FakeServer(), handler=handler)
+        good, bad = await produce(loop.redis, {"query_id": "ok"}, {"query_id": "bad"})
+
+        await loop._read_group({FEEDBACK_STREAM: ">"}, block=None)
+        await loop._flush_acks()
+
+        pending = await loop.redis.xpending_range(FEEDBACK_STREAM, CONSUMER_GROUP, min="-", max="+", count=10)
+        assert [p["message_id"] for p in pending] == [bad]
+        assert pending[0]["consumer"] == "worker-1"
+
+    run(scenario())
+
+
+def test_reclaim_redelivers_entries_of_a_dead_consumer(monkeypatch):
+    monkeypatch.setattr(fl, "CLAIM_IDLE_MS", 0)
+    seen = []
+
+    async def handler(data):
+        seen.append(json.loads(data)["query_id"])
+
+    async def scenario():
+        server = fakeredis.FakeServer()
+        crashed = await make_loop(server, consumer="crashed")
+        await produce(crashed.redis, {"query_id": "q1"})
+        # "crashed" lee la entrada y muere antes de procesarla
+        await crashed.redis.xreadgroup(CONSUMER_GROUP, "crashed", {FEEDBACK_STREAM: ">"})
+
+        survivor = await make_loop(server, consumer="survivor", handler=handler)
+        await survivor._reclaim(FEEDBACK_STREAM)
+        await survivor._flush_acks()
+
+        assert seen == ["q1"]
+        assert survivor.metrics.entries_reclaimed == 1
+        assert await pending_count(survivor.redis) == 0
+
+    run(scenario())
+
+
+def test_reclaim_dead_letters_after_max_deliveries(monkeypatch):
+    monkeypatch.setattr(fl, "CLAIM_IDLE_MS", 0)
+    monkeypatch.setattr(fl, "MAX_DELIVERIES", 2)
+    attempts = []
+
+    async def handler(data):
+        attempts.append(data)
+        raise ValueError("siempre falla")
+
+    async def scenario():
+        loop = await make_loop(fakeredis.FakeServer(), handler=handler)
+        (entry_id,) = await produce(loop.redis, {"query_id": "poison"})
+
+        await loop._read_group({FEEDBACK_STREAM: ">"}, block=None)   # entrega 1
+        await loop._reclaim(FEEDBACK_STREAM)                           # entrega 2
+        assert await pending_count(loop.redis) == 1
+
+        await loop._reclaim(FEEDBACK_STREAM)                           # entrega 3 > MAX
+        await loop._flush_acks()
+
+        assert len(attempts) == 2
+        assert loop.metrics.entries_dead == 1
+        assert await pending_count(loop.redis) == 0
+        dead = await loop.redis.xrange(DEAD_LETTER_STREAM)
+        assert len(dead) == 1
+        assert dead[0][1]["stream"] == FEEDBACK_STREAM
+        assert dead[0][1]["entry_id"] == entry_id
+        assert json.loads(dead[0][1]["data"]) == {"query_id": "poison"}
+
+    run(scenario())
@@ -0,0 +1,61 @@
+import pytest
+
+from odi_lexical_index import LexicalIndex, extract_codes, fuse_results
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("kit arrastre CB190R", ["CB190R"]),
+    ("12345-KYJ-900 y NKD-125", ["12345KYJ900", "NKD125"]),
+    ("rodamiento 6204-2RS", ["62042RS"]),
+    ("bujía C7HSA", ["C7HSA"]),
+    ("sku 123456", ["123456"]),
+])
+def test_extract_codes_keeps_part_codes(text, expected):
+    assert extract_codes(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "motor 150cc",
+    "cilindro 200CC",
+    "batería 12V 7Ah",
+    "disco 1.5mm",
+    "potencia 10hp",
+    "torque 45Nm",
+    "aceite 10W40",
+    "aceite 20W-50",
+    "motor 2T y 4T",
+])
+def test_extract_codes_ignores_units_and_viscosity(text):
+    assert extract_codes(text) == []
+
+
+def test_units_do_not_pin_exact_matches(tmp_path):
+    index = LexicalIndex(tmp_path / "motos.lexical.db")
+    index.upsert(
+        ["a", "b"],
+        ["Motor completo 150cc para AKT NKD-125", "Cilindro 150cc con pistón"],
+        [{"source": "a.pdf"}, {"source": "b.pdf"}],
+    )
+
+    assert all(r["match"] == "lexical" for r in index.search("cilindro 150cc", k=2))
+    assert index.search("NKD125", k=1)[0]["id"] == "a"
+    assert index.search("NKD125", k=1)[0]["match"] == "exact"
+
+
+def test_fused_results_keep_retriever_values_apart():
+    vector = [
+        {"content": "a", "metadata": {"path": "a.pdf"}, "distance": 0.2},
+        {"content": "b", "metadata": {"path": "b.pdf"}, "distance": 0.4},
+    ]
+    lexical = [
+        {"id": "x", "content": "b", "metadata": {"path": "b.pdf"}, "code_hits": 2, "match": "exact"},
+        {"id": "y", "content": "c", "metadata": {"path": "c.pdf"}, "bm25": 3.5, "match": "lexical"},
+    ]
+
+    fused = fuse_results(vector, lexical, k=3)
+
+    assert [r["content"] for r in fused] == ["b", "a", "c"]
+    assert all("score" not in r for r in fused)
+    assert fused[0]["match"] == "exact"
+    assert (fused[0]["distance"], fused[0]["code_hits"]) == (0.4, 2)
+    assert fused[1]["fused_score"] > fused[2]["fused_score"]
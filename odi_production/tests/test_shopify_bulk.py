@@ -0,0 +1,99 @@
+import pytest
+
+import odi_shopify_bulk
+from odi_shopify_bulk import ShopifyBulkClient
+from odi_shopify_mock import start_mock_server
+
+
+@pytest.fixture
+def mock_shop(monkeypatch):
+    """Tienda mock con 6 productos sembrados y polling rápido."""
+    monkeypatch.setattr(odi_shopify_bulk, "BULK_POLL_SECONDS", 0.01)
+    server, graphql_url = start_mock_server(seed=6)
+    bulk = ShopifyBulkClient("mock.myshopify.com", "token", graphql_url=graphql_url)
+    yield bulk, server.RequestHandlerClass.shop
+    server.shutdown()
+    server.server_close()
+
+
+def product_ids(shop):
+    return sorted(shop.products)
+
+
+def test_export_products_rebuilds_rest_shape(mock_shop):
+    bulk, shop = mock_shop
+
+    exported = list(bulk.export_products())
+
+    assert [p["id"] for p in exported] == product_ids(shop)
+    for product in exported:
+        source = shop.products[product["id"]]
+        assert product["title"] == source["title"]
+        assert product["body_html"] == source["descriptionHtml"]
+        assert product["tags"] == ", ".join(source["tags"])
+        assert [v["id"] for v in product["variants"]] == [int(v["id"].rsplit("/", 1)[1]) for v in source["variants"]]
+        assert [v["sku"] for v in product["variants"]] == [v["sku"] for v in source["variants"]]
+        assert [i["src"] for i in product["images"]] == [i["url"] for i in source["images"]]
+
+
+def test_delete_products_tallies_user_errors(mock_shop):
+    bulk, shop = mock_shop
+    existing = product_ids(shop)[:3]
+
+    stats = bulk.delete_products(existing + [999999])
+
+    assert stats["deleted"] == 3
+    assert len(stats["errors"]) == 1
+    assert "línea 3" in stats["errors"][0]
+    assert "Product does not exist" in stats["errors"][0]
+    assert not set(existing) & set(shop.products)
+
+
+def test_delete_images_tallies_per_image_and_user_errors(mock_shop):
+    bulk, shop = mock_shop
+    first, second = product_ids(shop)[:2]
+    images = [
+        (pid, int(image["id"].rsplit("/", 1)[1]))
+        for pid in (first, second) for image in shop.products[pid]["images"]
+    ]
+
+    stats = bulk.delete_images(images + [(999999, 1)])
+
+    assert stats["deleted"] == len(images)
+    assert len(stats["errors"]) == 1
+    assert "Product does not exist" in stats["errors"][0]
+    assert shop.products[first]["images"] == [] and shop.products[second]["images"] == []
+
+
+def test_create_products_tallies_user_errors(mock_shop):
+    bulk, shop = mock_shop
+    before = len(shop.products)
+
+    stats = bulk.create_products([
+        {"product": {"title": "Kit arrastre CB190R", "tags": "kaiqi, arrastre",
+                     "variants": [{"sku": "KQ-1", "price": 120000}],
+                     "images": [{"src": "https://cdn.example.com/kq-1.jpg"}]}},
+        {"title": "", "variants": [{"sku": "KQ-2", "price": 1}]},
+        {"title": "Pastilla freno NKD", "variants": [{"sku": "KQ-3", "price": 15000}]},
+    ])
+
+    assert stats["created"] == 2
+    assert len(stats["errors"]) == 1
+    assert "línea 1" in stats["errors"][0]
+    assert "Title can't be blank" in stats["errors"][0]
+    assert len(shop.products) == before + 2
+
+    created = [p for p in shop.products.values() if p["title"] == "Kit arrastre CB190R"][0]
+    assert created["tags"] == ["kaiqi", "arrastre"]
+    assert created["variants"][0]["sku"] == "KQ-1"
+    assert created["images"][0]["url"] == "https://cdn.example.com/kq-1.jpg"
+
+
+def test_empty_variables_skip_the_operation(mock_shop):
+    bulk, shop = mock_shop
+
+    assert bulk.delete_products([]) == {"deleted": 0, "errors": []}
+    assert bulk.create_products([]) == {"created": 0, "errors": []}
+    assert bulk.delete_images([]) == {"deleted": 0, "errors": []}
+    assert shop.operations == {}
+    assert shop.uploads == {}
@@ -0,0 +1,46 @@
+import pytest
+
+from odi_shopify_sync import product_content_hash
+
+
+def payload(**variant):
+    base = {"sku": "KQ-001", "price": "10000", "compare_at_price": "12000",
+            "inventory_quantity": 5, "weight": 1.5, "weight_unit": "kg"}
+    return {
+        "product": {
+            "title": "Filtro de aceite",
+            "body_html": "<p>Filtro</p>",
+            "vendor": "KAIQI",
+            "product_type": "Filtros",
+            "tags": "filtro, aceite",
+            "variants": [dict(base, **variant)],
+            "images": [{"src": "https://cdn.example.com/a.jpg"}],
+        }
+    }
+
+
+@pytest.mark.parametrize("variant", [
+    {"price": "11000"},
+    {"compare_at_price": "13000"},
+    {"compare_at_price": None},
+    {"inventory_quantity": 0},
+    {"weight": 2},
+    {"weight_unit": "g"},
+])
+def test_written_variant_fields_change_hash(variant):
+    assert product_content_hash(payload(**variant)) != product_content_hash(payload())
+
+
+def test_images_change_hash():
+    changed = payload()
+    changed["product"]["images"] = [{"src": "https://cdn.example.com/b.jpg"}]
+    assert product_content_hash(changed) != product_content_hash(payload())
+    changed["product"]["images"] = []
+    assert product_content_hash(changed) != product_content_hash(payload())
+
+
+def test_equivalent_payloads_share_hash():
+    shopify_side = payload(price=10000.0, compare_at_price="12000.00", weight="1.50")["product"]
+    shopify_side["tags"] = ["aceite", "filtro"]
+    assert product_content_hash(shopify_side) == product_content_hash(payload())
+    assert product_content_hash(payload(weight=0, weight_unit="kg")) == product_content_hash(payload(weight=None, weight_unit=None))
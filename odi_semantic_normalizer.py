@@ -142,6 +142,13 @@ MODEL_PATTERNS = [
     r'\b(gsx|gixxer|burgman|access|intruder)\s*(\d{2,3})\b',          # Suzuki
 ]
 
+# Modelos que el parser detecta como "marca" → marca real (índice de fitment)
+BRAND_ALIASES = {
+    'PULSAR': 'BAJAJ',
+    'CF MOTO': 'CFMOTO',
+    'HARLEY': 'HARLEY-DAVIDSON',
+}
+
 # Patrones de cilindraje
 CC_PATTERNS = [
     r'(\d{2,4})\s*cc\b',
@@ -393,6 +400,48 @@ class FitmentParser:
         return results
 
 
+def fitment_key(value: str) -> str:
+    """Clave normalizada para el índice de fitment (CB 190 == cb-190 == CB190)."""
+    return re.sub(r'[^A-Z0-9]', '', normalize_text(value).upper())
+
+
+def build_fitment_index(fitment: Dict[str, FitmentData]) -> Dict[str, Any]:
+    """
+    Construye el índice compacto de compatibilidad para la API.
+
+    Estructura: marca → modelo → cilindraje → [SKUs]. Los niveles no
+    detectados se guardan bajo "*" (el producto aplica a cualquier valor).
+    Los rangos de año van aparte por SKU para no inflar el árbol.
+    """
+    tree: Dict[str, Dict[str, Dict[str, List[str]]]] = {}
+    years: Dict[str, List[int]] = {}
+    labels: Dict[str, str] = {}
+
+    for sku, fit in fitment.items():
+        brand = fitment_key(fit.marca)
+        brand = fitment_key(BRAND_ALIASES.get(brand, brand)) or '*'
+        model = fitment_key(fit.modelo) or '*'
+        cc = re.sub(r'\D', '', fit.cilindraje) or '*'
+        tree.setdefault(brand, {}).setdefault(model, {}).setdefault(cc, []).append(str(sku))
+
+        if fit.modelo:
+            labels[model] = fit.modelo
+        if fit.año_inicio:
+            start = int(fit.año_inicio)
+            end = int(fit.año_fin) if fit.año_fin else start
+            years[str(sku)] = [start, end]
+
+    return {
+        'version': 1,
+        'generated_at': datetime.now().isoformat(),
+        'total_skus': len(fitment),
+        'index': tree,
+        'years': years,
+        'model_labels': labels,
+        'brand_aliases': {fitment_key(k): fitment_key(v) for k, v in BRAND_ALIASES.items()},
+    }
+
+
 # =============================================================================
 # VARIANT PRE-CLASSIFIER (v1.2)
 # =============================================================================
@@ -1636,6 +1685,13 @@ class SemanticNormalizer:
 
         print(f"💾 Metadata: {metadata_file}")
 
+        # Índice de fitment para la API (/v1/fitment)
+        fitment_index_file = output_dir / f"{base_name}_fitment_index.json"
+        with open(fitment_index_file, 'w', encoding='utf-8') as f:
+            json.dump(build_fitment_index(fitment), f, ensure_ascii=False, separators=(',', ':'))
+
+        print(f"💾 Fitment index: {fitment_index_file}")
+
     def _count_by_field(self, fitment: Dict[str, FitmentData], field: str) -> Dict[str, int]:
         """Cuenta ocurrencias por campo."""
         counts = defaultdict(int)
@@ -1,27 +1,19 @@
-import os
-import pandas as pd
+from catalog_store import get_catalog_store, default_catalog_path
 
 class ProductService:
     def __init__(self):
-        base = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-        path = os.path.join(base, "output", "catalog", "catalogo_adsi_master.csv")
-        self.df = pd.read_csv(path) if os.path.exists(path) else pd.DataFrame()
+        self.store = get_catalog_store(default_catalog_path())
 
-    # Buscar por SKU exacto
+    # Buscar por SKU exacto (índice SKU → fila)
     def get_product_by_sku(self, sku):
-        f = self.df[self.df["sku"] == sku]
-        if not f.empty:
-            return f.to_dict("records")[0]
-        return None
+        snapshot = self.store.snapshot()
+        if snapshot is None:
+            return None
+        return snapshot.get(sku)
 
-    # Búsqueda global
+    # Búsqueda global (índice de tokens + verificación por subcadena)
     def search(self, q, limit=50):
-        q = q.upper()
-
-        df = self.df[
-            self.df["descripcion"].str.upper().str.contains(q, na=False) |
-            self.df["codigo"].astype(str).str.contains(q, na=False) |
-            self.df["sku"].astype(str).str.contains(q, na=False)
-        ]
-
-        return df.head(limit).to_dict("records")
+        snapshot = self.store.snapshot()
+        if snapshot is None:
+            return []
+        return snapshot.search(q.upper(), limit)
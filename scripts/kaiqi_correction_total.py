@@ -9,11 +9,17 @@ Ejecutar: python3 /opt/odi/scripts/kaiqi_correction_total.py
 import requests
 import subprocess
 import json
-import time
 import os
+import sys
 import base64
 from collections import defaultdict, Counter
 
+# Motor de sync compartido (deploy: /opt/odi/core; repo: odi_production/core)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "odi_production", "core"))
+sys.path.insert(0, "/opt/odi/core")
+from odi_shopify_sync import ShopifySyncEngine
+from odi_shopify_bulk import ShopifyBulkClient
+
 
 def get_credentials():
     """Obtener credenciales de .env"""
@@ -28,16 +34,9 @@ def get_credentials():
 
 
 def get_all_products(shop_url, headers_get):
-    """Obtener todos los productos"""
-    products = []
-    url = f"https://{shop_url}/admin/api/2024-01/products.json?limit=250"
-    while url:
-        r = requests.get(url, headers=headers_get)
-        data = r.json()
-        products.extend(data.get("products", []))
-        link = r.headers.get("Link", "")
-        url = link.split("<")[1].split(">")[0] if 'rel="next"' in link else None
-    return products
+    """Obtener todos los productos (exportación bulk, JSONL leído en streaming)"""
+    bulk = ShopifyBulkClient(shop_url, headers_get["X-Shopify-Access-Token"])
+    return list(bulk.export_products())
 
 
 def paso1_eliminar_duplicados(shop_url, headers, headers_get):
@@ -71,15 +70,12 @@ def paso1_eliminar_duplicados(shop_url, headers, headers_get):
 
     print(f"Productos a eliminar: {len(to_delete)}")
 
-    # Eliminar
-    deleted = 0
-    for pid in to_delete:
-        r = requests.delete(f"https://{shop_url}/admin/api/2024-01/products/{pid}.json", headers=headers)
-        if r.status_code == 200:
-            deleted += 1
-        else:
-            print(f"  Error eliminando {pid}: {r.status_code}")
-        time.sleep(0.5)
+    # Eliminar (una sola operación bulk)
+    bulk = ShopifyBulkClient(shop_url, headers["X-Shopify-Access-Token"])
+    result = bulk.delete_products(to_delete)
+    deleted = result["deleted"]
+    for e in result["errors"]:
+        print(f"  Error eliminando: {e}")
 
     print(f"✅ Eliminados: {deleted}/{len(to_delete)}")
     return deleted
@@ -105,18 +101,12 @@ def paso2_limpiar_imagenes(shop_url, headers, headers_get):
 
     print(f"Imágenes contaminadas: {len(contaminated)}")
 
-    # Eliminar
-    removed = 0
-    for item in contaminated:
-        p = item["product"]
-        img = item["image"]
-        r = requests.delete(
-            f"https://{shop_url}/admin/api/2024-01/products/{p['id']}/images/{img['id']}.json",
-            headers=headers
-        )
-        if r.status_code == 200:
-            removed += 1
-        time.sleep(0.3)
+    # Eliminar (una sola operación bulk, agrupada por producto)
+    bulk = ShopifyBulkClient(shop_url, headers["X-Shopify-Access-Token"])
+    result = bulk.delete_images((item["product"]["id"], item["image"]["id"]) for item in contaminated)
+    removed = result["deleted"]
+    for e in result["errors"]:
+        print(f"  Error eliminando imagen: {e}")
 
     print(f"✅ Imágenes eliminadas: {removed}")
     return removed
@@ -187,18 +177,13 @@ def paso3_completar_descripciones(shop_url, headers, headers_get):
 
     print(f"Descripciones incompletas: {len(incomplete)}")
 
-    # Actualizar
-    updated = 0
-    for p in incomplete:
-        new_body = generate_body(p)
-        r = requests.put(
-            f"https://{shop_url}/admin/api/2024-01/products/{p['id']}.json",
-            headers=headers,
-            json={"product": {"id": p["id"], "body_html": new_body}}
-        )
-        if r.status_code == 200:
-            updated += 1
-        time.sleep(0.5)
+    # Actualizar solo las que cambian (PUTs concurrentes bajo el rate limit)
+    pending = [(p, generate_body(p)) for p in incomplete]
+    pending = [(p, body) for p, body in pending if body != (p.get("body_html") or "")]
+
+    engine = ShopifySyncEngine(shop_url, headers["X-Shopify-Access-Token"])
+    results = engine.run(pending, lambda item: engine.update_fields(item[0]["id"], {"body_html": item[1]}))
+    updated = sum(1 for _, _, err in results if err is None)
 
     print(f"✅ Descripciones actualizadas: {updated}/{len(incomplete)}")
     return updated
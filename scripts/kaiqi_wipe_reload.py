@@ -13,13 +13,19 @@ import requests
 import subprocess
 import json
 import os
-import time
+import sys
 import base64
 import csv
 import re
 import glob
 from collections import Counter, defaultdict
 
+# Motor de sync compartido (deploy: /opt/odi/core; repo: odi_production/core)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "odi_production", "core"))
+sys.path.insert(0, "/opt/odi/core")
+from odi_shopify_sync import ShopifySyncEngine
+from odi_shopify_bulk import ShopifyBulkClient
+
 
 def get_credentials():
     """Obtener credenciales de .env"""
@@ -34,16 +40,9 @@ def get_credentials():
 
 
 def get_all_products(shop_url, headers_get):
-    """Obtener todos los productos"""
-    products = []
-    url = f"https://{shop_url}/admin/api/2024-01/products.json?limit=250"
-    while url:
-        r = requests.get(url, headers=headers_get)
-        data = r.json()
-        products.extend(data.get("products", []))
-        link = r.headers.get("Link", "")
-        url = link.split("<")[1].split(">")[0] if 'rel="next"' in link else None
-    return products
+    """Obtener todos los productos (exportación bulk, JSONL leído en streaming)"""
+    bulk = ShopifyBulkClient(shop_url, headers_get["X-Shopify-Access-Token"])
+    return list(bulk.export_products())
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -61,23 +60,14 @@ def fase1_wipe_total(shop_url, headers):
 
     print(f"Productos a eliminar: {len(products)}")
 
-    deleted = 0
-    errors = 0
-    for p in products:
-        r = requests.delete(
-            f"https://{shop_url}/admin/api/2024-01/products/{p['id']}.json",
-            headers=headers
-        )
-        if r.status_code == 200:
-            deleted += 1
-        else:
-            errors += 1
-        if deleted % 50 == 0 and deleted > 0:
-            print(f"  Eliminados: {deleted}/{len(products)}")
-        time.sleep(0.5)
+    # Una sola operación bulk en vez de un DELETE por producto
+    bulk = ShopifyBulkClient(shop_url, headers["X-Shopify-Access-Token"])
+    result = bulk.delete_products(p["id"] for p in products)
 
-    print(f"\n✅ Eliminados: {deleted}")
-    print(f"❌ Errores: {errors}")
+    print(f"\n✅ Eliminados: {result['deleted']}")
+    print(f"❌ Errores: {len(result['errors'])}")
+    for e in result["errors"][:5]:
+        print(f"  {e}")
 
     # Verificar
     r = requests.get(
@@ -470,11 +460,11 @@ def fase3_cargar_shopify(shop_url, headers, catalog):
 
     print(f"Productos a cargar: {len(catalog)}")
 
-    created = 0
-    errors = 0
-    error_list = []
+    engine = ShopifySyncEngine(shop_url, headers["X-Shopify-Access-Token"])
+    # Tras el wipe: reconstrucción completa para no resolver contra IDs borrados
+    engine.index.refresh(full=True)
 
-    for i, product in enumerate(catalog):
+    def cargar(product):
         # Limpiar campos internos
         local_img = product.pop("_local_image", None)
         product.pop("_has_vision", None)
@@ -492,36 +482,24 @@ def fase3_cargar_shopify(shop_url, headers, catalog):
             except:
                 pass
 
-        # Crear producto
-        r = requests.post(
-            f"https://{shop_url}/admin/api/2024-01/products.json",
-            headers=headers,
-            json={"product": product}
-        )
-
-        if r.status_code == 201:
-            created += 1
-        else:
-            errors += 1
-            if errors <= 5:
-                error_list.append({
-                    "title": product.get("title", "")[:50],
-                    "status": r.status_code,
-                    "error": r.text[:100]
-                })
+        # Crear producto (o actualizar si ya existe y cambió)
+        return engine.upsert(product)
 
-        if (i + 1) % 25 == 0:
-            print(f"  Progreso: {created} creados, {errors} errores de {i+1}")
+    def progreso(done, total):
+        if done % 25 == 0:
+            print(f"  Progreso: {done}/{total}")
 
-        time.sleep(0.5)
+    results = engine.run(catalog, cargar, progreso)
+    created = sum(1 for _, outcome, _ in results if outcome == "created")
+    error_list = [(product, err) for product, _, err in results if err]
 
     print(f"\n✅ Creados: {created}/{len(catalog)}")
-    print(f"❌ Errores: {errors}")
+    print(f"❌ Errores: {len(error_list)}")
 
     if error_list:
         print(f"\nPrimeros errores:")
-        for e in error_list:
-            print(f"  {e['title']}: {e['status']} - {e['error']}")
+        for product, err in error_list[:5]:
+            print(f"  {product.get('title', '')[:50]}: {str(err)[:100]}")
 
     return created
 
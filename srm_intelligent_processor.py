@@ -38,18 +38,20 @@ import csv
 import base64
 import time
 import hashlib
+import shutil
 import tempfile
 import zipfile
 import mimetypes
 import urllib.parse
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict, Tuple, Optional, Any, Union
+from typing import List, Dict, Tuple, Optional, Any, Union, Callable
 from dataclasses import dataclass, field, asdict
 from abc import ABC, abstractmethod
 import subprocess
 import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial, lru_cache
 from dotenv import load_dotenv
 
 # Cargar variables de entorno
@@ -103,6 +105,16 @@ except ImportError:
     EMITTER_AVAILABLE = False
     ODIEventEmitter = None
 
+# Motor de sync Shopify (índice SKU local + upserts diff-only). Deploy: junto
+# a este script; repo: odi_production/core
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "odi_production", "core"))
+try:
+    from odi_shopify_sync import ShopifySyncEngine
+    SHOPIFY_SYNC_AVAILABLE = True
+except ImportError:
+    SHOPIFY_SYNC_AVAILABLE = False
+    ShopifySyncEngine = None
+
 # Imports opcionales
 try:
     import cv2
@@ -157,6 +169,18 @@ RETRY_DELAY = 2
 # AI Provider Selection
 AI_PROVIDER = os.getenv('AI_PROVIDER', 'OPENAI').upper()
 
+# Ingesta concurrente (miembros de ZIP y fuentes múltiples)
+INGEST_WORKERS = int(os.getenv('SRM_INGEST_WORKERS', '4'))
+AI_CONCURRENCY = int(os.getenv('SRM_AI_CONCURRENCY', '4'))   # Llamadas AI simultáneas (todos los hilos)
+ZIP_MAX_MEMBERS = 500
+ZIP_CHUNK_SIZE = 1024 * 1024
+
+# Clasificación: descripciones distintas recordadas por detector
+CATEGORY_CACHE_SIZE = 65536
+
+# Límite compartido de llamadas AI entre procesadores y workers
+_AI_SLOTS = threading.BoundedSemaphore(AI_CONCURRENCY)
+
 
 # ============================================================================
 # CONFIGURACIÓN MULTI-TENANT
@@ -340,6 +364,7 @@ class Logger:
     def __init__(self, verbose: bool = True):
         self.verbose = verbose
         self.start_time = time.time()
+        self._lock = threading.Lock()   # Workers de ingesta escriben en paralelo
 
     def log(self, msg: str, level: str = 'info'):
         if not self.verbose and level == 'debug':
@@ -347,7 +372,8 @@ class Logger:
         color, icon = self.LEVELS.get(level, (Colors.RESET, ''))
         ts = datetime.now().strftime('%H:%M:%S')
         prefix = f"{icon} " if icon else ""
-        print(f"{color}[{ts}] {prefix}{msg}{Colors.RESET}", flush=True)
+        with self._lock:
+            print(f"{color}[{ts}] {prefix}{msg}{Colors.RESET}", flush=True)
 
     def step(self, step_num: int, total: int, name: str):
         print(f"\n{Colors.BOLD}{'='*60}")
@@ -410,12 +436,33 @@ def clean_price(value: Any) -> float:
 # ============================================================================
 
 class IndustryDetector:
-    """Detecta automáticamente la industria del contenido."""
+    """
+    Detecta automáticamente la industria del contenido.
+
+    Las categorías se precompilan por industria: detect_category() cachea
+    por descripción y detect_categories() clasifica columnas completas de un
+    DataFrame con un escaneo por keyword sobre todas las filas a la vez.
+    """
 
     def __init__(self):
         self.industries = INDUSTRIES
         self.clients = CLIENTS
 
+        # Por industria: [(keyword, patrón literal, rango)] en orden de categoría
+        # (gana la primera categoría con algún keyword presente) y sus etiquetas
+        self._category_keywords: Dict[str, List[Tuple[str, re.Pattern, int]]] = {}
+        self._category_labels: Dict[str, List[str]] = {}
+        for industry_id, config in self.industries.items():
+            categories = config.get('categories', {})
+            self._category_labels[industry_id] = [c.upper().replace('_', ' ') for c in categories]
+            self._category_keywords[industry_id] = [
+                (keyword, re.compile(re.escape(keyword)), rank)
+                for rank, keywords in enumerate(categories.values())
+                for keyword in keywords
+            ]
+
+        self._category_cache = lru_cache(maxsize=CATEGORY_CACHE_SIZE)(self._match_category)
+
     def detect_industry(self, text: str, filename: str = "") -> Tuple[str, float]:
         """Detecta la industria basándose en keywords."""
         text_lower = (text + " " + filename).lower()
@@ -460,15 +507,37 @@ class IndustryDetector:
         return None, 0.0
 
     def detect_category(self, text: str, industry: str) -> str:
-        """Detecta categoría dentro de la industria."""
+        """Detecta categoría dentro de la industria (cacheado por texto)."""
+        return self._category_cache(text, industry)
+
+    def detect_categories(self, values: pd.Series, industry: str) -> pd.Series:
+        """
+        Clasifica una columna completa. Las descripciones distintas se unen en
+        un solo texto y cada keyword se busca una vez sobre todo él; cada
+        coincidencia se asigna a su fila y por fila gana la categoría de menor
+        rango, igual que detect_category().
+        """
+        codes, uniques = pd.factorize(values.astype(str))
+        labels = self._category_labels.get(industry, []) + ["OTROS"]
+        best = np.full(len(uniques), len(labels) - 1, dtype=np.int64)
+
+        if len(uniques) and len(labels) > 1:
+            texts = [u.lower() for u in uniques]
+            blob = "\x00".join(texts)
+            starts = np.cumsum([0] + [len(t) + 1 for t in texts[:-1]])
+            for _, pattern, rank in self._category_keywords[industry]:
+                positions = [m.start() for m in pattern.finditer(blob)]
+                if positions:
+                    rows = np.searchsorted(starts, positions, side='right') - 1
+                    np.minimum.at(best, rows, rank)
+
+        return pd.Series(np.array(labels, dtype=object)[best][codes], index=values.index, dtype=object)
+
+    def _match_category(self, text: str, industry: str) -> str:
         text_lower = text.lower()
-        industry_config = self.industries.get(industry, {})
-        categories = industry_config.get('categories', {})
-
-        for category, keywords in categories.items():
-            for keyword in keywords:
-                if keyword in text_lower:
-                    return category.upper().replace('_', ' ')
+        for keyword, _, rank in self._category_keywords.get(industry, []):
+            if keyword in text_lower:
+                return self._category_labels[industry][rank]
 
         return "OTROS"
 
@@ -585,46 +654,47 @@ class AIClient:
 
         for attempt in range(MAX_RETRIES):
             try:
-                if self.provider == 'OPENAI':
-                    response = self.client.chat.completions.create(
-                        model=VISION_MODEL,
-                        messages=[{
-                            "role": "user",
-                            "content": [
-                                {"type": "text", "text": prompt},
-                                {"type": "image_url", "image_url": {
-                                    "url": f"data:image/jpeg;base64,{image_b64}",
-                                    "detail": "high"
-                                }}
-                            ]
-                        }],
-                        max_tokens=MAX_TOKENS,
-                        response_format={"type": "json_object"}
-                    )
-                    return json.loads(response.choices[0].message.content)
-
-                elif self.provider == 'ANTHROPIC':
-                    response = self.client.messages.create(
-                        model="claude-3-5-sonnet-20241022",
-                        max_tokens=MAX_TOKENS,
-                        messages=[{
-                            "role": "user",
-                            "content": [
-                                {"type": "image", "source": {
-                                    "type": "base64",
-                                    "media_type": "image/jpeg",
-                                    "data": image_b64
-                                }},
-                                {"type": "text", "text": prompt + "\n\nResponde SOLO JSON válido."}
-                            ]
-                        }]
-                    )
-                    # Extraer JSON de la respuesta
-                    text = response.content[0].text
-                    json_match = re.search(r'\{.*\}', text, re.DOTALL)
-                    if json_match:
-                        return json.loads(json_match.group())
-                    return {}
+                with _AI_SLOTS:
+                    if self.provider == 'OPENAI':
+                        response = self.client.chat.completions.create(
+                            model=VISION_MODEL,
+                            messages=[{
+                                "role": "user",
+                                "content": [
+                                    {"type": "text", "text": prompt},
+                                    {"type": "image_url", "image_url": {
+                                        "url": f"data:image/jpeg;base64,{image_b64}",
+                                        "detail": "high"
+                                    }}
+                                ]
+                            }],
+                            max_tokens=MAX_TOKENS,
+                            response_format={"type": "json_object"}
+                        )
+                        return json.loads(response.choices[0].message.content)
+
+                    elif self.provider == 'ANTHROPIC':
+                        response = self.client.messages.create(
+                            model="claude-3-5-sonnet-20241022",
+                            max_tokens=MAX_TOKENS,
+                            messages=[{
+                                "role": "user",
+                                "content": [
+                                    {"type": "image", "source": {
+                                        "type": "base64",
+                                        "media_type": "image/jpeg",
+                                        "data": image_b64
+                                    }},
+                                    {"type": "text", "text": prompt + "\n\nResponde SOLO JSON válido."}
+                                ]
+                            }]
+                        )
+                        # Extraer JSON de la respuesta
+                        text = response.content[0].text
+                        json_match = re.search(r'\{.*\}', text, re.DOTALL)
+                        if json_match:
+                            return json.loads(json_match.group())
+                        return {}
 
             except Exception as e:
                 if 'rate_limit' in str(e).lower():
@@ -639,26 +709,27 @@ class AIClient:
         """Analiza texto con LLM."""
         for attempt in range(MAX_RETRIES):
             try:
-                if self.provider == 'OPENAI':
-                    response = self.client.chat.completions.create(
-                        model=TEXT_MODEL,
-                        messages=[{"role": "user", "content": f"{prompt}\n\nTEXTO:\n{text[:10000]}"}],
-                        response_format={"type": "json_object"},
-                        max_tokens=2000
-                    )
-                    return json.loads(response.choices[0].message.content)
-
-                elif self.provider == 'ANTHROPIC':
-                    response = self.client.messages.create(
-                        model="claude-3-5-sonnet-20241022",
-                        max_tokens=2000,
-                        messages=[{"role": "user", "content": f"{prompt}\n\nTEXTO:\n{text[:10000]}\n\nResponde SOLO JSON."}]
-                    )
-                    text_resp = response.content[0].text
-                    json_match = re.search(r'\{.*\}', text_resp, re.DOTALL)
-                    if json_match:
-                        return json.loads(json_match.group())
-                    return {}
+                with _AI_SLOTS:
+                    if self.provider == 'OPENAI':
+                        response = self.client.chat.completions.create(
+                            model=TEXT_MODEL,
+                            messages=[{"role": "user", "content": f"{prompt}\n\nTEXTO:\n{text[:10000]}"}],
+                            response_format={"type": "json_object"},
+                            max_tokens=2000
+                        )
+                        return json.loads(response.choices[0].message.content)
+
+                    elif self.provider == 'ANTHROPIC':
+                        response = self.client.messages.create(
+                            model="claude-3-5-sonnet-20241022",
+                            max_tokens=2000,
+                            messages=[{"role": "user", "content": f"{prompt}\n\nTEXTO:\n{text[:10000]}\n\nResponde SOLO JSON."}]
+                        )
+                        text_resp = response.content[0].text
+                        json_match = re.search(r'\{.*\}', text_resp, re.DOTALL)
+                        if json_match:
+                            return json.loads(json_match.group())
+                        return {}
 
             except Exception as e:
                 log.log(f"Error AI texto: {str(e)[:50]}", "warning")
@@ -773,7 +844,8 @@ class PDFProcessor(BaseProcessor):
 
         try:
             ai = self._get_ai_client()
-            pages_dir = ensure_dir(os.path.join(self.output_dir, "pages"))
+            # Varios PDFs en paralelo (ZIP / fuentes múltiples): páginas por documento
+            pages_dir = ensure_dir(os.path.join(self.output_dir, "pages", self.config.get('source_tag', '')))
             crops_dir = ensure_dir(os.path.join(self.output_dir, "crops"))
 
             # Obtener páginas a procesar
@@ -933,7 +1005,9 @@ RESPONDE JSON: {{"productos": [...]}}"""
                     continue
 
                 crop_img = img[y:y+h, x:x+w]
-                filename = f"{self.prefix}_p{page_num:03d}_c{i+1:02d}.jpg"
+                tag = self.config.get('source_tag')
+                crop_prefix = f"{self.prefix}_{tag}" if tag else self.prefix
+                filename = f"{crop_prefix}_p{page_num:03d}_c{i+1:02d}.jpg"
                 path = os.path.join(output_dir, filename)
                 cv2.imwrite(path, crop_img, [cv2.IMWRITE_JPEG_QUALITY, 90])
 
@@ -1040,16 +1114,19 @@ class ExcelProcessor(BaseProcessor):
                     mapped[field] = opt
                     break
 
+        # Categorías de toda la columna en una pasada
+        if 'categoria' in mapped:
+            categorias = self.detector.detect_categories(df[mapped['categoria']], industry).tolist()
+        else:
+            categorias = [self.detector.detect_category('', industry)] * len(df)
+
         products = []
-        for _, row in df.iterrows():
+        for row, categoria in zip(df.to_dict('records'), categorias):
             product = ProductData(
                 codigo=clean_text(row.get(mapped.get('codigo', ''), '')),
                 nombre=clean_text(row.get(mapped.get('nombre', ''), '')),
                 precio=clean_price(row.get(mapped.get('precio', ''), 0)),
-                categoria=self.detector.detect_category(
-                    str(row.get(mapped.get('categoria', ''), '')),
-                    industry
-                ),
+                categoria=categoria,
                 marca=clean_text(row.get(mapped.get('marca', ''), '')),
                 stock=int(row.get(mapped.get('stock', ''), 0) or 0),
                 fuente=source
@@ -1257,43 +1334,132 @@ RESPONDE JSON: {"productos": [{"codigo": "", "nombre": "", "descripcion": "", "p
 
 
 class ZIPProcessor(BaseProcessor):
-    """Procesa archivos ZIP."""
+    """
+    Procesa archivos ZIP sin extraerlos completos. Cada miembro se lee en
+    streaming a disco justo antes de procesarlo, en un pool de workers; las
+    imágenes quedan en extracted/ (son las fotos de producto) y los demás
+    temporales se borran al terminar cada miembro.
+    """
 
     def process(self, filepath: str) -> ProcessingResult:
         log.log(f"Procesando ZIP: {Path(filepath).name}", "step")
-        result = ProcessingResult(source_file=filepath, source_type="zip")
+        start_time = time.time()
 
         try:
-            extract_dir = ensure_dir(os.path.join(self.output_dir, "extracted"))
-
             with zipfile.ZipFile(filepath, 'r') as zip_ref:
-                zip_ref.extractall(extract_dir)
-
-            for root, dirs, files in os.walk(extract_dir):
-                for file in files[:500]:
-                    file_path = os.path.join(root, file)
-                    file_type = detect_file_type(file_path)
-
-                    if file_type == 'unknown':
-                        continue
-
-                    processor = get_processor(file_type, self.config)
-                    if processor:
-                        sub_result = processor.process(file_path)
-                        result.products.extend(sub_result.products)
-
-                        if not result.detected_industry and sub_result.detected_industry:
-                            result.detected_industry = sub_result.detected_industry
-
+                members = [
+                    (info, detect_file_type(info.filename))
+                    for info in zip_ref.infolist()
+                    if not info.is_dir() and self._member_path(info.filename)
+                ]
+            members = [(info, t) for info, t in members if t != 'unknown'][:ZIP_MAX_MEMBERS]
+            workers = self.config.get('workers', INGEST_WORKERS)
+            log.log(f"   Miembros: {len(members)} ({workers} workers)")
+
+            self._handles: List[zipfile.ZipFile] = []
+            self._handles_lock = threading.Lock()
+            local = threading.local()
+            spool_dir = tempfile.mkdtemp(prefix="srm_zip_", dir=ensure_dir(DEFAULT_TEMP_DIR))
+            try:
+                tasks = [
+                    partial(self._process_member, filepath, local, spool_dir, index, info, file_type)
+                    for index, (info, file_type) in enumerate(members)
+                ]
+                results = run_parallel(tasks, workers)
+            finally:
+                for handle in self._handles:
+                    handle.close()
+                shutil.rmtree(spool_dir, ignore_errors=True)
+
+            result = merge_results(results, filepath, "zip")
             result.success = True
             log.log(f"   Total: {len(result.products)} productos", "success")
 
         except Exception as e:
-            result.errors.append(str(e))
+            result = ProcessingResult(source_file=filepath, source_type="zip", errors=[str(e)])
             log.log(f"Error: {e}", "error")
 
+        result.processing_time = time.time() - start_time
         return result
 
+    @staticmethod
+    def _member_path(name: str) -> Optional[str]:
+        """Ruta relativa segura del miembro (None para metadatos o rutas fuera del ZIP)."""
+        path = os.path.normpath(name)
+        if os.path.isabs(path) or path.startswith('..') or path.startswith('__MACOSX'):
+            return None
+        if os.path.basename(path).startswith('.'):
+            return None
+        return path
+
+    def _process_member(self, zip_path: str, local: threading.local, spool_dir: str,
+                        index: int, info: zipfile.ZipInfo, file_type: str) -> ProcessingResult:
+        # Un ZipFile por hilo: las lecturas concurrentes no comparten posición
+        zip_ref = getattr(local, 'zip_ref', None)
+        if zip_ref is None:
+            zip_ref = local.zip_ref = zipfile.ZipFile(zip_path, 'r')
+            with self._handles_lock:
+                self._handles.append(zip_ref)
+
+        keep = file_type == 'image'
+        if keep:
+            target = os.path.join(self.output_dir, "extracted", self._member_path(info.filename))
+        else:
+            target = os.path.join(spool_dir, f"{index:04d}", os.path.basename(info.filename))
+        ensure_dir(os.path.dirname(target))
+
+        with zip_ref.open(info) as src, open(target, 'wb') as dst:
+            shutil.copyfileobj(src, dst, ZIP_CHUNK_SIZE)
+
+        try:
+            tag = f"{self.config.get('source_tag', '')}z{index:04d}"
+            processor = get_processor(file_type, dict(self.config, source_tag=tag))
+            if not processor:
+                return ProcessingResult(source_file=info.filename, source_type=file_type)
+            return processor.process(target)
+        finally:
+            if not keep:
+                try:
+                    os.remove(target)
+                except OSError:
+                    pass
+
+
+# ============================================================================
+# EJECUCIÓN CONCURRENTE
+# ============================================================================
+
+def run_parallel(tasks: List[Callable[[], ProcessingResult]], workers: int = INGEST_WORKERS) -> List[ProcessingResult]:
+    """Ejecuta tareas de procesamiento en un pool; resultados en el orden de entrada."""
+    results: List[Optional[ProcessingResult]] = [None] * len(tasks)
+    if not tasks:
+        return []
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(tasks)))) as pool:
+        futures = {pool.submit(task): i for i, task in enumerate(tasks)}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                results[i] = ProcessingResult(errors=[str(e)])
+
+    return results
+
+
+def merge_results(results: List[ProcessingResult], source_file: str, source_type: str) -> ProcessingResult:
+    """Une resultados en orden: productos concatenados, primera industria/cliente detectados."""
+    merged = ProcessingResult(source_file=source_file, source_type=source_type)
+    for sub in results:
+        merged.products.extend(sub.products)
+        merged.errors.extend(f"{Path(sub.source_file).name}: {e}" if sub.source_file else e for e in sub.errors)
+        if not merged.detected_industry and sub.detected_industry:
+            merged.detected_industry = sub.detected_industry
+        if not merged.detected_client and sub.detected_client:
+            merged.detected_client = sub.detected_client
+    merged.success = any(sub.success for sub in results)
+    return merged
+
 
 # ============================================================================
 # FACTORY
@@ -1341,19 +1507,20 @@ class SRMPipeline:
         else:
             self.emitter = None
 
-    def process(self, source: str) -> Tuple[str, str]:
-        """Ejecuta pipeline completo."""
+    def process(self, source: Union[str, List[str]]) -> Tuple[str, str]:
+        """Ejecuta pipeline completo (una fuente o varias, ingeridas en paralelo)."""
+        sources = [source] if isinstance(source, str) else list(source)
         self._print_banner()
 
         # === EMIT: Pipeline Start ===
         if self.emitter:
-            self.emitter.srm_pipeline_start(source)
+            self.emitter.srm_pipeline_start(", ".join(sources))
 
         # 1. INGESTA
         log.step(1, 6, "INGESTA")
         if self.emitter:
-            self.emitter.srm_step(1, "INGESTA", {"source": os.path.basename(source)})
-        result = self._ingest(source)
+            self.emitter.srm_step(1, "INGESTA", {"source": ", ".join(os.path.basename(s) for s in sources)})
+        result = self._ingest(sources)
 
         if not result.success:
             log.log(f"Error: {result.errors}", "error")
@@ -1421,20 +1588,34 @@ class SRMPipeline:
         self._print_summary(csv_path, json_path)
         return csv_path, json_path
 
-    def _ingest(self, source: str) -> ProcessingResult:
+    def _ingest(self, sources: List[str]) -> ProcessingResult:
+        if len(sources) == 1:
+            return self._ingest_one(sources[0])
+
+        workers = self.config.get('workers', INGEST_WORKERS)
+        log.log(f"Fuentes: {len(sources)} ({workers} workers)")
+        tasks = [partial(self._ingest_one, source, f"s{i:02d}") for i, source in enumerate(sources)]
+        result = merge_results(run_parallel(tasks, workers), ", ".join(sources), "multi")
+        if not result.success:
+            log.log("Ninguna fuente procesada", "warning")
+        return result
+
+    def _ingest_one(self, source: str, tag: Optional[str] = None) -> ProcessingResult:
+        config = dict(self.config, source_tag=tag) if tag else self.config
+
         if source.startswith('http://') or source.startswith('https://'):
-            processor = URLProcessor(self.config)
+            processor = URLProcessor(config)
             return processor.process(source)
 
         if not os.path.exists(source):
-            return ProcessingResult(errors=[f"Archivo no encontrado: {source}"])
+            return ProcessingResult(source_file=source, errors=[f"Archivo no encontrado: {source}"])
 
         file_type = detect_file_type(source)
         log.log(f"Tipo: {file_type}")
 
-        processor = get_processor(file_type, self.config)
+        processor = get_processor(file_type, config)
         if not processor:
-            return ProcessingResult(errors=[f"Tipo no soportado: {file_type}"])
+            return ProcessingResult(source_file=source, errors=[f"Tipo no soportado: {file_type}"])
 
         return processor.process(source)
 
@@ -1462,10 +1643,13 @@ class SRMPipeline:
 
     def _unify(self):
         detector = IndustryDetector()
-        for p in self.all_products:
-            if not p.categoria or p.categoria == "OTROS":
-                p.categoria = detector.detect_category(p.nombre, self.detected_industry)
+        pending = [p for p in self.all_products if not p.categoria or p.categoria == "OTROS"]
+        if pending:
+            names = pd.Series([p.nombre for p in pending], dtype=object)
+            for p, categoria in zip(pending, detector.detect_categories(names, self.detected_industry)):
+                p.categoria = categoria
 
+        for p in self.all_products:
             if not p.descripcion_corta and p.descripcion:
                 p.descripcion_corta = p.descripcion[:150]
 
@@ -1543,6 +1727,19 @@ class SRMPipeline:
             return
 
         log.log(f"Pushing a Shopify: {shop}...")
+
+        if SHOPIFY_SYNC_AVAILABLE:
+            # Upserts concurrentes bajo el rate limit; solo se escriben productos cambiados
+            engine = ShopifySyncEngine(shop, token)
+            stats = engine.sync(product.to_shopify() for product in self.all_products)
+            for error in stats['errors']:
+                log.log(f"Error Shopify: {error}", "warning")
+            log.log(
+                f"Shopify: {stats['created']} creados, {stats['updated']} actualizados, "
+                f"{stats['unchanged']} sin cambios, {len(stats['errors'])} errores", "success"
+            )
+            return
+
         shopify_client = ShopifyClient(shop, token)
 
         created = 0
@@ -1617,7 +1814,7 @@ def print_help():
 {'='*70}
 
 {Colors.CYAN}USO:{Colors.RESET}
-    python3 srm_intelligent_processor.py <archivo_o_url> [opciones]
+    python3 srm_intelligent_processor.py <archivo_o_url> [más archivos...] [opciones]
 
 {Colors.CYAN}FORMATOS:{Colors.RESET}
     PDF, Excel, CSV, Word, TXT, Imágenes, ZIP, URLs
@@ -1629,6 +1826,7 @@ def print_help():
     --client CLIENT       Forzar cliente (KAIQI, BARA, DFG, etc.)
     --pages PAGES         Páginas PDF: "2-50", "all"
     --push-shopify        Push automático a Shopify del cliente
+    --workers N           Archivos procesados en paralelo (default: {INGEST_WORKERS})
     --help, -h            Mostrar ayuda
 
 {Colors.CYAN}EJEMPLOS:{Colors.RESET}
@@ -1646,6 +1844,7 @@ def print_help():
 
 {Colors.CYAN}VARIABLES DE ENTORNO:{Colors.RESET}
     OPENAI_API_KEY, ANTHROPIC_API_KEY
+    SRM_INGEST_WORKERS, SRM_AI_CONCURRENCY (llamadas AI simultáneas)
     KAIQI_SHOP, KAIQI_TOKEN, BARA_SHOP, BARA_TOKEN, etc.
 """)
 
@@ -1657,6 +1856,7 @@ def main():
 
     config = {
         'source': sys.argv[1],
+        'sources': [sys.argv[1]],
         'output_dir': DEFAULT_OUTPUT_DIR,
         'prefix': 'SRM',
         'push_shopify': False,
@@ -1692,7 +1892,12 @@ def main():
         elif arg == '--push-shopify':
             config['push_shopify'] = True
             i += 1
+        elif arg == '--workers' and i + 1 < len(sys.argv):
+            config['workers'] = max(1, int(sys.argv[i + 1]))
+            i += 2
         else:
+            if not arg.startswith('-'):
+                config['sources'].append(arg)
             i += 1
 
     # Validar API key
@@ -1702,7 +1907,8 @@ def main():
 
     try:
         pipeline = SRMPipeline(config)
-        pipeline.process(config['source'])
+        sources = config['sources']
+        pipeline.process(sources[0] if len(sources) == 1 else sources)
     except KeyboardInterrupt:
         log.log("\nInterrumpido", "warning")
         sys.exit(130)